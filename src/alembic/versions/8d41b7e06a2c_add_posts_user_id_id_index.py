@@ -0,0 +1,27 @@
+"""Add composite (user_id, id) index on posts for keyset pagination
+
+Revision ID: 8d41b7e06a2c
+Revises: 5a0c3e9d21f4
+Create Date: 2026-10-18 09:40:07.183512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41b7e06a2c'
+down_revision = '5a0c3e9d21f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_posts_user_id_id', 'posts', ['user_id', 'id'], unique=False)
+
+
+def downgrade():
+    # MySQL may have dropped the implicit foreign key index in favour of the composite one,
+    # so make sure user_id stays indexed before removing it
+    op.create_index('ix_posts_user_id', 'posts', ['user_id'], unique=False)
+    op.drop_index('ix_posts_user_id_id', table_name='posts')
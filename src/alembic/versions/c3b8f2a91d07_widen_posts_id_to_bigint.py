@@ -0,0 +1,27 @@
+"""Widen posts.id to BIGINT for generated Snowflake IDs
+
+Revision ID: c3b8f2a91d07
+Revises: 8d41b7e06a2c
+Create Date: 2026-10-18 19:02:44.519306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3b8f2a91d07'
+down_revision = '8d41b7e06a2c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('posts', 'id', existing_type=sa.Integer(), type_=sa.BigInteger(),
+                    existing_nullable=False, autoincrement=True)
+
+
+def downgrade():
+    # Fails if posts with Snowflake IDs exist; they don't fit in INT
+    op.alter_column('posts', 'id', existing_type=sa.BigInteger(), type_=sa.Integer(),
+                    existing_nullable=False, autoincrement=True)
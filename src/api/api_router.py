@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 from api.endpoints.user import router as user_router
 from api.endpoints.post import router as post_router
+from api.endpoints.metrics import router as metrics_router
 
 # Create the main API router
 api_router = APIRouter()
@@ -10,3 +11,6 @@ api_router.include_router(user_router, prefix="/user", tags=["user"])
 
 # Include the post-related endpoints with the prefix "/post" and tag "post"
 api_router.include_router(post_router, prefix="/post", tags=["post"])
+
+# Include the runtime metrics endpoints with the prefix "/metrics" and tag "metrics"
+api_router.include_router(metrics_router, prefix="/metrics", tags=["metrics"])
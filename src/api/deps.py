@@ -1,31 +1,34 @@
 import logging
+import secrets
 import jwt
 from fastapi.requests import Request
 
 from config import settings
-from exceptions import PayloadSizeExceed, InvalidTokenType, InvalidToken
+from crud.write_behind import post_write_behind
+from db.session import read_your_writes_key
+from crud.token_revocation import token_revocation
+from exceptions import ItemNotFound, PayloadSizeExceed, InvalidTokenType, InvalidToken, RevocationCheckUnavailable
+from extras.security import decode_token
 from schemas import UserSchema
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Define the JWT algorithm to be used
-JWT_ALGORITHM = "RS256"
 
-
-async def get_current_user(request: Request) -> UserSchema:
+async def get_current_token(request: Request) -> dict:
     """
-    Get the current user from the Authorization header in the request.
+    Get the verified payload of the token in the Authorization header of the request.
 
     Args:
         request (Request): The incoming HTTP request.
 
     Returns:
-        UserSchema: The user schema containing the user information.
+        dict: The payload of the token.
 
     Raises:
         InvalidTokenType: If the token type is not Bearer.
-        InvalidToken: If the token is invalid or decoding fails.
+        InvalidToken: If the token is invalid, decoding fails or the token was revoked.
+        RevocationCheckUnavailable: If the token may be revoked and the database is out of reach.
     """
     try:
         authorization = request.headers.get("Authorization")
@@ -36,14 +39,59 @@ async def get_current_user(request: Request) -> UserSchema:
         if token_type.lower() != "bearer":
             raise InvalidTokenType
 
-        payload = jwt.decode(token, settings.USER_RSA_PUBLIC_KEY, algorithms=[JWT_ALGORITHM])
-        return payload['user_id']
+        # Verified against the pre-parsed public key, or taken from the verified-token cache
+        payload = decode_token(token)
+        # Bloom filter first; the database is only asked about tokens the filter matches
+        if await token_revocation.is_revoked(payload.get('jti'), payload['exp']):
+            raise InvalidToken("Token revoked")
+        # Let the session layer keep this user's reads on the primary right after they write
+        read_your_writes_key.set(payload['user_id'])
+        return payload
 
+    except RevocationCheckUnavailable:
+        raise
     except (jwt.InvalidSignatureError, Exception) as e:
         logger.error(e)
         raise InvalidToken
 
 
+async def get_current_user(request: Request) -> UserSchema:
+    """
+    Get the current user from the Authorization header in the request.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Returns:
+        UserSchema: The user schema containing the user information.
+
+    Raises:
+        InvalidTokenType: If the token type is not Bearer.
+        InvalidToken: If the token is invalid, decoding fails or the token was revoked.
+        RevocationCheckUnavailable: If the token may be revoked and the database is out of reach.
+    """
+    payload = await get_current_token(request)
+    return payload['user_id']
+
+
+async def verify_metrics_token(request: Request):
+    """
+    Only let the holders of `METRICS_TOKEN` read the runtime metrics.
+
+    Args:
+        request (Request): The incoming HTTP request.
+
+    Raises:
+        ItemNotFound: If no `METRICS_TOKEN` is configured.
+        InvalidToken: If the request does not carry the token.
+    """
+    if not settings.METRICS_TOKEN:
+        raise ItemNotFound
+    token_type, _, token = request.headers.get("Authorization", "").partition(" ")
+    if token_type.lower() != "bearer" or not secrets.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        raise InvalidToken
+
+
 async def validate_content_length(request: Request):
     """
     Validate the content length of the incoming request.
@@ -57,3 +105,29 @@ async def validate_content_length(request: Request):
     content_length = request.headers.get("content-length")
     if content_length and int(content_length) > settings.PAYLOAD_MAX_SIZE * 1024 * 1024:  # 1 MB limit
         raise PayloadSizeExceed
+
+
+async def wait_for_write_capacity():
+    """
+    Hold back post writes while the write-behind queue to the database is full.
+
+    Raises:
+        WriteQueueFull: If the queue does not drain in time.
+    """
+    await post_write_behind.wait_for_capacity()
+
+
+async def wait_for_bulk_write_capacity(changes: int) -> None:
+    """
+    Hold back a bulk post write until the write-behind queue has room for all of its changes.
+
+    Called from the endpoint rather than as a dependency, since the number of changes is only
+    known once the body is parsed.
+
+    Args:
+        changes (int): The number of posts the request creates or deletes.
+
+    Raises:
+        WriteQueueFull: If the queue does not drain in time.
+    """
+    await post_write_behind.wait_for_capacity(changes)
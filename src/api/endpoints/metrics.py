@@ -0,0 +1,61 @@
+from typing import Any
+from fastapi import APIRouter, Depends
+
+from api.deps import verify_metrics_token
+from api.endpoints.post import post_list_flight
+from crud.in_memory import posts
+from crud.post_changes import post_change_log
+from crud.shared_store import shared_arena
+from crud.store_journal import store_journal
+from crud.store_residency import store_residency
+from crud.token_revocation import token_revocation
+from crud.write_behind import post_write_behind
+from db.session import AsyncDBSingleton
+from extras.cache import post_versions, response_cache
+from extras.compression import response_compressor
+from extras.password_hashing import password_hashing_pool
+from extras.security import verified_token_cache
+
+router = APIRouter()
+
+
+@router.get("/",
+            name="metrics:all",
+            status_code=200)
+async def get_metrics(
+        _=Depends(verify_metrics_token)
+) -> Any:
+    """
+    Get runtime metrics of the application.
+
+    Only served to requests with `Authorization: Bearer <METRICS_TOKEN>`.
+
+    Args:
+        _ : Placeholder for the metrics token check.
+
+    Returns:
+        Any: A dictionary containing the live database connection pool statistics, the
+            post listing cache counters, the post versions behind the listing ETags and
+            their 304 count, the post change log, the post listing coalescing counters, the
+            size of the in-memory post store, its snapshot and log counters, the shared
+            multi-process arena, the write-behind queue to the database, the memory
+            budget, eviction and reload gauges of the store, the verified-token cache, the
+            revoked-token filter, the password hashing pool and the response compression
+            ratio and CPU cost per coding.
+    """
+    return {
+        "db_pool": AsyncDBSingleton.pool_stats(),
+        "response_cache": response_cache.stats(),
+        "post_versions": post_versions.stats(),
+        "post_change_log": post_change_log.stats(),
+        "post_list_flight": post_list_flight.stats(),
+        "post_store": posts.stats(),
+        "post_store_journal": store_journal.stats(),
+        "post_store_shared": shared_arena.stats(),
+        "post_write_behind": post_write_behind.stats(),
+        "post_store_residency": store_residency.stats(),
+        "token_cache": verified_token_cache.stats(),
+        "token_revocation": token_revocation.stats(),
+        "password_hashing": password_hashing_pool.stats(),
+        "compression": response_compressor.stats(),
+    }
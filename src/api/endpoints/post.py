@@ -1,13 +1,70 @@
-from typing import Any
-from fastapi import APIRouter, Depends
+from typing import Any, List, Optional
+import orjson
+from fastapi import APIRouter, Body, Depends, Query, Request
+from fastapi.responses import Response, StreamingResponse
 
 import schemas
-from api.deps import get_current_user, validate_content_length
-from crud.in_memory import save_post, response_cache, get_cached_posts, delete_in_mem_post
+from api.deps import (
+    get_current_user,
+    validate_content_length,
+    wait_for_bulk_write_capacity,
+    wait_for_write_capacity
+)
+from config import settings
+from crud.in_memory import (
+    save_post,
+    save_posts,
+    get_cached_posts_page,
+    get_cached_post_changes,
+    iter_cached_posts,
+    delete_in_mem_post,
+    delete_in_mem_posts,
+    load_posts,
+    sync_posts
+)
 from exceptions import ItemNotFound
+from extras.cache import post_versions, response_cache
+from extras.compression import etag_for_encoding, response_compressor
+from extras.response_model import CustomJSONResponse, NDJSON_MEDIA_TYPE, ndjson_stream, render_envelope, wants_ndjson
+from extras.single_flight import SingleFlight
 
 router = APIRouter()
 
+# Response header with the version of the user's posts a listing starts from, for GET /post/changes
+POSTS_VERSION_HEADER = "X-Posts-Version"
+
+# Coalesces concurrent renders of the same page of GET /post/
+post_list_flight = SingleFlight()
+
+
+def listing_response(user_id: int, cache_variant: tuple, body: bytes, headers: dict,
+                     encoding: Optional[str]) -> Response:
+    """
+    Build the response of a rendered page, compressed with `encoding` if it is worth it.
+
+    The compressed body is cached next to the uncompressed one, and the response carries a
+    Content-Encoding, so the compression middleware passes it through untouched.
+
+    Args:
+        user_id (int): The ID of the user the page belongs to.
+        cache_variant (tuple): The (limit, cursor) of the page.
+        body (bytes): The rendered page.
+        headers (dict): The ETag and version headers of the page.
+        encoding (Optional[str]): The content coding negotiated with the client, None for none.
+
+    Returns:
+        Response: The page.
+    """
+    if encoding is None or not response_compressor.worth_compressing(len(body)):
+        return Response(content=body, media_type=CustomJSONResponse.media_type, headers=headers)
+    encoded = response_cache.get(user_id, cache_variant, encoding)
+    if encoded is None:
+        encoded = response_compressor.compress(body, encoding)
+        response_cache.set_encoded(user_id, cache_variant, encoding, body, encoded)
+    headers = {**headers, "ETag": etag_for_encoding(headers["ETag"], encoding),
+               "Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+    return Response(content=encoded, media_type=CustomJSONResponse.media_type, headers=headers)
+
 
 @router.post("/",
              status_code=201)
@@ -15,7 +72,8 @@ async def create_post(
         post_in: schemas.PostIn,
         # db: AsyncSession = Depends(get_async_db),
         user_id: int = Depends(get_current_user),
-        _=Depends(validate_content_length)
+        _=Depends(validate_content_length),
+        __=Depends(wait_for_write_capacity)
 
 ) -> int:
     """
@@ -25,13 +83,15 @@ async def create_post(
             post_in (schemas.PostIn): The input data for the post.
             user_id (int): The ID of the current user, obtained from dependencies.
             _ : Placeholder for content length validation.
+            __ : Placeholder for the write-behind backpressure check.
 
         Returns:
             int: The ID of the newly created post.
         """
 
     # Save post to in-memory storage
-    post_id = save_post(str(user_id), post_in.content)
+    await load_posts(str(user_id))
+    post_id = save_post(str(user_id), post_in.content, post_in.title)
 
     # Uncomment the following lines to use database interaction:
     # db: AsyncSession = Depends(get_async_db) should be added to the function signature.
@@ -40,40 +100,203 @@ async def create_post(
     return post_id
 
 
+@router.post("/bulk",
+             status_code=201)
+async def create_posts(
+        posts_in: List[schemas.PostIn] = Body(..., min_length=1, max_length=settings.POSTS_BULK_MAX_ITEMS),
+        # db: AsyncSession = Depends(get_async_db),
+        user_id: int = Depends(get_current_user),
+        _=Depends(validate_content_length)
+) -> List[int]:
+    """
+        Create several posts in one request.
+
+        The whole array is validated before anything is stored, so either all posts are
+        created or none are.
+
+        Args:
+            posts_in (List[schemas.PostIn]): The input data for the posts.
+            user_id (int): The ID of the current user, obtained from dependencies.
+            _ : Placeholder for content length validation.
+
+        Returns:
+            List[int]: The IDs of the newly created posts, in request order.
+        """
+    # Wait until the write-behind queue has room for every post of the request
+    await wait_for_bulk_write_capacity(len(posts_in))
+
+    # Save posts to in-memory storage
+    await load_posts(str(user_id))
+    post_ids = save_posts(str(user_id), [(post_in.title, post_in.content) for post_in in posts_in])
+
+    # Uncomment the following lines to use database interaction:
+    # db: AsyncSession = Depends(get_async_db) should be added to the function signature.
+    # post_ids = await crud.post.create_posts(db, posts_in, user_id)
+    return post_ids
+
+
+@router.delete("/bulk")
+async def delete_posts(
+        post_ids: List[int] = Body(..., min_length=1, max_length=settings.POSTS_BULK_MAX_ITEMS),
+        # db: AsyncSession = Depends(get_async_db),
+        user_id: int = Depends(get_current_user),
+        _=Depends(validate_content_length)
+) -> List[dict]:
+    """
+        Delete several posts by ID in one request.
+
+        Args:
+            post_ids (List[int]): The IDs of the posts to delete.
+            user_id (int): The ID of the current user, obtained from dependencies.
+            _ : Placeholder for content length validation.
+
+        Returns:
+            List[dict]: The outcome for every requested ID, with `status` set to "deleted" or "not_found".
+        """
+    # Wait until the write-behind queue has room for every deletion of the request
+    await wait_for_bulk_write_capacity(len(post_ids))
+
+    # Delete posts from in-memory storage
+    await load_posts(str(user_id))
+    deleted = delete_in_mem_posts(str(user_id), post_ids)
+    return [
+        {"id": post_id, "status": "deleted" if was_deleted else "not_found"}
+        for post_id, was_deleted in zip(post_ids, deleted)
+    ]
+
+    # Uncomment the following lines to use database interaction:
+    # db: AsyncSession = Depends(get_async_db) should be added to the function signature.
+    # results = await crud.post.remove_many_if_owner(db, ids=post_ids, user_id=user_id)
+    # return [{"id": post_id, "status": status} for post_id, status in results.items()]
+
+
 @router.get("/",
             # response_model=List[schemas.PostOut],
             status_code=200)
 async def get_posts(
+        request: Request,
         # db: AsyncSession = Depends(get_async_db),
+        limit: int = Query(settings.POSTS_PAGE_SIZE, ge=1, le=settings.POSTS_PAGE_SIZE_MAX),
+        cursor: Optional[int] = Query(None, ge=0),
+        stream: bool = Query(False),
         user_id: int = Depends(get_current_user)
-) -> list:
+) -> Response:
     """
-        Get all posts for the current user.
+        Get one page of posts for the current user.
+
+        Pages are ordered by post ID. The envelope carries a `next_cursor` which is passed back
+        as `cursor` to fetch the following page; it is null on the last page.
+
+        With `stream=true` or `Accept: application/x-ndjson`, every post after `cursor` is
+        returned instead, as newline-delimited JSON without an envelope, and `limit` is ignored.
+        The posts are read from the store and written out `POSTS_STREAM_CHUNK_SIZE` at a time,
+        so the first bytes go out at once and memory does not grow with the number of posts.
+
+        Pages carry a strong `ETag` derived from the version of the user's posts. A request
+        whose `If-None-Match` holds the current ETag gets an empty 304 without the store or the
+        serializer being touched. Rendered pages are kept in `response_cache` until the user's
+        posts change, so repeated listings are served from the cached bytes without reading the
+        store or serializing. On a cache miss, concurrent requests for the same page are
+        coalesced into one render. Pages are compressed with the coding negotiated from
+        `Accept-Encoding`, and the compressed bytes are cached alongside the rendered page.
 
         Args:
+            request (Request): The incoming HTTP request.
+            limit (int): Maximum number of posts to return.
+            cursor (Optional[int]): The `next_cursor` of the previous page, omitted for the first page.
+            stream (bool): Stream all posts as NDJSON, same as `Accept: application/x-ndjson`.
             user_id (int): The ID of the current user, obtained from dependencies.
 
         Returns:
-            list: The list of posts for the current user.
+            Response: The posts of the page, with the pagination details in the envelope, a 304
+                response if the client's copy is current, or a streamed NDJSON response.
         """
+    if stream or wants_ndjson(request.headers.get("accept")):
+        headers = {POSTS_VERSION_HEADER: post_versions.token(post_versions.get(user_id))}
+        chunks = iter_cached_posts(str(user_id), cursor, settings.POSTS_STREAM_CHUNK_SIZE)
 
-    # Get posts from in-memory cache
-    user_posts = get_cached_posts(str(user_id))
-    response_cache[user_id] = user_posts
+        # Uncomment the following lines to stream from the database instead:
+        # db: AsyncSession = Depends(get_async_db) should be added to the function signature.
+        # chunks = crud.post.stream_user_posts(db, user_id, chunk_size=settings.POSTS_STREAM_CHUNK_SIZE, cursor=cursor)
 
-    # Uncomment the following lines to use database interaction:
-    # db: AsyncSession = Depends(get_async_db) should be added to the function signature.
-    # posts = await crud.post.get_user_posts(db, user_id)
-    # return posts
+        return StreamingResponse(ndjson_stream(chunks), media_type=NDJSON_MEDIA_TYPE, headers=headers)
+
+    # Writes made by other workers invalidate this worker's cached pages while being applied
+    sync_posts()
+    cache_variant = (limit, cursor)
+    # Taken before the body, which can then only be newer than the ETag, never older
+    version = post_versions.get(user_id)
+    headers = {"ETag": post_versions.etag(user_id, version, cache_variant),
+               POSTS_VERSION_HEADER: post_versions.token(version)}
+    matched_etag = post_versions.matches(request.headers.get("if-none-match"), headers["ETag"])
+    if matched_etag is not None:
+        return Response(status_code=304, headers={**headers, "ETag": matched_etag})
+    encoding = response_compressor.negotiate(request.headers.get("accept-encoding"))
+    body = response_cache.get(user_id, cache_variant)
+    if body is not None:
+        return listing_response(user_id, cache_variant, body, headers, encoding)
+
+    async def render_page() -> bytes:
+        fill_token = response_cache.fill_token()
+
+        # Get posts from in-memory cache
+        await load_posts(str(user_id))
+        user_posts, next_cursor = get_cached_posts_page(str(user_id), limit, cursor)
 
-    return user_posts
+        # Uncomment the following lines to use database interaction:
+        # db: AsyncSession = Depends(get_async_db) should be added to the function signature.
+        # user_posts, next_cursor = await crud.post.get_user_posts_page(db, user_id, limit=limit, cursor=cursor)
+
+        # The contents are plain strings, so they are encoded straight into the envelope
+        page_body = render_envelope(orjson.dumps(user_posts), {"next_cursor": next_cursor})
+        response_cache.set(user_id, cache_variant, page_body, fill_token)
+        return page_body
+
+    # Identical listings requested while this one is being rendered share its result, unless it
+    # started before the version their ETag was taken at
+    body = await post_list_flight.do((user_id, version, *cache_variant), render_page)
+    return listing_response(user_id, cache_variant, body, headers, encoding)
+
+
+@router.get("/changes",
+            status_code=200)
+async def get_post_changes(
+        since: str = Query(...),
+        user_id: int = Depends(get_current_user)
+) -> Any:
+    """
+        Get the posts created and deleted since a version the client has seen.
+
+        Clients keep the `version` of the last response, or the `X-Posts-Version` header of a
+        full `GET /post/` listing, and pass it as `since`. The changes should be applied by post
+        ID, creating or replacing created posts and ignoring deletes of unknown ones, since a
+        listing may already contain changes made after its version. When the changes since
+        `since` are no longer kept, or `since` comes from an earlier run or, without the shared
+        store, from another worker, `resync` is true and the client has to fetch a full listing
+        instead.
+
+        Args:
+            since (str): The version the client has seen.
+            user_id (int): The ID of the current user, obtained from dependencies.
+
+        Returns:
+            Any: The current `version`, the `resync` flag and the `changes` since `since`.
+        """
+    sync_posts()
+    version = post_versions.get(user_id)
+    since_version = post_versions.parse(since)
+    changes = None
+    if since_version is not None:
+        changes = await get_cached_post_changes(str(user_id), since_version, version)
+    return {"version": post_versions.token(version), "resync": changes is None, "changes": changes or []}
 
 
 @router.delete("/{post_id}/")
 async def delete_post(
         post_id: int,
         # db: AsyncSession = Depends(get_async_db),
-        user_id: int = Depends(get_current_user)
+        user_id: int = Depends(get_current_user),
+        _=Depends(wait_for_write_capacity)
 ) -> Any:
     """
         Delete a post by ID.
@@ -87,6 +310,7 @@ async def delete_post(
         """
 
     # Delete post from in-memory storage
+    await load_posts(str(user_id))
     if not delete_in_mem_post(str(user_id), post_id):
         raise ItemNotFound
     return
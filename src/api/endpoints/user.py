@@ -1,10 +1,15 @@
-from typing import Any
+from typing import Any, Optional
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import crud
 import schemas
+from api.deps import get_current_token
+from crud.token_revocation import token_revocation
 from db import get_async_db
+from exceptions import InvalidToken
+from extras.security import create_refreshable_token
+from models import User
 
 router = APIRouter()
 
@@ -24,10 +29,10 @@ async def register(
         db (AsyncSession): The database session dependency.
 
     Returns:
-        Any: A dictionary containing the token for the newly registered user.
+        Any: A dictionary containing the token and the refresh token for the newly registered user.
     """
     user = await crud.user.create_user(db, user_in)
-    return {"token": await user.get_token}
+    return {"token": await create_refreshable_token(user), "refresh_token": await crud.refresh_token.issue(db, user.id)}
 
 
 @router.post("/login/",
@@ -45,7 +50,67 @@ async def login(
         db (AsyncSession): The database session dependency.
 
     Returns:
-        Any: A dictionary containing the token for the authenticated user.
+        Any: A dictionary containing the token and the refresh token for the authenticated user.
     """
     user = await crud.user.authenticate_user(db, login_schema)
-    return {"token": await user.get_token}
+    return {"token": await create_refreshable_token(user), "refresh_token": await crud.refresh_token.issue(db, user.id)}
+
+
+@router.post("/refresh/",
+             name="auth:refresh",
+             status_code=200)
+async def refresh(
+        refresh_in: schemas.RefreshSchema,
+        db: AsyncSession = Depends(get_async_db)
+) -> Any:
+    """
+    Exchange a refresh token for a new token and a new refresh token.
+
+    Costs one indexed UPDATE, one indexed SELECT and one INSERT, with no password check. The
+    refresh token given is used up; presenting it again revokes every token rotated from it.
+
+    Args:
+        refresh_in (schemas.RefreshSchema): The refresh token from the last login or refresh.
+        db (AsyncSession): The database session dependency.
+
+    Returns:
+        Any: A dictionary containing the new token and the new refresh token.
+
+    Raises:
+        InvalidToken: If the refresh token is unknown, expired or already used.
+    """
+    user_id, refresh_token = await crud.refresh_token.rotate(db, refresh_in.refresh_token)
+    return {"token": await create_refreshable_token(User(id=user_id)), "refresh_token": refresh_token}
+
+
+@router.post("/logout/",
+             name="auth:logout",
+             status_code=200)
+async def logout(
+        logout_in: Optional[schemas.LogoutSchema] = None,
+        payload: dict = Depends(get_current_token),
+        db: AsyncSession = Depends(get_async_db)
+) -> Any:
+    """
+    Revoke the token the request is authenticated with, and optionally a refresh token.
+
+    The token is rejected by this worker right away and by the other workers within
+    `REVOCATION_SYNC_INTERVAL` seconds.
+
+    Args:
+        logout_in (Optional[schemas.LogoutSchema]): A refresh token to revoke along with its family.
+        payload (dict): The payload of the current token, obtained from dependencies.
+        db (AsyncSession): The database session dependency.
+
+    Returns:
+        Any: None if the tokens were revoked.
+
+    Raises:
+        InvalidToken: If the token is invalid, already revoked, or was issued without a `jti`.
+    """
+    if payload.get("jti") is None:
+        raise InvalidToken("Token cannot be revoked")
+    await token_revocation.revoke(db, payload["jti"], payload["user_id"], payload["exp"])
+    if logout_in is not None and logout_in.refresh_token:
+        await crud.refresh_token.revoke(db, logout_in.refresh_token, payload["user_id"])
+    return
@@ -0,0 +1,74 @@
+"""
+Compression ratio and CPU cost of the response codings at several levels.
+
+Compresses a rendered page of posts and a large listing with gzip, brotli and zstd (the last
+two only when their libraries are installed) at a range of levels, and reports the compressed
+size, the ratio, the CPU time per response and the throughput, then the CPU time of a page
+served from the precompressed cache, which is a dictionary lookup. Use it to pick the
+`COMPRESSION_*_LEVEL` settings. Run from the `src` directory:
+
+    python -m benchmarks.bench_compression --seconds 0.5
+"""
+import argparse
+import gzip
+import random
+import time
+
+import orjson
+
+from extras.compression import brotli, zstandard
+from extras.response_model import render_envelope
+
+LEVELS = {
+    "gzip": (1, 6, 9),
+    "br": (1, 4, 6, 11),
+    "zstd": (1, 3, 9, 19),
+}
+
+
+def compressor(encoding: str, level: int):
+    if encoding == "gzip":
+        return lambda body: gzip.compress(body, compresslevel=level, mtime=0)
+    if encoding == "br":
+        return lambda body: brotli.compress(body, quality=level)
+    return zstandard.ZstdCompressor(level=level).compress
+
+
+def cpu_per_call(call, seconds: float) -> float:
+    count = 0
+    started = time.thread_time()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        call()
+        count += 1
+    return (time.thread_time() - started) / count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    words = [f"word{i}" for i in range(2_000)] + ["the", "a", "post", "of", "and", "to", "is"] * 100
+    rng = random.Random(0)
+
+    def listing(count: int) -> bytes:
+        posts = [" ".join(rng.choices(words, k=40)) for _ in range(count)]
+        return render_envelope(orjson.dumps(posts), {"next_cursor": count})
+
+    payloads = (("page of 50", listing(50)), ("page of 500", listing(500)))
+    encodings = [encoding for encoding, available in (("gzip", True), ("br", brotli is not None),
+                                                      ("zstd", zstandard is not None)) if available]
+    print(f"{'payload':<14} {'coding':<6} {'level':>5} {'bytes':>10} {'ratio':>7} {'cpu µs':>10} {'MB/s':>8}")
+    for label, body in payloads:
+        print(f"{label:<14} {'-':<6} {'':>5} {len(body):>10,}")
+        for encoding in encodings:
+            for level in LEVELS[encoding]:
+                compress = compressor(encoding, level)
+                size = len(compress(body))
+                cpu = cpu_per_call(lambda: compress(body), args.seconds)
+                print(f"{label:<14} {encoding:<6} {level:>5} {size:>10,} {size / len(body):>7.3f} "
+                      f"{cpu * 1e6:>10,.0f} {len(body) / cpu / 1e6:>8,.0f}")
+        cached = {"gzip": compressor("gzip", 6)(body)}
+        cpu = cpu_per_call(lambda: cached.get("gzip"), args.seconds)
+        print(f"{label:<14} {'cached':<6} {'':>5} {len(cached['gzip']):>10,} {'':>7} {cpu * 1e6:>10,.2f}")
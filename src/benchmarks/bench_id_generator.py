@@ -0,0 +1,62 @@
+"""
+Throughput of the post ID generators, and a uniqueness check across processes.
+
+Run from the `src` directory:
+
+    python -m benchmarks.bench_id_generator --ids 5000000 --processes 4
+"""
+import argparse
+import multiprocessing
+import time
+
+from config import settings
+from extras.id_generator import SequenceIdGenerator, SnowflakeIdGenerator
+
+
+def snowflake() -> SnowflakeIdGenerator:
+    return SnowflakeIdGenerator(settings.POST_ID_NODE_ID, settings.POST_ID_EPOCH_MS, settings.POST_ID_SLOT_DIR)
+
+
+def measure(label: str, generate, count: int) -> None:
+    started = time.perf_counter()
+    generate(count)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<22} {count / elapsed / 1e6:6.2f} M IDs/s")
+
+
+def one_by_one(generator):
+    def generate(count: int) -> None:
+        next_id = generator.next_id
+        for _ in range(count):
+            next_id()
+    return generate
+
+
+def batched(generator, batch: int):
+    def generate(count: int) -> None:
+        for _ in range(count // batch):
+            generator.next_ids(batch)
+    return generate
+
+
+def generate_in_process(count: int) -> list:
+    generator = snowflake()
+    return generator.next_ids(count)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ids", type=int, default=5_000_000)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    measure("sequence next_id", one_by_one(SequenceIdGenerator()), args.ids)
+    measure("snowflake next_id", one_by_one(snowflake()), args.ids)
+    measure("snowflake next_ids(100)", batched(snowflake(), 100), args.ids)
+
+    per_process = args.ids // args.processes
+    with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+        results = pool.map(generate_in_process, [per_process] * args.processes)
+    ids = [post_id for result in results for post_id in result]
+    print(f"{args.processes} processes, {len(ids)} IDs, {len(set(ids))} unique, "
+          f"sorted within each process: {all(result == sorted(result) for result in results)}")
@@ -0,0 +1,49 @@
+"""
+Sign and verify throughput of the access token algorithms.
+
+Generates a fresh key per algorithm (RSA at 2048 and 4096 bits for RS256, P-256 for ES256,
+Ed25519 for EdDSA) and times `jwt.encode` and `jwt.decode` with the parsed key objects on a
+payload shaped like the one `create_token` signs. Run from the `src` directory:
+
+    python -m benchmarks.bench_jwt_algorithms --seconds 1
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+KEYS = (
+    ("RS256", "RSA 2048", lambda: rsa.generate_private_key(public_exponent=65537, key_size=2048)),
+    ("RS256", "RSA 4096", lambda: rsa.generate_private_key(public_exponent=65537, key_size=4096)),
+    ("ES256", "P-256", lambda: ec.generate_private_key(ec.SECP256R1())),
+    ("EdDSA", "Ed25519", ed25519.Ed25519PrivateKey.generate),
+)
+
+
+def rate(call, seconds: float) -> float:
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        call()
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    payload = {"exp": datetime.utcnow() + timedelta(days=1), "user_id": 1}
+    print(f"{'algorithm':<16} {'sign/s':>10} {'verify/s':>10} {'token bytes':>12}")
+    for algorithm, label, generate in KEYS:
+        private_key = generate()
+        public_key = private_key.public_key()
+        token = jwt.encode(payload, private_key, algorithm=algorithm, headers={"kid": "bench"})
+        signs = rate(lambda: jwt.encode(payload, private_key, algorithm=algorithm, headers={"kid": "bench"}),
+                     args.seconds)
+        verifies = rate(lambda: jwt.decode(token, public_key, algorithms=[algorithm]), args.seconds)
+        print(f"{algorithm + ' ' + label:<16} {signs:>10,.0f} {verifies:>10,.0f} {len(token):>12}")
@@ -0,0 +1,83 @@
+"""
+Queries and memory per post listing, before and after projection queries.
+
+"Before" lists posts the way `CRUDPost.get_user_posts` used to: full `Post` entities with the
+model's `lazy='selectin'` loaders, so every page also loads the owning user and, through
+`User.posts`, all of that user's posts. "After" uses `CRUDPost.get_user_posts_page`, which
+selects the `PostOut` columns as plain rows. Run from the `src` directory:
+
+    python -m benchmarks.bench_post_reads --posts 1000 --limit 50
+    python -m benchmarks.bench_post_reads --url sqlite+aiosqlite:///bench.db
+"""
+import argparse
+import asyncio
+import tracemalloc
+import uuid
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.future import select
+
+import crud
+import schemas
+from benchmarks.utils import RoundTripCounter, timed
+from config import settings
+from models import Base, Post, User
+
+
+async def legacy_list(db: AsyncSession, user_id: int, limit: int) -> list:
+    result = await db.execute(select(Post).filter(Post.user_id == user_id).order_by(Post.id).limit(limit))
+    return [schemas.PostOut.model_validate(post) for post in result.scalars().all()]
+
+
+async def projected_list(db: AsyncSession, user_id: int, limit: int) -> list:
+    posts, _ = await crud.post.get_user_posts_page(db, user_id, limit=limit)
+    return posts
+
+
+async def measure(label: str, sessions: async_sessionmaker, counter: RoundTripCounter, iterations: int,
+                  list_posts, user_id: int, limit: int) -> None:
+    round_trips = 0
+    seconds = 0.0
+    peak_bytes = 0
+    for _ in range(iterations):
+        async with sessions() as db:
+            tracemalloc.start()
+            with counter.count(), timed() as elapsed:
+                await list_posts(db, user_id, limit)
+            peak_bytes += tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            round_trips += counter.round_trips
+            seconds += elapsed["seconds"]
+    print(f"{label:<8} {round_trips / iterations:5.2f} queries, {peak_bytes / iterations / 1024:9.1f} KiB peak allocated,"
+          f" {seconds / iterations * 1000:8.3f} ms per listing")
+
+
+async def main(url: str, posts: int, limit: int, iterations: int) -> None:
+    engine = create_async_engine(url)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+    async with sessions() as db:
+        user = User(email=f"bench-{uuid.uuid4().hex[:12]}@example.com", password="x")
+        db.add(user)
+        await db.commit()
+        for start in range(0, posts, 500):
+            batch = [schemas.PostIn(title=f"title {i}", content="x" * 200) for i in range(start, min(start + 500, posts))]
+            await crud.post.create_posts(db, batch, user.id)
+
+    counter = RoundTripCounter(engine.sync_engine)
+    print(f"user with {posts} posts, listing {limit} per request")
+    await measure("before", sessions, counter, iterations, legacy_list, user.id, limit)
+    await measure("after", sessions, counter, iterations, projected_list, user.id, limit)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=str(settings.SQLALCHEMY_ASYNC_DATABASE_URI))
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.posts, args.limit, args.iterations))
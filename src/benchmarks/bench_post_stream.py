@@ -0,0 +1,67 @@
+"""
+Peak memory and time to first byte of listing all posts of one user: buffered vs streamed.
+
+Fills the in-memory post store with `--posts` posts of a single user, then lists them twice:
+buffered, as one page rendered into a single envelope (what `GET /post/` would need to return
+them all at once), and streamed, as the NDJSON chunks `GET /post/?stream=true` writes out, each
+chunk dropped once "sent". Peak memory is traced allocation during the listing. Run from the
+`src` directory:
+
+    python -m benchmarks.bench_post_stream --posts 200000
+"""
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+
+import orjson
+
+from crud.in_memory import iter_cached_posts, posts
+from extras.response_model import ndjson_stream, render_envelope
+
+USER_ID = 1
+
+
+def buffered() -> tuple:
+    started = time.perf_counter()
+    contents, next_cursor = posts.page(USER_ID)
+    body = render_envelope(orjson.dumps(contents), {"next_cursor": next_cursor})
+    # Nothing can be sent before the whole body is rendered
+    first_byte = time.perf_counter() - started
+    return first_byte, len(body)
+
+
+async def streamed(chunk_size: int) -> tuple:
+    started = time.perf_counter()
+    first_byte = None
+    sent = 0
+    async for chunk in ndjson_stream(iter_cached_posts(str(USER_ID), None, chunk_size)):
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        sent += len(chunk)
+    return first_byte, sent
+
+
+def measure(label: str, run) -> None:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    first_byte, sent = run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<22} {peak / 2 ** 20:10.1f} {first_byte * 1e3:12.2f} {elapsed * 1e3:10.1f} {sent / 2 ** 20:10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    for post_id in range(1, args.posts + 1):
+        posts.add(USER_ID, post_id, f"post {post_id}", f"Content of post {post_id} " * 6)
+    print(f"{'listing':<22} {'peak MiB':>10} {'1st byte ms':>12} {'total ms':>10} {'sent MiB':>10}")
+    measure("buffered", buffered)
+    measure(f"streamed ({args.chunk_size}/chunk)", lambda: asyncio.run(streamed(args.chunk_size)))
@@ -0,0 +1,91 @@
+"""
+Database round trips per post write, before and after the single-round-trip write paths.
+
+Compares the previous `CRUDPost.create_post` (INSERT, COMMIT, refresh SELECT) and
+`CRUDPost.async_remove_if_owner` (selectin-loading SELECT, DELETE, COMMIT) with the current
+implementations. Run from the `src` directory against a scratch database:
+
+    python -m benchmarks.bench_post_writes --iterations 200
+    python -m benchmarks.bench_post_writes --url sqlite+aiosqlite:///bench.db
+"""
+import argparse
+import asyncio
+import uuid
+
+from sqlalchemy import delete as sqlalchemy_delete
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import crud
+import schemas
+from benchmarks.utils import RoundTripCounter, timed
+from config import settings
+from exceptions import ItemNotFound, NotOwnerException
+from models import Base, Post, User
+
+
+async def legacy_create_post(db: AsyncSession, post_in: schemas.PostIn, user_id: int) -> Post:
+    post = Post(**post_in.model_dump())
+    db.add(post)
+    post.user_id = user_id
+    await db.commit()
+    await db.refresh(post)
+    return post
+
+
+async def legacy_remove_if_owner(db: AsyncSession, *, id: int, user_id: int) -> None:
+    post = await crud.post.async_get(db, id)
+    if not post:
+        raise ItemNotFound
+    if post.user_id != user_id:
+        raise NotOwnerException
+    await db.execute(sqlalchemy_delete(Post).where(Post.id == id, Post.user_id == user_id))
+    await db.commit()
+
+
+async def measure(label: str, sessions: async_sessionmaker, counter: RoundTripCounter, iterations: int,
+                  create, remove, user_id: int) -> None:
+    post_in = schemas.PostIn(title="benchmark", content="x" * 200)
+    create_trips = remove_trips = 0
+    create_seconds = remove_seconds = 0.0
+    for _ in range(iterations):
+        async with sessions() as db:
+            with counter.count(), timed() as elapsed:
+                post = await create(db, post_in, user_id)
+            create_trips += counter.round_trips
+            create_seconds += elapsed["seconds"]
+        async with sessions() as db:
+            with counter.count(), timed() as elapsed:
+                await remove(db, id=post.id, user_id=user_id)
+            remove_trips += counter.round_trips
+            remove_seconds += elapsed["seconds"]
+
+    print(f"{label:<8} create: {create_trips / iterations:5.2f} round trips, {create_seconds / iterations * 1000:7.3f} ms"
+          f" | delete: {remove_trips / iterations:5.2f} round trips, {remove_seconds / iterations * 1000:7.3f} ms")
+
+
+async def main(url: str, iterations: int) -> None:
+    engine = create_async_engine(url)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+    async with sessions() as db:
+        user = User(email=f"bench-{uuid.uuid4().hex[:12]}@example.com", password="x")
+        db.add(user)
+        await db.commit()
+        # Give the user some posts so the legacy selectin cascade (Post.user -> User.posts) has work to do
+        await crud.post.create_posts(db, [schemas.PostIn(title="seed", content="y" * 200)] * 50, user.id)
+
+    counter = RoundTripCounter(engine.sync_engine)
+    await measure("before", sessions, counter, iterations, legacy_create_post, legacy_remove_if_owner, user.id)
+    await measure("after", sessions, counter, iterations, crud.post.create_post, crud.post.async_remove_if_owner,
+                  user.id)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=str(settings.SQLALCHEMY_ASYNC_DATABASE_URI))
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.iterations))
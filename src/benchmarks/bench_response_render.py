@@ -0,0 +1,73 @@
+"""
+Render time of the response envelope: stdlib json with a wrapper dict vs orjson splicing.
+
+Times `CustomJSONResponse.render` against the previous implementation, which built a new
+envelope dict for every response, copied lists to lift their trailing `next_cursor` item and
+encoded everything with `json.dumps`, on a small dict, a page of posts with its cursor, a large
+list of post dicts and a list of integers. The last row splices an already encoded page with
+`render_envelope`. Run from the `src` directory:
+
+    python -m benchmarks.bench_response_render --seconds 1
+"""
+import argparse
+import json
+import time
+
+import orjson
+
+from extras.response_model import CustomJSONResponse, is_envelope_meta, render_envelope
+
+
+def render_before(content) -> bytes:
+    # CustomJSONResponse.render before orjson
+    if isinstance(content, dict) and "status_code" in content and "result" in content:
+        pass
+    elif isinstance(content, list) and len(content) != 0 and not isinstance(content[0], int) \
+            and is_envelope_meta(content[-1]):
+        content = {'status_code': 200, 'message': 'ok', **content[-1], 'result': content[:-1]}
+    else:
+        content = {'status_code': 200, 'message': 'ok', 'result': content}
+    return json.dumps(content).encode('utf-8')
+
+
+# Only its render method is used, without building a response per call
+renderer = CustomJSONResponse(None)
+
+
+def render_after(content) -> bytes:
+    return renderer.render(content)
+
+
+def rate(call, seconds: float) -> float:
+    count = 0
+    started = time.perf_counter()
+    deadline = started + seconds
+    while time.perf_counter() < deadline:
+        call()
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    post = {"id": 1, "title": "A title", "content": "Some content of a post " * 8,
+            "created_at": "2024-06-01T12:00:00", "updated_at": None}
+    page = [f"Some content of post {i} " * 8 for i in range(100)]
+    payloads = (
+        ("small dict", {"token": "x" * 600, "refresh_token": "y" * 43}),
+        ("page of 100 + cursor", page + [{"next_cursor": 100}]),
+        ("10k post dicts", [dict(post, id=i) for i in range(10_000)]),
+        ("100k ints", list(range(100_000))),
+    )
+    print(f"{'payload':<24} {'bytes':>10} {'json/s':>10} {'orjson/s':>10} {'speedup':>8}")
+    for label, content in payloads:
+        assert json.loads(render_before(content)) == json.loads(render_after(content))
+        before = rate(lambda: render_before(content), args.seconds)
+        after = rate(lambda: render_after(content), args.seconds)
+        print(f"{label:<24} {len(render_after(content)):>10,} {before:>10,.0f} {after:>10,.0f} {after / before:>7.1f}x")
+    encoded = orjson.dumps(page)
+    spliced = rate(lambda: render_envelope(encoded, {"next_cursor": 100}), args.seconds)
+    print(f"{'encoded page, spliced':<24} {len(encoded):>10,} {'':>10} {spliced:>10,.0f}")
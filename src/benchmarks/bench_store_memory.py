@@ -0,0 +1,69 @@
+"""
+Bytes per post of the in-memory post store, compared with the previous dict-of-dicts layout.
+
+The previous layout was `Dict[str, Dict[int, str]]` (one dict per user, one `str` object and
+one boxed `int` key per post, titles dropped). The current layout is `crud.post_store.PostStore`,
+which also keeps the titles. Run from the `src` directory:
+
+    python -m benchmarks.bench_store_memory --posts 1000000
+    python -m benchmarks.bench_store_memory --posts 10000000 --users 500000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from crud.post_store import PostStore
+
+WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do",
+         "eiusmod", "tempor", "incididunt", "ut", "labore", "et", "dolore", "magna", "aliqua")
+
+
+def make_posts(count: int, users: int, content_words: int, seed: int = 42):
+    """
+    Generate (user_id, post_id, title, content) tuples with distinct content strings.
+    """
+    rng = random.Random(seed)
+    for post_id in range(1, count + 1):
+        words = rng.choices(WORDS, k=content_words)
+        yield rng.randrange(users), post_id, f"post {post_id}", " ".join(words)
+
+
+def measure(label: str, build, count: int) -> None:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    store = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<8} {current / 2 ** 20:10.1f} MiB  {current / count:7.1f} bytes/post  built in {elapsed:6.1f} s")
+    del store
+
+
+def build_legacy(count: int, users: int, content_words: int) -> dict:
+    posts = {}
+    for user_id, post_id, _, content in make_posts(count, users, content_words):
+        posts.setdefault(str(user_id), {})[post_id] = content
+    return posts
+
+
+def build_compact(count: int, users: int, content_words: int) -> PostStore:
+    store = PostStore()
+    for user_id, post_id, title, content in make_posts(count, users, content_words):
+        store.add(user_id, post_id, title, content)
+    return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--content-words", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{args.posts} posts over {args.users} users, {args.content_words} words per post")
+    measure("before", lambda: build_legacy(args.posts, args.users, args.content_words), args.posts)
+    measure("after", lambda: build_compact(args.posts, args.users, args.content_words), args.posts)
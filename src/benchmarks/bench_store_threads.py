@@ -0,0 +1,64 @@
+"""
+Throughput of the sharded in-memory post store under concurrent threads.
+
+Each thread runs a read-heavy mix of `page` and `create` calls on random users; the run is
+repeated for a single shard (one global lock) and for the given shard count. On a regular
+CPython build the GIL serializes the threads whatever the sharding, so the numbers only
+spread apart on a free-threaded build (`python3.13t`). Run from the `src` directory:
+
+    python -m benchmarks.bench_store_threads --operations 200000
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+
+from crud.post_store import PostStore
+from extras.id_generator import SequenceIdGenerator
+
+
+def run(shards: int, threads: int, operations: int, users: int, write_ratio: float) -> float:
+    store = PostStore(shards)
+    generator = SequenceIdGenerator()
+    for user_id in range(users):
+        for _ in range(20):
+            store.create(user_id, "title", "some post content", generator.next_id)
+    start = threading.Barrier(threads + 1)
+    per_thread = operations // threads
+
+    def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        start.wait()
+        for _ in range(per_thread):
+            user_id = rng.randrange(users)
+            if rng.random() < write_ratio:
+                store.create(user_id, "title", "some post content", generator.next_id)
+            else:
+                store.page(user_id, limit=20)
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    for thread in workers:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return per_thread * threads / (time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operations", type=int, default=200_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}")
+    print(f"{'threads':>7} {'1 shard':>14} {f'{args.shards} shards':>14}")
+    for threads in (1, 2, 4, 8):
+        single = run(1, threads, args.operations, args.users, args.write_ratio)
+        sharded = run(args.shards, threads, args.operations, args.users, args.write_ratio)
+        print(f"{threads:>7} {single:>10,.0f} op/s {sharded:>10,.0f} op/s")
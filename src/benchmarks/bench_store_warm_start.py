@@ -0,0 +1,51 @@
+"""
+Warm start time of the in-memory post store: loading a snapshot versus replaying the operation log.
+
+Builds a store, writes it out once as a snapshot and once as a log holding one add record per
+post, then times `load_snapshot` and `replay_log` on the files. Run from the `src` directory:
+
+    python -m benchmarks.bench_store_warm_start --posts 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.bench_store_memory import build_compact, make_posts
+from crud.post_store import PostStore
+from crud.store_journal import StoreJournal, load_snapshot, replay_log, write_snapshot
+
+
+def write_log(path: Path, count: int, users: int, content_words: int) -> None:
+    journal = StoreJournal()
+    journal.enabled = True
+    for user_id, post_id, title, content in make_posts(count, users, content_words):
+        journal.record_add(user_id, post_id, title, content)
+    with open(path, "wb") as file:
+        file.write(journal._pending)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--content-words", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path = Path(directory) / "posts.snap"
+        log_path = Path(directory) / "posts.log"
+
+        store = build_compact(args.posts, args.users, args.content_words)
+        write_snapshot(snapshot_path, args.posts, store.buffers())
+        write_log(log_path, args.posts, args.users, args.content_words)
+        del store
+
+        print(f"{args.posts} posts over {args.users} users")
+        for label, path, load in (("snapshot", snapshot_path, load_snapshot), ("log", log_path, replay_log)):
+            store = PostStore()
+            started = time.perf_counter()
+            load(path, store)
+            elapsed = time.perf_counter() - started
+            print(f"{label:<9} {os.path.getsize(path) / 2 ** 20:8.1f} MiB on disk  loaded in {elapsed:6.2f} s")
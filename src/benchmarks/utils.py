@@ -0,0 +1,63 @@
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RoundTripCounter:
+    """
+    Counts the database round trips (statements, commits and rollbacks) made on an engine.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.statements = 0
+        self.transactions_ended = 0
+
+    @property
+    def round_trips(self) -> int:
+        return self.statements + self.transactions_ended
+
+    def _on_statement(self, *args, **kwargs) -> None:
+        self.statements += 1
+
+    def _on_transaction_end(self, *args, **kwargs) -> None:
+        self.transactions_ended += 1
+
+    @contextmanager
+    def count(self) -> Iterator["RoundTripCounter"]:
+        """
+        Count the round trips made inside the `with` block.
+
+        Yields:
+            RoundTripCounter: This counter, reset to zero.
+        """
+        self.statements = 0
+        self.transactions_ended = 0
+        event.listen(self.engine, "before_cursor_execute", self._on_statement)
+        event.listen(self.engine, "commit", self._on_transaction_end)
+        event.listen(self.engine, "rollback", self._on_transaction_end)
+        try:
+            yield self
+        finally:
+            event.remove(self.engine, "before_cursor_execute", self._on_statement)
+            event.remove(self.engine, "commit", self._on_transaction_end)
+            event.remove(self.engine, "rollback", self._on_transaction_end)
+
+
+@contextmanager
+def timed() -> Iterator[dict]:
+    """
+    Measure the wall time of the `with` block.
+
+    Yields:
+        dict: A dictionary whose `seconds` key is filled in when the block exits.
+    """
+    measurement = {"seconds": 0.0}
+    started = time.perf_counter()
+    try:
+        yield measurement
+    finally:
+        measurement["seconds"] = time.perf_counter() - started
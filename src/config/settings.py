@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, List, Literal, Optional
 from pydantic import MySQLDsn, field_validator
 from dotenv import load_dotenv
 from pydantic_core.core_schema import ValidationInfo
@@ -26,14 +26,94 @@ class Settings(BaseSettings):
     SERVER_PORT: int
     RELOAD: bool = True
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 5040
+    REFRESHABLE_TOKEN_EXPIRE_MINUTES: int = 15  # Lifetime of the access tokens login, register and refresh issue
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30  # Lifetime of a refresh token; every refresh issues a new one
 
-    USER_RSA_PRIVATE_KEY: str
-    USER_RSA_PUBLIC_KEY: str
+    # Access token keys: the RSA pair below is key "default"; JWT_KEY_DIR adds <kid>.pem private
+    # keys and <kid>.pub.pem verify-only keys. New tokens are signed with the newest JWT_ALGORITHM key
+    USER_RSA_PRIVATE_KEY: Optional[str] = None
+    USER_RSA_PUBLIC_KEY: Optional[str] = None
+    JWT_ALGORITHM: Literal["RS256", "ES256", "EdDSA"] = "RS256"
+    JWT_KEY_DIR: Optional[str] = None
+    TOKEN_CACHE_MAXSIZE: int = 100_000  # Verified access tokens remembered to skip their signature check
+    TOKEN_CACHE_TTL: float = 300  # Seconds a verified token is trusted without a new check (never past its exp)
+    # Revoked access tokens: a Bloom filter per worker, refreshed from the revoked_tokens table
+    REVOCATION_BLOOM_CAPACITY: int = 100_000  # Revoked, unexpired tokens the filter is sized for; it grows past it
+    REVOCATION_BLOOM_ERROR_RATE: float = 0.001  # Share of valid tokens checked against the database
+    REVOCATION_SYNC_INTERVAL: float = 5  # Seconds until a revocation on another worker takes effect here
+    REVOCATION_PRUNE_INTERVAL: float = 3600  # Seconds between deleting expired revocations and rebuilding the filter
+    PASSWORD_HASH_EXECUTOR: Literal["thread", "process"] = "thread"  # Where bcrypt runs, off the event loop
+    PASSWORD_HASH_WORKERS: int = 4  # bcrypt calls running at once
+    PASSWORD_HASH_MAX_QUEUE: int = 64  # bcrypt calls waiting for a worker before new ones fail with 503
     SERVER_HOST: str = "localhost"
     PAYLOAD_MAX_SIZE: int = 1  # Payload max size in MB
+    METRICS_TOKEN: Optional[str] = None  # Bearer token GET /metrics/ requires; the endpoint answers 404 while unset
     DOMAIN: Optional[str] = None
     SQLALCHEMY_ASYNC_DATABASE_URI: Optional[MySQLDsn] = None
     CACHE_TIME: int = 300  # Cache time in seconds
+    RESPONSE_CACHE_MAXSIZE: int = 10_000  # Users whose post listings are cached
+    RESPONSE_CACHE_MAX_VARIANTS: int = 16  # Cached pages (limit/cursor combinations) per user
+    POST_CHANGE_LOG_SIZE: int = 256  # Post changes kept per user for GET /post/changes; older versions get a resync
+    POST_CHANGE_LOG_USERS: int = 10_000  # Users whose recent post changes are kept
+    POSTS_PAGE_SIZE: int = 50  # Default number of posts per page
+    POSTS_PAGE_SIZE_MAX: int = 500  # Largest page size a client may request
+    POSTS_STREAM_CHUNK_SIZE: int = 500  # Posts read and written per chunk of a streamed (NDJSON) listing
+    POSTS_BULK_MAX_ITEMS: int = 100  # Most posts a single bulk create or delete request may carry
+
+    # Response compression
+    COMPRESSION_ENABLED: bool = True  # Compress responses with the coding the client accepts
+    COMPRESSION_MIN_SIZE: int = 1024  # Bytes below which a body is sent uncompressed
+    COMPRESSION_ENCODINGS: str = "zstd,br,gzip"  # Codings offered, preferred first; br and zstd need their libraries
+    COMPRESSION_GZIP_LEVEL: int = 6  # 1 (fastest) to 9 (smallest)
+    COMPRESSION_BROTLI_QUALITY: int = 4  # 0 (fastest) to 11 (smallest)
+    COMPRESSION_ZSTD_LEVEL: int = 3  # 1 (fastest) to 22 (smallest)
+
+    STORE_SHARDS: int = 16  # Partitions of the in-memory post store, each with its own lock
+    # Bytes of post columns kept in memory; cold users above it are evicted and reloaded from the
+    # database on their next access (needs write-behind). None keeps every user in memory
+    STORE_MEMORY_BUDGET: Optional[int] = None
+
+    # Durability of the in-memory post store
+    STORE_DATA_DIR: Optional[str] = None  # Directory of the snapshots and operation log, None keeps posts in memory only
+    STORE_LOG_FLUSH_INTERVAL: float = 0.05  # Seconds between group commits of the operation log
+    STORE_LOG_FSYNC: bool = True  # fsync the operation log on every group commit
+    STORE_SNAPSHOT_INTERVAL: float = 600  # Seconds between snapshots while posts keep changing
+    STORE_SNAPSHOT_LOG_BYTES: int = 64 * 1024 * 1024  # Operation log size that triggers a snapshot early
+    STORE_SNAPSHOT_ON_SHUTDOWN: bool = True  # Take a snapshot on shutdown so the next start needs no replay
+
+    # Post ID generation
+    POST_ID_GENERATOR: Literal["snowflake", "sequence"] = "snowflake"  # "sequence" is only unique within one process
+    POST_ID_NODE_ID: int = 0  # Snowflake node ID (0-31), unique per host
+    POST_ID_EPOCH_MS: int = 1704067200000  # Snowflake epoch, 2024-01-01T00:00:00Z
+    POST_ID_SLOT_DIR: Optional[str] = None  # Where processes claim their worker slot, defaults to the temp directory
+
+    # Post store shared by all worker processes of a host, e.g. /dev/shm/lucid-posts; replaces STORE_DATA_DIR
+    STORE_SHARED_PATH: Optional[str] = None
+    STORE_SHARED_SIZE: int = 1024 * 1024 * 1024  # Size of the shared arena file in bytes (sparse)
+
+    # Write-behind from the in-memory post store to the posts table
+    WRITE_BEHIND_ENABLED: bool = True
+    WRITE_BEHIND_BATCH_SIZE: int = 500  # Changes per flush; a full batch triggers a flush right away
+    WRITE_BEHIND_FLUSH_INTERVAL: float = 0.5  # Seconds queued changes wait at most for a flush
+    WRITE_BEHIND_MAX_PENDING: int = 50_000  # Queued changes above which writers are held back
+    WRITE_BEHIND_BACKPRESSURE_TIMEOUT: float = 5.0  # Seconds a held back write waits before failing with 503
+    WRITE_BEHIND_RETRY_DELAY: float = 0.5  # First retry delay of a failed flush, doubled per failure
+    WRITE_BEHIND_RETRY_MAX_DELAY: float = 30.0  # Longest retry delay of a failed flush
+    WRITE_BEHIND_SHUTDOWN_TIMEOUT: float = 30.0  # Seconds shutdown keeps retrying before dropping queued changes
+
+    # Connection pool configuration for the async engine
+    DB_POOL_ENABLED: bool = True  # Set to False to fall back to NullPool (one connection per session)
+    DB_POOL_SIZE: int = 10  # Connections kept open in the pool
+    DB_MAX_OVERFLOW: int = 20  # Extra connections allowed above DB_POOL_SIZE under burst load
+    DB_POOL_RECYCLE: int = 1800  # Recycle connections older than this many seconds
+    DB_POOL_PRE_PING: bool = True  # Test connections for liveness on checkout
+    DB_POOL_TIMEOUT: float = 30.0  # Seconds to wait for a free connection before giving up
+    DB_POOL_PREWARM: Optional[int] = None  # Connections opened at startup, defaults to DB_POOL_SIZE
+
+    # Read replicas, given as a comma separated list of async connection URLs
+    MYSQL_REPLICA_URIS: str = ""
+    DB_REPLICA_STRATEGY: Literal["round_robin", "least_loaded"] = "round_robin"
+    DB_READ_YOUR_WRITES_SECONDS: float = 5.0  # Reads stick to the primary this long after a write
 
     def get_async_connection_url(self) -> str:
         """
@@ -44,6 +124,15 @@ class Settings(BaseSettings):
         """
         return f"{self.MYSQL_SCHEME}://{self.MYSQL_USER}:{self.MYSQL_PASSWORD}@{self.MYSQL_SERVER}:{self.MYSQL_PORT}/{self.MYSQL_DB}"
 
+    def get_replica_connection_urls(self) -> List[str]:
+        """
+        Splits the configured read replica URLs.
+
+        Returns:
+            List[str]: The async connection URLs of the read replicas, empty when none are configured.
+        """
+        return [url.strip() for url in self.MYSQL_REPLICA_URIS.split(",") if url.strip()]
+
     @field_validator("SQLALCHEMY_ASYNC_DATABASE_URI", mode="before")
     def assemble_async_db_connection(cls, v: Optional[str], values: ValidationInfo) -> Any:
         """
@@ -1,2 +1,4 @@
 from .crud_user import user
 from .crud_post import post
+from .crud_refresh_token import refresh_token
+from .crud_revoked_token import revoked_token
@@ -1,10 +1,12 @@
 import logging
-from typing import Any, Dict, Generic, Optional, Type, TypeVar, Union
+from typing import Any, Dict, Generic, List, Optional, Sequence, Tuple, Type, TypeVar, Union
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session, noload
 from sqlalchemy.future import select
+from sqlalchemy.sql import Select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import update as sqlalchemy_update
 from fastapi import HTTPException
@@ -16,8 +18,17 @@ from models import Base
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
+SchemaType = TypeVar("SchemaType", bound=BaseModel)
 
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
+    # Named sets of column names that can be selected as plain rows, without building mapped objects
+    projections: Dict[str, Tuple[str, ...]] = {}
+
+    # Named sets of loader options; "list" keeps relationship loads out of list queries
+    loader_profiles: Dict[str, Tuple[Any, ...]] = {
+        "list": (noload("*"),),
+    }
+
     def __init__(self, model: Type[ModelType]):
         """
         CRUD object with default methods to Create, Read, Update, Delete (CRUD).
@@ -27,19 +38,83 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         """
         self.model = model
 
-    async def async_get(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
+    def with_profile(self, query: Select, profile: Optional[str]) -> Select:
+        """
+        Apply a named loader profile to an ORM query.
+
+        Args:
+            query (Select): The query selecting the model.
+            profile (Optional[str]): The name of the profile in `loader_profiles`, None to keep the
+                loader strategies declared on the model.
+
+        Returns:
+            Select: The query with the profile's loader options applied.
+        """
+        if profile is None:
+            return query
+        return query.options(*self.loader_profiles[profile])
+
+    def select_projection(self, projection: str) -> Select:
+        """
+        Build a query selecting the columns of a named projection.
+
+        Args:
+            projection (str): The name of the projection in `projections`.
+
+        Returns:
+            Select: The query selecting the projection's columns of the model's table.
+        """
+        return select(*(getattr(self.model, column) for column in self.projections[projection]))
+
+    async def async_get(self, db: AsyncSession, id: Any, *, profile: Optional[str] = None) -> Optional[ModelType]:
         """
         Get a single record by ID in an asynchronous session.
 
         Args:
             db (AsyncSession): The database session.
             id (Any): The ID of the record to retrieve.
+            profile (Optional[str]): The loader profile to apply, None for the model defaults.
 
         Returns:
             Optional[ModelType]: The retrieved record, or None if not found.
         """
-        result = await db.execute(select(self.model).filter(self.model.id == id))
+        query = self.with_profile(select(self.model).filter(self.model.id == id), profile)
+        result = await db.execute(query)
         return result.scalars().first()
 
+    async def async_get_projection(
+            self,
+            db: AsyncSession,
+            projection: str,
+            *criteria: Any,
+            order_by: Sequence[Any] = (),
+            limit: Optional[int] = None,
+            schema: Optional[Type[SchemaType]] = None
+    ) -> Union[List[Row], List[SchemaType]]:
+        """
+        Get records as a named column projection, skipping ORM hydration.
+
+        No mapped objects are created, so neither identity map bookkeeping nor relationship
+        loaders run; the result is plain rows, or `schema` instances built from them.
+
+        Args:
+            db (AsyncSession): The database session.
+            projection (str): The name of the projection in `projections`.
+            *criteria (Any): Filter criteria for the WHERE clause.
+            order_by (Sequence[Any]): Columns to order by.
+            limit (Optional[int]): Maximum number of records to return.
+            schema (Optional[Type[SchemaType]]): A Pydantic schema to build from every row.
+
+        Returns:
+            Union[List[Row], List[SchemaType]]: The selected rows, or schema instances when `schema` is given.
+        """
+        query = self.select_projection(projection).filter(*criteria).order_by(*order_by)
+        if limit is not None:
+            query = query.limit(limit)
+        rows = (await db.execute(query)).all()
+        if schema is None:
+            return rows
+        return [schema.model_validate(row._mapping) for row in rows]
+
     # Additional CRUD methods can be added here
 
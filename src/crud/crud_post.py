@@ -1,10 +1,14 @@
-from typing import List
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import delete as sqlalchemy_delete
+from sqlalchemy import insert as sqlalchemy_insert
+from sqlalchemy import func
 
 import schemas
 from crud.base import CRUDBase
+from crud.post_events import notify_posts_changed
+from extras.id_generator import post_id_generator
 from exceptions import NotOwnerException, ItemNotFound
 from models import Post
 
@@ -14,6 +18,11 @@ class CRUDPost(CRUDBase[Post, schemas.PostIn, schemas.PostUpdate]):
     CRUD operations for the Post model.
     """
 
+    projections = {
+        # The columns of schemas.PostOut
+        "out": ("id", "title", "content", "created_at", "updated_at"),
+    }
+
     async def create_post(self, db: AsyncSession, post_in: schemas.PostIn, user_id: int) -> Post:
         """
         Create a new post.
@@ -26,27 +35,151 @@ class CRUDPost(CRUDBase[Post, schemas.PostIn, schemas.PostUpdate]):
         Returns:
             Post: The newly created post.
         """
-        post = Post(**post_in.model_dump())
+        # The ID comes from the ID generator rather than AUTO_INCREMENT, and the session doesn't
+        # expire on commit, so the post is complete without a refresh SELECT
+        post = Post(**post_in.model_dump(), id=post_id_generator.next_id())
         db.add(post)
         post.user_id = user_id
         await db.commit()
-        await db.refresh(post)
+        notify_posts_changed(user_id, created=(post.id,))
         return post
 
-    async def get_user_posts(self, db: AsyncSession, user_id: int) -> List[Post]:
+    async def create_posts(self, db: AsyncSession, posts_in: List[schemas.PostIn], user_id: int) -> List[int]:
+        """
+        Create several posts with a single multi-row INSERT in one transaction.
+
+        Args:
+            db (AsyncSession): The database session.
+            posts_in (List[schemas.PostIn]): The input schemas of the posts to create.
+            user_id (int): The ID of the user creating the posts.
+
+        Returns:
+            List[int]: The IDs of the newly created posts, in the order of `posts_in`.
+        """
+        # The IDs are known before the INSERT, so nothing has to be read back
+        ids = post_id_generator.next_ids(len(posts_in))
+        rows = [{**post_in.model_dump(), "id": post_id, "user_id": user_id}
+                for post_id, post_in in zip(ids, posts_in)]
+        await db.execute(sqlalchemy_insert(Post).values(rows))
+        await db.commit()
+        notify_posts_changed(user_id, created=ids)
+        return ids
+
+    async def get_last_id(self, db: AsyncSession) -> int:
+        """
+        Get the highest post ID in the table.
+
+        Args:
+            db (AsyncSession): The database session.
+
+        Returns:
+            int: The highest post ID, 0 when the table is empty.
+        """
+        return (await db.execute(select(func.max(Post.id)))).scalar() or 0
+
+    async def write_behind_batch(self, db: AsyncSession, rows: List[dict], deleted_ids: List[int]) -> None:
         """
-        Get all posts by a specific user.
+        Apply a batch of changes from the in-memory store in one transaction.
+
+        Rows carry the IDs the store already handed out. Inserts ignore rows that already exist,
+        so a batch whose commit succeeded but was reported as failed can be retried as is. The
+        store has already notified about these changes, so `notify_posts_changed` is not called.
+
+        Args:
+            db (AsyncSession): The database session.
+            rows (List[dict]): The posts to insert, with `id`, `user_id`, `title`, `content` and `created_at`.
+            deleted_ids (List[int]): The IDs of the posts to delete.
+        """
+        if rows:
+            query = sqlalchemy_insert(Post).values(rows)
+            query = query.prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite")
+            await db.execute(query)
+        if deleted_ids:
+            await db.execute(sqlalchemy_delete(Post).where(Post.id.in_(deleted_ids)))
+        await db.commit()
+
+    async def get_user_posts(self, db: AsyncSession, user_id: int, *,
+                             limit: Optional[int] = None, cursor: Optional[int] = None) -> List[Post]:
+        """
+        Get the posts by a specific user in ascending ID order.
+
+        Uses keyset pagination on (user_id, id), which is served by the `ix_posts_user_id_id` index.
+        The "list" loader profile is applied, so the returned posts don't load `Post.user`.
 
         Args:
             db (AsyncSession): The database session.
             user_id (int): The ID of the user whose posts are to be retrieved.
+            limit (Optional[int]): Maximum number of posts to return, None for all of them.
+            cursor (Optional[int]): Only return posts with an ID greater than this one.
 
         Returns:
             List[Post]: A list of posts by the user.
         """
-        result = await db.execute(select(Post).filter(Post.user_id == user_id))
+        query = self.with_profile(select(Post), "list").filter(Post.user_id == user_id)
+        if cursor is not None:
+            query = query.filter(Post.id > cursor)
+        query = query.order_by(Post.id)
+        if limit is not None:
+            query = query.limit(limit)
+        result = await db.execute(query)
         return result.scalars().all()
 
+    async def get_user_posts_page(self, db: AsyncSession, user_id: int, *, limit: int,
+                                  cursor: Optional[int] = None) -> Tuple[List[schemas.PostOut], Optional[int]]:
+        """
+        Get one page of posts by a specific user.
+
+        The page is read with the "out" projection and returned as `schemas.PostOut`, so no
+        `Post` objects are built and no relationships are loaded.
+
+        Args:
+            db (AsyncSession): The database session.
+            user_id (int): The ID of the user whose posts are to be retrieved.
+            limit (int): Maximum number of posts to return.
+            cursor (Optional[int]): ID of the last post of the previous page, None to start from the first post.
+
+        Returns:
+            Tuple[List[schemas.PostOut], Optional[int]]: The posts of the page and the cursor of the next
+                page, which is None when there are no more posts.
+        """
+        criteria = [Post.user_id == user_id]
+        if cursor is not None:
+            criteria.append(Post.id > cursor)
+        # Fetch one extra row to find out whether another page follows
+        posts = await self.async_get_projection(
+            db, "out", *criteria, order_by=[Post.id], limit=limit + 1, schema=schemas.PostOut
+        )
+        if len(posts) > limit:
+            posts = posts[:limit]
+            return posts, posts[-1].id
+        return posts, None
+
+    async def stream_user_posts(self, db: AsyncSession, user_id: int, *, chunk_size: int,
+                                cursor: Optional[int] = None) -> AsyncIterator[List[dict]]:
+        """
+        Stream the posts by a specific user in ascending ID order, `chunk_size` rows at a time.
+
+        The rows are read through a server-side cursor with the "out" projection, so only one
+        chunk is held in memory however many posts the user has. The session's connection is
+        busy until the iteration ends.
+
+        Args:
+            db (AsyncSession): The database session.
+            user_id (int): The ID of the user whose posts are to be retrieved.
+            chunk_size (int): Number of rows fetched and yielded at a time.
+            cursor (Optional[int]): Only return posts with an ID greater than this one.
+
+        Yields:
+            List[dict]: The columns of `schemas.PostOut` of up to `chunk_size` posts.
+        """
+        query = self.select_projection("out").filter(Post.user_id == user_id)
+        if cursor is not None:
+            query = query.filter(Post.id > cursor)
+        query = query.order_by(Post.id).execution_options(yield_per=chunk_size)
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            yield [dict(row._mapping) for row in rows]
+
     async def async_remove_if_owner(self, db: AsyncSession, *, id: int, user_id: int) -> None:
         """
         Remove a post if the current user is the owner.
@@ -60,15 +193,67 @@ class CRUDPost(CRUDBase[Post, schemas.PostIn, schemas.PostUpdate]):
             ItemNotFound: If the post does not exist.
             NotOwnerException: If the user is not the owner of the post.
         """
-        post = await self.async_get(db, id)
-        if not post:
-            raise ItemNotFound
-        if post.user_id != user_id:
-            raise NotOwnerException
+        # The owner-scoped DELETE decides the common case on its own; only when it matched
+        # nothing is the owner looked up to tell a missing post from someone else's
         query = sqlalchemy_delete(self.model).where(self.model.id == id, self.model.user_id == user_id)
-        await db.execute(query)
+        result = await db.execute(query)
+        if result.rowcount:
+            await db.commit()
+            notify_posts_changed(user_id, deleted=(id,))
+            return
+
+        owner_id = (await db.execute(select(self.model.user_id).where(self.model.id == id))).scalar()
+        if owner_id is None:
+            raise ItemNotFound
+        raise NotOwnerException
+
+    async def remove_many_if_owner(self, db: AsyncSession, *, ids: List[int], user_id: int) -> Dict[int, str]:
+        """
+        Remove several posts owned by the current user in one transaction.
+
+        Where the dialect supports `DELETE ... RETURNING`, the owner-scoped DELETE runs first and
+        the owners are only looked up for the IDs it did not remove. Otherwise the owners of all
+        requested posts are read and locked with a single SELECT, then the owned ones are removed
+        with a single DELETE.
+
+        Args:
+            db (AsyncSession): The database session.
+            ids (List[int]): The IDs of the posts to be removed.
+            user_id (int): The ID of the user attempting to remove the posts.
+
+        Returns:
+            Dict[int, str]: The outcome for every requested ID: "deleted", "not_found" or "not_owner".
+        """
+        if db.get_bind().dialect.delete_returning:
+            query = sqlalchemy_delete(self.model).where(
+                self.model.id.in_(ids), self.model.user_id == user_id
+            ).returning(self.model.id)
+            owners = {post_id: user_id for post_id in (await db.execute(query)).scalars()}
+            remaining = [post_id for post_id in ids if post_id not in owners]
+            if remaining:
+                query = select(self.model.id, self.model.user_id).where(self.model.id.in_(remaining))
+                owners.update((await db.execute(query)).all())
+        else:
+            query = select(self.model.id, self.model.user_id).where(self.model.id.in_(ids)).with_for_update()
+            owners = dict((await db.execute(query)).all())
+            owned = [post_id for post_id, owner_id in owners.items() if owner_id == user_id]
+            if owned:
+                query = sqlalchemy_delete(self.model).where(self.model.id.in_(owned), self.model.user_id == user_id)
+                await db.execute(query)
         await db.commit()
-        return
+        removed = [post_id for post_id, owner_id in owners.items() if owner_id == user_id]
+        if removed:
+            notify_posts_changed(user_id, deleted=removed)
+
+        results = {}
+        for post_id in ids:
+            if post_id not in owners:
+                results[post_id] = "not_found"
+            elif owners[post_id] != user_id:
+                results[post_id] = "not_owner"
+            else:
+                results[post_id] = "deleted"
+        return results
 
 
 # Instantiate the CRUDPost class for the Post model
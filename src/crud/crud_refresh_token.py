@@ -0,0 +1,119 @@
+import datetime
+import uuid
+from typing import Tuple
+
+from sqlalchemy import update as sqlalchemy_update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import schemas
+from config import settings
+from crud.base import CRUDBase
+from exceptions import InvalidToken
+from extras.security import create_refresh_token, hash_refresh_token
+from models import RefreshToken
+
+
+class CRUDRefreshToken(CRUDBase[RefreshToken, schemas.RefreshSchema, schemas.RefreshSchema]):
+    """
+    CRUD operations for the RefreshToken model.
+    """
+
+    async def issue(self, db: AsyncSession, user_id: int, family: str = None) -> str:
+        """
+        Issue a new refresh token for a user.
+
+        Args:
+            db (AsyncSession): The database session.
+            user_id (int): The ID of the user.
+            family (str, optional): The family of the token being rotated, None to start a new one.
+
+        Returns:
+            str: The refresh token, which is only returned here and never stored.
+        """
+        token = create_refresh_token()
+        db.add(RefreshToken(
+            user_id=user_id,
+            token_hash=hash_refresh_token(token),
+            family=family or uuid.uuid4().hex,
+            expires_at=datetime.datetime.now() + datetime.timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+            revoked=False,
+        ))
+        await db.commit()
+        return token
+
+    async def rotate(self, db: AsyncSession, token: str) -> Tuple[int, str]:
+        """
+        Redeem a refresh token for a new one of the same family.
+
+        The token is revoked with a single conditional UPDATE on its unique hash, so of two
+        concurrent refreshes with the same token only one succeeds. Presenting a token that was
+        already rotated means it was copied, so its whole family is revoked and the holder of the
+        latest token has to log in again.
+
+        Args:
+            db (AsyncSession): The database session.
+            token (str): The refresh token presented by the client.
+
+        Returns:
+            Tuple[int, str]: The ID of the user and the new refresh token.
+
+        Raises:
+            InvalidToken: If the token is unknown, expired, or was already used.
+        """
+        token_hash = hash_refresh_token(token)
+        result = await db.execute(
+            sqlalchemy_update(RefreshToken)
+            .where(RefreshToken.token_hash == token_hash,
+                   RefreshToken.revoked.is_(False),
+                   RefreshToken.expires_at > datetime.datetime.now())
+            .values(revoked=True)
+        )
+        # The session is on the primary from the UPDATE on, so the rows read below are current
+        query = await db.execute(
+            select(RefreshToken.user_id, RefreshToken.family).filter(RefreshToken.token_hash == token_hash)
+        )
+        row = query.first()
+        if result.rowcount != 1:
+            if row is not None:
+                await self.revoke_family(db, row.family)
+            else:
+                await db.rollback()
+            raise InvalidToken
+        return row.user_id, await self.issue(db, row.user_id, row.family)
+
+    async def revoke(self, db: AsyncSession, token: str, user_id: int) -> None:
+        """
+        Revoke a refresh token of a user and every token rotated from the same login.
+
+        Unknown tokens and tokens of other users are ignored.
+
+        Args:
+            db (AsyncSession): The database session.
+            token (str): The refresh token presented by the client.
+            user_id (int): The ID of the user logging out.
+        """
+        query = await db.execute(
+            select(RefreshToken.family).filter(RefreshToken.token_hash == hash_refresh_token(token),
+                                               RefreshToken.user_id == user_id)
+        )
+        family = query.scalar()
+        if family is not None:
+            await self.revoke_family(db, family)
+
+    async def revoke_family(self, db: AsyncSession, family: str) -> None:
+        """
+        Revoke every refresh token rotated from the same login.
+
+        Args:
+            db (AsyncSession): The database session.
+            family (str): The family of the tokens.
+        """
+        await db.execute(
+            sqlalchemy_update(RefreshToken).where(RefreshToken.family == family).values(revoked=True)
+        )
+        await db.commit()
+
+
+# Instantiate the CRUDRefreshToken class for the RefreshToken model
+refresh_token = CRUDRefreshToken(RefreshToken)
@@ -0,0 +1,85 @@
+import datetime
+from typing import List, Tuple
+
+from sqlalchemy import delete as sqlalchemy_delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import schemas
+from crud.base import CRUDBase
+from models import RevokedToken
+
+
+class CRUDRevokedToken(CRUDBase[RevokedToken, schemas.LogoutSchema, schemas.LogoutSchema]):
+    """
+    CRUD operations for the RevokedToken model.
+    """
+
+    async def revoke(self, db: AsyncSession, jti: str, user_id: int, expires_at: datetime.datetime) -> None:
+        """
+        Add an access token to the denylist. Revoking a token twice is not an error.
+
+        Args:
+            db (AsyncSession): The database session.
+            jti (str): The `jti` claim of the token.
+            user_id (int): The ID of the user the token was issued to.
+            expires_at (datetime.datetime): The expiry of the token.
+        """
+        db.add(RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+
+    async def is_revoked(self, db: AsyncSession, jti: str) -> bool:
+        """
+        Check the denylist for an access token.
+
+        Args:
+            db (AsyncSession): The database session.
+            jti (str): The `jti` claim of the token.
+
+        Returns:
+            bool: True if the token was revoked.
+        """
+        query = await db.execute(select(RevokedToken.id).filter(RevokedToken.jti == jti))
+        return query.first() is not None
+
+    async def get_active_since(self, db: AsyncSession, last_id: int) -> List[Tuple[int, str]]:
+        """
+        Get the revocations of unexpired tokens added after a given row.
+
+        Args:
+            db (AsyncSession): The database session.
+            last_id (int): The highest row ID already seen, 0 for all of them.
+
+        Returns:
+            List[Tuple[int, str]]: The row ID and `jti` of each revocation, in ID order.
+        """
+        query = await db.execute(
+            select(RevokedToken.id, RevokedToken.jti)
+            .filter(RevokedToken.id > last_id, RevokedToken.expires_at > datetime.datetime.now())
+            .order_by(RevokedToken.id)
+        )
+        return [tuple(row) for row in query.all()]
+
+    async def prune(self, db: AsyncSession) -> int:
+        """
+        Delete the revocations of tokens that have expired on their own.
+
+        Args:
+            db (AsyncSession): The database session.
+
+        Returns:
+            int: The number of rows deleted.
+        """
+        result = await db.execute(
+            sqlalchemy_delete(RevokedToken).where(RevokedToken.expires_at <= datetime.datetime.now())
+        )
+        await db.commit()
+        return result.rowcount
+
+
+# Instantiate the CRUDRevokedToken class for the RevokedToken model
+revoked_token = CRUDRevokedToken(RevokedToken)
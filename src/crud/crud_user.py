@@ -53,8 +53,9 @@ class CRUDUser(CRUDBase[User, schemas.UserInSchema, schemas.UserUpdate]):
 
         Raises:
             UserExistsWithThisEmail: If a user with the given email already exists.
+            HashingQueueFull: If the password hashing pool is saturated.
         """
-        hashed_pass = get_password_hash(user_in.password)
+        hashed_pass = await get_password_hash(user_in.password)
         user_in.password = hashed_pass
         user = User(**user_in.model_dump())
         db.add(user)
@@ -78,6 +79,7 @@ class CRUDUser(CRUDBase[User, schemas.UserInSchema, schemas.UserUpdate]):
 
         Raises:
             InvalidCredentials: If the credentials are invalid.
+            HashingQueueFull: If the password hashing pool is saturated.
         """
         user = await self.get_user(db, input=login_schema.email)
         if not user:
@@ -1,33 +1,170 @@
-from cachetools import TTLCache
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
 from config import settings
+from crud.crud_post import post as crud_post
+from crud.post_changes import CREATE, DELETE, post_change_log
+from crud.post_events import notify_posts_changed
+from crud.post_store import ENCODING, PostStore
+from crud.shared_store import shared_arena
+from crud.store_journal import OP_ADD, store_journal
+from crud.store_residency import store_residency
+from crud.write_behind import post_write_behind
+from db.session import AsyncDBSingleton
+from extras.id_generator import post_id_generator
 
 # In-memory storage for posts
-posts: Dict[str, Dict[int, str]] = {}
-post_id_counter = 0
+posts = PostStore(settings.STORE_SHARDS)
 
-# Cache for storing responses for settings.CACHE_TIME seconds
-response_cache = TTLCache(maxsize=100, ttl=settings.CACHE_TIME)
 
+def start_shared_store(path: str, capacity: int) -> None:
+    """
+    Share the posts with the other worker processes on this host through an mmap-backed arena.
+
+    Args:
+        path (str): The arena file, the same for every worker.
+        capacity (int): Size of the arena in bytes when it is created.
+    """
+    shared_arena.open(path, capacity, posts)
+
+
+def stop_shared_store() -> None:
+    """
+    Unmap the shared arena; its posts stay for the other workers.
+    """
+    shared_arena.close()
+
+
+def sync_posts() -> None:
+    """
+    Apply the writes other worker processes made to the shared store, a no-op without one.
+    """
+    shared_arena.sync()
+
+
+async def start_persistence(directory: str) -> None:
+    """
+    Restore the posts saved before the last shutdown and start journaling new changes.
+
+    Args:
+        directory (str): The directory holding the snapshots and operation logs of the store.
+    """
+    post_id_generator.advance(store_journal.load(directory, posts, recover=settings.WRITE_BEHIND_ENABLED))
+    await store_journal.start()
+
+
+async def stop_persistence() -> None:
+    """
+    Commit every buffered change to disk and stop journaling.
+    """
+    await store_journal.stop()
+
+
+async def start_write_behind() -> None:
+    """
+    Start copying post changes to the database.
+
+    The posts table takes the IDs handed out here, so the ID generator is first moved past
+    the highest ID already in the table; otherwise a store that lost its state could reuse
+    IDs of rows that the write-behind inserts would then silently skip.
+
+    The changes restored from the journal may not have been committed before the restart,
+    so they are queued again; inserts of rows that exist are ignored. The journal keeps its
+    logs until write-behind has committed the changes they hold. Should this fail, it keeps
+    every log, so the changes made meanwhile are queued on the next start, before any user
+    can be evicted and reloaded from the database.
+    """
+    db = await AsyncDBSingleton.get_session()
+    try:
+        last_post_id = await crud_post.get_last_id(db)
+    finally:
+        await db.close()
+    if shared_arena.enabled:
+        shared_arena.advance_post_id(last_post_id)
+    post_id_generator.advance(last_post_id)
+    await post_write_behind.start()
+    store_journal.pending_since = post_write_behind.oldest_queued_at
+    for op, user_id, post_id, title, content in store_journal.take_recovered():
+        if op == OP_ADD:
+            post_write_behind.enqueue_insert(user_id, post_id, title.decode(ENCODING), content.decode(ENCODING),
+                                             queued_at=store_journal.recovered_at)
+        else:
+            post_write_behind.enqueue_delete(user_id, post_id, queued_at=store_journal.recovered_at)
+
+
+async def stop_write_behind() -> None:
+    """
+    Flush the queued post changes to the database and stop the write-behind task.
+    """
+    await post_write_behind.stop()
+
+
+def start_residency(budget: Optional[int]) -> None:
+    """
+    Load users' posts from the database on first access and evict cold users over `budget`.
+
+    Only valid once write-behind is running, so that the database holds every post.
+
+    Args:
+        budget (Optional[int]): Most bytes of post columns to keep in memory, None for no limit.
+    """
+    store_residency.start(posts, budget)
+
+
+def stop_residency() -> None:
+    """
+    Stop loading and evicting users.
+    """
+    store_residency.stop()
+
+
+async def load_posts(user_id: str) -> None:
+    """
+    Make sure a user's posts are in memory, reloading them from the database if they were evicted.
+
+    Must be awaited before the user's posts are read or written through this module.
 
-def save_post(user_id: str, text: str) -> int:
+    Args:
+        user_id (str): The ID of the user.
+    """
+    await store_residency.ensure_resident(int(user_id))
+
+
+def save_post(user_id: str, text: str, title: str = "") -> int:
     """
     Save a new post in memory.
 
     Args:
         user_id (str): The ID of the user creating the post.
         text (str): The content of the post.
+        title (str): The title of the post.
 
     Returns:
         int: The ID of the newly created post.
     """
-    global post_id_counter
-    post_id_counter += 1
-    if user_id not in posts:
-        posts[user_id] = {}
-    posts[user_id][post_id_counter] = text
-    return post_id_counter
+    if shared_arena.enabled:
+        # The arena picks the ID and applies the post to `posts`
+        post_id = shared_arena.add(int(user_id), title, text)
+    else:
+        post_id = posts.create(int(user_id), title, text, post_id_generator.next_id)
+        notify_posts_changed(int(user_id), created=(post_id,))
+    store_journal.record_add(int(user_id), post_id, title, text)
+    post_write_behind.enqueue_insert(int(user_id), post_id, title, text)
+    store_residency.enforce()
+    return post_id
+
+
+def save_posts(user_id: str, items: List[Tuple[str, str]]) -> List[int]:
+    """
+    Save several new posts in memory at once.
+
+    Args:
+        user_id (str): The ID of the user creating the posts.
+        items (List[Tuple[str, str]]): The (title, content) pairs of the posts.
+
+    Returns:
+        List[int]: The IDs of the newly created posts, in the order of `items`.
+    """
+    return [save_post(user_id, content, title) for title, content in items]
 
 
 def get_cached_posts(user_id: str) -> List[str]:
@@ -40,7 +177,90 @@ def get_cached_posts(user_id: str) -> List[str]:
     Returns:
         List[str]: A list of posts for the user.
     """
-    return list(posts.get(user_id, {}).values())
+    return get_cached_posts_page(user_id)[0]
+
+
+def get_cached_posts_page(user_id: str, limit: Optional[int] = None,
+                          cursor: Optional[int] = None) -> Tuple[List[str], Optional[int]]:
+    """
+    Retrieve one page of cached posts for a specific user using keyset pagination.
+
+    Args:
+        user_id (str): The ID of the user whose posts are to be retrieved.
+        limit (Optional[int]): Maximum number of posts to return, None for all of them.
+        cursor (Optional[int]): ID of the last post of the previous page, None to start from the first post.
+
+    Returns:
+        Tuple[List[str], Optional[int]]: The posts of the page and the cursor of the next page,
+            which is None when there are no more posts.
+    """
+    sync_posts()
+    return posts.page(int(user_id), limit, cursor)
+
+
+async def iter_cached_posts(user_id: str, cursor: Optional[int] = None,
+                            chunk_size: int = settings.POSTS_STREAM_CHUNK_SIZE) -> AsyncIterator[List[str]]:
+    """
+    Iterate over all cached posts of a user after `cursor`, one chunk at a time.
+
+    Each chunk is read as a separate keyset page, so no more than `chunk_size` posts are
+    copied out of the store at once, the shard lock is only held per chunk, and posts added or
+    deleted while the iteration runs are seen or skipped as a new page would.
+
+    Args:
+        user_id (str): The ID of the user whose posts are to be retrieved.
+        cursor (Optional[int]): ID of the post to start after, None to start from the first post.
+        chunk_size (int): Maximum number of posts per chunk.
+
+    Yields:
+        List[str]: The posts of the next chunk.
+    """
+    while True:
+        # The user may have been evicted since the previous chunk
+        await load_posts(user_id)
+        chunk, cursor = get_cached_posts_page(user_id, chunk_size, cursor)
+        if chunk:
+            yield chunk
+        if cursor is None:
+            return
+
+
+async def get_cached_post_changes(user_id: str, since: int, current: int) -> Optional[List[dict]]:
+    """
+    Get the net changes of a user's posts between two versions.
+
+    A post created and deleted in between is left out, and a created post is sent with its
+    current title and content, read from the store.
+
+    Args:
+        user_id (str): The ID of the user whose changes are to be retrieved.
+        since (int): The version the client has seen.
+        current (int): The version to bring the client to.
+
+    Returns:
+        Optional[List[dict]]: The changes in the order they were made, each with `op` ("create"
+            or "delete") and `id`, or None if the client has to resync from a full listing.
+    """
+    changes = post_change_log.since(int(user_id), since, current)
+    if changes is None:
+        return None
+    # Net operation per post, ordered by its last change
+    net: Dict[int, str] = {}
+    for _, op, post_id in changes:
+        previous = net.pop(post_id, None)
+        if not (op == DELETE and previous == CREATE):
+            net[post_id] = op
+    await load_posts(user_id)
+    created = posts.get_many(int(user_id), [post_id for post_id, op in net.items() if op == CREATE])
+    result = []
+    for post_id, op in net.items():
+        if op == CREATE and post_id in created:
+            title, content = created[post_id]
+            result.append({"op": CREATE, "id": post_id, "title": title, "content": content})
+        else:
+            # Deleted, or gone from the store since it was logged
+            result.append({"op": DELETE, "id": post_id})
+    return result
 
 
 def delete_in_mem_post(user_id: str, post_id: int) -> bool:
@@ -54,7 +274,27 @@ def delete_in_mem_post(user_id: str, post_id: int) -> bool:
     Returns:
         bool: True if the post was deleted, False otherwise.
     """
-    if user_id in posts and post_id in posts[user_id]:
-        del posts[user_id][post_id]
-        return True
-    return False
+    if shared_arena.enabled:
+        deleted = shared_arena.remove(int(user_id), post_id)
+    else:
+        deleted = posts.remove(int(user_id), post_id)
+        if deleted:
+            notify_posts_changed(int(user_id), deleted=(post_id,))
+    if deleted:
+        store_journal.record_delete(int(user_id), post_id)
+        post_write_behind.enqueue_delete(int(user_id), post_id)
+    return deleted
+
+
+def delete_in_mem_posts(user_id: str, post_ids: List[int]) -> List[bool]:
+    """
+    Delete several posts from memory.
+
+    Args:
+        user_id (str): The ID of the user who owns the posts.
+        post_ids (List[int]): The IDs of the posts to be deleted.
+
+    Returns:
+        List[bool]: For every ID in `post_ids`, True if that post was deleted, False otherwise.
+    """
+    return [delete_in_mem_post(user_id, post_id) for post_id in post_ids]
@@ -0,0 +1,117 @@
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Sequence, Tuple
+
+from config import settings
+
+CREATE = "create"
+DELETE = "delete"
+
+# A logged change: version of the user's posts it produced, operation, post ID
+Change = Tuple[int, str, int]
+
+
+class UserChangeLog:
+    """
+    The latest changes of one user's posts, covering the versions after `base`.
+    """
+    __slots__ = ("base", "changes")
+
+    def __init__(self, base: int):
+        self.base = base
+        self.changes: Deque[Change] = deque()
+
+
+class PostChangeLog:
+    """
+    Bounded log of the creates and deletes of every user's posts, behind GET /post/changes.
+
+    Changes are recorded by `notify_posts_changed` with the version (see `PostVersions`) they
+    gave the user's posts, so a client that has seen a version can be sent only the changes
+    after it. At most `max_changes` changes are kept per user, for the `max_users` users that
+    changed most recently. A client whose version is older than what is left of its user's
+    log, or that cannot be placed in it, is told to resync from a full listing. A change whose
+    posts are not known (e.g. the shared store was rebuilt) also forces a resync.
+    """
+
+    def __init__(self, max_changes: int, max_users: int):
+        self.max_changes = max_changes
+        self.max_users = max_users
+        self._logs: "OrderedDict[int, UserChangeLog]" = OrderedDict()
+        self.recorded = 0
+        self.resets = 0
+        self.served = 0
+        self.resyncs = 0
+
+    def record(self, user_id: int, version: int, previous: int,
+               created: Sequence[int] = (), deleted: Sequence[int] = ()) -> None:
+        """
+        Log a change of a user's posts.
+
+        Args:
+            user_id (int): The ID of the user whose posts changed.
+            version (int): The version the change gave the user's posts.
+            previous (int): The version before the change.
+            created (Sequence[int]): The IDs of the posts created.
+            deleted (Sequence[int]): The IDs of the posts deleted.
+        """
+        log = self._logs.get(user_id)
+        if log is None:
+            log = self._logs[user_id] = UserChangeLog(previous)
+            if len(self._logs) > self.max_users:
+                self._logs.popitem(last=False)
+        else:
+            self._logs.move_to_end(user_id)
+        if not created and not deleted:
+            # Nothing to replay: every client of the user has to resync
+            log.base = version
+            log.changes.clear()
+            self.resets += 1
+            return
+        log.changes.extend((version, CREATE, post_id) for post_id in created)
+        log.changes.extend((version, DELETE, post_id) for post_id in deleted)
+        while len(log.changes) > self.max_changes:
+            log.base = log.changes.popleft()[0]
+        self.recorded += len(created) + len(deleted)
+
+    def since(self, user_id: int, since: int, current: int) -> Optional[List[Change]]:
+        """
+        Get the changes of a user's posts after a version, up to the current one.
+
+        Args:
+            user_id (int): The ID of the user.
+            since (int): The version the client has seen.
+            current (int): The current version of the user's posts.
+
+        Returns:
+            Optional[List[Change]]: The changes in the order they were made, or None if they
+                are no longer all in the log and the client has to resync.
+        """
+        if since == current:
+            self.served += 1
+            return []
+        log = self._logs.get(user_id)
+        if since > current or log is None or since < log.base:
+            self.resyncs += 1
+            return None
+        self.served += 1
+        return [change for change in log.changes if since < change[0] <= current]
+
+    def stats(self) -> dict:
+        """
+        Get the log counters.
+
+        Returns:
+            dict: Users and changes held, and the recorded, reset, served and resync counters.
+        """
+        return {
+            "users": len(self._logs),
+            "changes": sum(len(log.changes) for log in self._logs.values()),
+            "recorded": self.recorded,
+            "resets": self.resets,
+            "served": self.served,
+            "resyncs": self.resyncs,
+        }
+
+
+# Recent changes of the users' posts, for GET /post/changes
+post_change_log = PostChangeLog(max_changes=settings.POST_CHANGE_LOG_SIZE, max_users=settings.POST_CHANGE_LOG_USERS)
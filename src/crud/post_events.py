@@ -0,0 +1,26 @@
+from typing import Optional, Sequence
+
+from crud.post_changes import post_change_log
+from extras.cache import post_versions, response_cache
+
+
+def notify_posts_changed(user_id: int, created: Sequence[int] = (), deleted: Sequence[int] = (),
+                         version: Optional[int] = None) -> None:
+    """
+    Propagate a change of a user's posts to everything derived from them.
+
+    Called by both the in-memory store and the database CRUD layer after posts of a user
+    were created or deleted.
+
+    Args:
+        user_id (int): The ID of the user whose posts changed.
+        created (Sequence[int]): The IDs of the posts created, for the change log.
+        deleted (Sequence[int]): The IDs of the posts deleted, for the change log. When neither
+            is given, clients following the change log have to resync.
+        version (Optional[int]): The version the change gives the user's posts, when it comes
+            from a clock shared with the other workers (see `PostVersions.bump`).
+    """
+    previous = post_versions.get(user_id)
+    version = post_versions.bump(user_id, version)
+    post_change_log.record(user_id, version, previous, created, deleted)
+    response_cache.invalidate(user_id)
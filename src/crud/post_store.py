@@ -0,0 +1,607 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Encoding of titles and contents inside a user's arena
+ENCODING = "utf-8"
+
+# Least recently used users of a shard that eviction looks at before moving on to the next shard
+EVICTION_SCAN = 64
+
+
+class UserPostColumns:
+    """
+    Posts of a single user stored column-wise.
+
+    Instead of one `str` object per post plus dictionary entries and boxed `int` keys, a user's
+    posts are kept in a few flat arrays and one bytearray:
+
+    - `ids`: post IDs in ascending order (8 bytes per post),
+    - `offsets`: where each post's record starts in `arena` (8 bytes per post),
+    - `title_lengths`: byte length of the title at the start of each record (4 bytes per post),
+    - `dead`: tombstone flag of each record (1 byte per post),
+    - `arena`: the UTF-8 encoded title followed by the content of every record.
+
+    Deleting a post only sets its tombstone; the columns are compacted once tombstones make up
+    more than half of the records. Post IDs are handed out in increasing order, so appending
+    keeps `ids` sorted and a page can be located with a binary search.
+    """
+    __slots__ = ("ids", "offsets", "title_lengths", "dead", "arena", "live")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.offsets = array("q")
+        self.title_lengths = array("I")
+        self.dead = bytearray()
+        self.arena = bytearray()
+        self.live = 0
+
+    def __len__(self) -> int:
+        return self.live
+
+    def add(self, post_id: int, title: str, content: str) -> None:
+        """
+        Append a post.
+
+        Args:
+            post_id (int): The ID of the post, greater than every ID already stored.
+            title (str): The title of the post.
+            content (str): The content of the post.
+        """
+        self.add_encoded(post_id, title.encode(ENCODING), content.encode(ENCODING))
+
+    def add_encoded(self, post_id: int, title: bytes, content: bytes) -> None:
+        """
+        Append a post whose title and content are already encoded.
+
+        Args:
+            post_id (int): The ID of the post, greater than every ID already stored.
+            title (bytes): The encoded title of the post.
+            content (bytes): The encoded content of the post.
+        """
+        self.ids.append(post_id)
+        self.offsets.append(len(self.arena))
+        self.title_lengths.append(len(title))
+        self.dead.append(0)
+        self.arena += title
+        self.arena += content
+        self.live += 1
+
+    def __contains__(self, post_id: int) -> bool:
+        index = bisect_left(self.ids, post_id)
+        return index < len(self.ids) and self.ids[index] == post_id and not self.dead[index]
+
+    def remove(self, post_id: int) -> bool:
+        """
+        Delete a post by marking its record as dead.
+
+        Args:
+            post_id (int): The ID of the post to delete.
+
+        Returns:
+            bool: True if the post existed and was deleted, False otherwise.
+        """
+        if post_id not in self:
+            return False
+        self.dead[bisect_left(self.ids, post_id)] = 1
+        self.live -= 1
+        if len(self.ids) - self.live > max(self.live, 32):
+            self.compact()
+        return True
+
+    def compact(self) -> None:
+        """
+        Rewrite the columns without the dead records.
+        """
+        ids, offsets, title_lengths, arena = array("q"), array("q"), array("I"), bytearray()
+        for index in range(len(self.ids)):
+            if self.dead[index]:
+                continue
+            start, end = self._bounds(index)
+            ids.append(self.ids[index])
+            offsets.append(len(arena))
+            title_lengths.append(self.title_lengths[index])
+            arena += self.arena[start:end]
+        self.ids, self.offsets, self.title_lengths, self.arena = ids, offsets, title_lengths, arena
+        self.dead = bytearray(len(ids))
+
+    def _bounds(self, index: int) -> Tuple[int, int]:
+        start = self.offsets[index]
+        end = self.offsets[index + 1] if index + 1 < len(self.offsets) else len(self.arena)
+        return start, end
+
+    def content(self, index: int) -> str:
+        start, end = self._bounds(index)
+        return self.arena[start + self.title_lengths[index]:end].decode(ENCODING)
+
+    def record(self, index: int) -> Tuple[int, str, str]:
+        start, end = self._bounds(index)
+        middle = start + self.title_lengths[index]
+        return self.ids[index], self.arena[start:middle].decode(ENCODING), self.arena[middle:end].decode(ENCODING)
+
+    def page(self, limit: Optional[int], cursor: Optional[int]) -> Tuple[List[str], Optional[int]]:
+        """
+        Get the contents of the posts that come after `cursor`.
+
+        Args:
+            limit (Optional[int]): Maximum number of posts to return, None for all of them.
+            cursor (Optional[int]): ID of the last post of the previous page, None to start from the beginning.
+
+        Returns:
+            Tuple[List[str], Optional[int]]: The contents and the cursor of the next page (None on the last page).
+        """
+        start = 0 if cursor is None else bisect_right(self.ids, cursor)
+        result = []
+        last_id = None
+        for index in range(start, len(self.ids)):
+            if self.dead[index]:
+                continue
+            if limit is not None and len(result) == limit:
+                return result, last_id
+            result.append(self.content(index))
+            last_id = self.ids[index]
+        return result, None
+
+    def records(self) -> Iterator[Tuple[int, str, str]]:
+        """
+        Iterate over the live posts.
+
+        Yields:
+            Tuple[int, str, str]: The ID, title and content of every live post, in ID order.
+        """
+        for index in range(len(self.ids)):
+            if not self.dead[index]:
+                yield self.record(index)
+
+    def to_buffers(self) -> Tuple[bytes, bytes, bytes, bytes]:
+        """
+        Copy the live records out as raw column buffers, in the layout read by `from_buffers`.
+
+        Returns:
+            Tuple[bytes, bytes, bytes, bytes]: The native-endian ids, offsets and title lengths
+                arrays and the arena, without dead records.
+        """
+        columns = self
+        if self.live != len(self.ids):
+            columns = UserPostColumns()
+            columns.ids, columns.offsets = array("q", self.ids), array("q", self.offsets)
+            columns.title_lengths, columns.arena = array("I", self.title_lengths), self.arena
+            columns.dead, columns.live = self.dead, self.live
+            # compact() builds new columns and leaves the shared arena and tombstones untouched
+            columns.compact()
+        return (columns.ids.tobytes(), columns.offsets.tobytes(),
+                columns.title_lengths.tobytes(), bytes(columns.arena))
+
+    @classmethod
+    def from_buffers(cls, ids, offsets, title_lengths, arena) -> "UserPostColumns":
+        """
+        Build columns from raw buffers, e.g. slices of a memory-mapped snapshot.
+
+        Args:
+            ids: Buffer of native-endian `q` post IDs in ascending order.
+            offsets: Buffer of native-endian `q` record offsets into `arena`.
+            title_lengths: Buffer of native-endian `I` title lengths.
+            arena: Buffer holding the encoded records.
+
+        Returns:
+            UserPostColumns: Columns holding a copy of the buffers, every record live.
+        """
+        columns = cls()
+        columns.ids.frombytes(ids)
+        columns.offsets.frombytes(offsets)
+        columns.title_lengths.frombytes(title_lengths)
+        columns.arena[:] = arena
+        columns.dead = bytearray(len(columns.ids))
+        columns.live = len(columns.ids)
+        return columns
+
+    def nbytes(self) -> int:
+        """
+        Get the number of bytes held by the columns (excluding fixed object overhead).
+
+        Returns:
+            int: The allocated size of the arrays and the arena.
+        """
+        return (
+            self.ids.buffer_info()[1] * self.ids.itemsize
+            + self.offsets.buffer_info()[1] * self.offsets.itemsize
+            + self.title_lengths.buffer_info()[1] * self.title_lengths.itemsize
+            + len(self.dead)
+            + len(self.arena)
+        )
+
+
+class PostStoreShard:
+    """
+    One partition of a `PostStore`: the columns of the users hashed to it, guarded by its own lock.
+
+    `users` is kept in least recently used order, oldest first.
+    """
+    __slots__ = ("users", "lock", "posts", "nbytes", "adds", "removes", "evictions")
+
+    def __init__(self):
+        self.users: "OrderedDict[int, UserPostColumns]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.posts = 0
+        self.nbytes = 0
+        self.adds = 0
+        self.removes = 0
+        self.evictions = 0
+
+
+class PostStore:
+    """
+    In-memory post storage engine: one `UserPostColumns` per user, keyed by integer user ID.
+
+    Users are partitioned over `shards` shards by hashing their ID, and every shard has its
+    own lock and counters. Operations on users of different shards never wait for each
+    other, so the store can be used from several threads (and scales with them on a
+    free-threaded interpreter) while every operation on one user stays atomic.
+
+    A user stays resident, even without posts, until it is evicted or the store is cleared.
+    Every shard keeps its users in least recently used order, which `evict` uses to drop
+    cold users when the store is over its memory budget.
+    """
+
+    def __init__(self, shards: int = 16):
+        self.shards: List[PostStoreShard] = [PostStoreShard() for _ in range(shards)]
+
+    def shard(self, user_id: int) -> PostStoreShard:
+        """
+        Get the shard holding a user's posts.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            PostStoreShard: The shard.
+        """
+        return self.shards[hash(user_id) % len(self.shards)]
+
+    def __len__(self) -> int:
+        return sum(shard.posts for shard in self.shards)
+
+    def add(self, user_id: int, post_id: int, title: str, content: str) -> None:
+        """
+        Store a new post.
+
+        Args:
+            user_id (int): The ID of the user creating the post.
+            post_id (int): The ID of the post, greater than every ID already stored.
+            title (str): The title of the post.
+            content (str): The content of the post.
+        """
+        self.add_encoded(user_id, post_id, title.encode(ENCODING), content.encode(ENCODING))
+
+    def create(self, user_id: int, title: str, content: str, next_id: Callable[[], int]) -> int:
+        """
+        Store a new post under an ID taken from `next_id` while the user's shard is locked.
+
+        Taking the ID and appending the post in one critical section keeps every user's IDs in
+        ascending order even when several threads create posts for the same user.
+
+        Args:
+            user_id (int): The ID of the user creating the post.
+            title (str): The title of the post.
+            content (str): The content of the post.
+            next_id (Callable[[], int]): Hands out increasing post IDs, e.g. `IdGenerator.next_id`.
+
+        Returns:
+            int: The ID of the new post.
+        """
+        encoded_title, encoded_content = title.encode(ENCODING), content.encode(ENCODING)
+        shard = self.shard(user_id)
+        with shard.lock:
+            post_id = next_id()
+            columns = shard.users.get(user_id)
+            if columns is None:
+                columns = shard.users[user_id] = UserPostColumns()
+            else:
+                shard.users.move_to_end(user_id)
+            before = columns.nbytes()
+            columns.add_encoded(post_id, encoded_title, encoded_content)
+            shard.nbytes += columns.nbytes() - before
+            shard.posts += 1
+            shard.adds += 1
+        return post_id
+
+    def add_encoded(self, user_id: int, post_id: int, title: bytes, content: bytes) -> None:
+        """
+        Store a new post whose title and content are already encoded, e.g. when replaying a log.
+
+        Args:
+            user_id (int): The ID of the user creating the post.
+            post_id (int): The ID of the post, greater than every ID already stored.
+            title (bytes): The encoded title of the post.
+            content (bytes): The encoded content of the post.
+        """
+        shard = self.shard(user_id)
+        with shard.lock:
+            columns = shard.users.get(user_id)
+            if columns is None:
+                columns = shard.users[user_id] = UserPostColumns()
+            before = columns.nbytes()
+            columns.add_encoded(post_id, title, content)
+            shard.nbytes += columns.nbytes() - before
+            shard.posts += 1
+            shard.adds += 1
+
+    def set_columns(self, user_id: int, columns: UserPostColumns) -> None:
+        """
+        Replace all posts of a user, e.g. with columns loaded from a snapshot.
+
+        Args:
+            user_id (int): The ID of the user.
+            columns (UserPostColumns): The user's posts.
+        """
+        shard = self.shard(user_id)
+        with shard.lock:
+            previous = shard.users.pop(user_id, None)
+            if previous is not None:
+                shard.posts -= len(previous)
+                shard.nbytes -= previous.nbytes()
+            if columns:
+                shard.users[user_id] = columns
+                shard.posts += len(columns)
+                shard.nbytes += columns.nbytes()
+
+    def install(self, user_id: int, columns: UserPostColumns) -> bool:
+        """
+        Make a user resident with columns loaded from elsewhere, unless it already is.
+
+        Unlike `set_columns`, a user without posts is kept resident.
+
+        Args:
+            user_id (int): The ID of the user.
+            columns (UserPostColumns): All posts of the user.
+
+        Returns:
+            bool: True if the columns were installed, False if the user was already resident.
+        """
+        shard = self.shard(user_id)
+        with shard.lock:
+            if user_id in shard.users:
+                return False
+            shard.users[user_id] = columns
+            shard.posts += len(columns)
+            shard.nbytes += columns.nbytes()
+            return True
+
+    def resident(self, user_id: int) -> bool:
+        """
+        Check whether a user's posts are held by the store.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            bool: True if the user is resident, with or without posts.
+        """
+        return user_id in self.shard(user_id).users
+
+    def nbytes(self) -> int:
+        """
+        Get the number of bytes held by the columns of all resident users.
+
+        Returns:
+            int: The sum of `UserPostColumns.nbytes` over every user.
+        """
+        return sum(shard.nbytes for shard in self.shards)
+
+    def evict(self, budget: int, can_evict: Callable[[int], bool]) -> List[int]:
+        """
+        Drop least recently used users until the store holds at most `budget` bytes.
+
+        Each shard keeps its own recency order, so the victim is the least recently used
+        evictable user of the largest shard; with users spread evenly over the shards this
+        approximates a global LRU without a global lock.
+
+        Args:
+            budget (int): The number of column bytes to get under.
+            can_evict (Callable[[int], bool]): Tells whether a user may be dropped, e.g. because
+                its posts can be reloaded from the database.
+
+        Returns:
+            List[int]: The IDs of the evicted users, in eviction order. Eviction stops early
+                when no shard has an evictable user among its `EVICTION_SCAN` coldest ones.
+        """
+        evicted = []
+        while self.nbytes() > budget:
+            for shard in sorted(self.shards, key=lambda candidate: candidate.nbytes, reverse=True):
+                with shard.lock:
+                    victim = next((user_id for user_id in islice(shard.users, EVICTION_SCAN) if can_evict(user_id)),
+                                  None)
+                    if victim is None:
+                        continue
+                    columns = shard.users.pop(victim)
+                    shard.posts -= len(columns)
+                    shard.nbytes -= columns.nbytes()
+                    shard.evictions += 1
+                evicted.append(victim)
+                break
+            else:
+                break
+        return evicted
+
+    def newest_id(self, user_id: int) -> int:
+        """
+        Get the highest post ID stored for a user, deleted posts included until compaction.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            int: The post ID, 0 if the user has no posts.
+        """
+        shard = self.shard(user_id)
+        with shard.lock:
+            columns = shard.users.get(user_id)
+            return columns.ids[-1] if columns is not None and columns.ids else 0
+
+    def contains(self, user_id: int, post_id: int) -> bool:
+        """
+        Check whether a user owns a live post.
+
+        Args:
+            user_id (int): The ID of the user.
+            post_id (int): The ID of the post.
+
+        Returns:
+            bool: True if the post exists and belongs to the user.
+        """
+        shard = self.shard(user_id)
+        with shard.lock:
+            columns = shard.users.get(user_id)
+            return columns is not None and post_id in columns
+
+    def remove(self, user_id: int, post_id: int) -> bool:
+        """
+        Delete a post of a user.
+
+        Args:
+            user_id (int): The ID of the user who owns the post.
+            post_id (int): The ID of the post to delete.
+
+        Returns:
+            bool: True if the post was deleted, False if the user has no such post.
+        """
+        shard = self.shard(user_id)
+        with shard.lock:
+            columns = shard.users.get(user_id)
+            if columns is None:
+                return False
+            before = columns.nbytes()
+            if not columns.remove(post_id):
+                return False
+            shard.nbytes += columns.nbytes() - before
+            shard.posts -= 1
+            shard.removes += 1
+            return True
+
+    def get_many(self, user_id: int, post_ids: Iterable[int]) -> Dict[int, Tuple[str, str]]:
+        """
+        Get the titles and contents of some posts of a user.
+
+        Args:
+            user_id (int): The ID of the user who owns the posts.
+            post_ids (Iterable[int]): The IDs of the posts.
+
+        Returns:
+            Dict[int, Tuple[str, str]]: The title and content of every ID that is a live post of the user.
+        """
+        found = {}
+        shard = self.shard(user_id)
+        with shard.lock:
+            columns = shard.users.get(user_id)
+            if columns is None:
+                return found
+            for post_id in post_ids:
+                index = bisect_left(columns.ids, post_id)
+                if index < len(columns.ids) and columns.ids[index] == post_id and not columns.dead[index]:
+                    found[post_id] = columns.record(index)[1:]
+        return found
+
+    def clear(self) -> None:
+        """
+        Drop every post.
+        """
+        for shard in self.shards:
+            with shard.lock:
+                shard.users.clear()
+                shard.posts = 0
+                shard.nbytes = 0
+
+    def user_ids(self) -> List[int]:
+        """
+        Get the IDs of the resident users.
+
+        Returns:
+            List[int]: The user IDs, grouped by shard.
+        """
+        user_ids = []
+        for shard in self.shards:
+            with shard.lock:
+                user_ids.extend(shard.users)
+        return user_ids
+
+    def records(self) -> Iterator[Tuple[int, int, str, str]]:
+        """
+        Iterate over every live post, one shard at a time.
+
+        Each shard's posts are copied out under its lock, so the iteration itself holds no lock.
+
+        Yields:
+            Tuple[int, int, str, str]: The user ID, post ID, title and content of every post.
+        """
+        for shard in self.shards:
+            with shard.lock:
+                records = [(user_id, *record) for user_id, columns in shard.users.items()
+                           for record in columns.records()]
+            yield from records
+
+    def buffers(self) -> List[Tuple[int, Tuple[bytes, bytes, bytes, bytes]]]:
+        """
+        Copy every user's columns out as raw buffers, e.g. for a snapshot.
+
+        Returns:
+            List[Tuple[int, Tuple[bytes, bytes, bytes, bytes]]]: Every user ID with the result of
+                `UserPostColumns.to_buffers`.
+        """
+        users = []
+        for shard in self.shards:
+            with shard.lock:
+                users.extend((user_id, columns.to_buffers()) for user_id, columns in shard.users.items())
+        return users
+
+    def page(self, user_id: int, limit: Optional[int] = None,
+             cursor: Optional[int] = None) -> Tuple[List[str], Optional[int]]:
+        """
+        Get one page of a user's post contents.
+
+        Args:
+            user_id (int): The ID of the user whose posts are to be retrieved.
+            limit (Optional[int]): Maximum number of posts to return, None for all of them.
+            cursor (Optional[int]): ID of the last post of the previous page, None to start from the first post.
+
+        Returns:
+            Tuple[List[str], Optional[int]]: The contents and the cursor of the next page (None on the last page).
+        """
+        shard = self.shard(user_id)
+        with shard.lock:
+            columns = shard.users.get(user_id)
+            if columns is None:
+                return [], None
+            shard.users.move_to_end(user_id)
+            return columns.page(limit, cursor)
+
+    def stats(self) -> dict:
+        """
+        Get the size of the store.
+
+        Returns:
+            dict: The number of shards, resident users and posts, the bytes held by the columns,
+                the post count of the fullest shard and the add, remove and eviction counters.
+        """
+        users = posts = nbytes = largest = adds = removes = evictions = 0
+        for shard in self.shards:
+            with shard.lock:
+                users += len(shard.users)
+                posts += shard.posts
+                nbytes += shard.nbytes
+                largest = max(largest, shard.posts)
+                adds += shard.adds
+                removes += shard.removes
+                evictions += shard.evictions
+        return {
+            "shards": len(self.shards),
+            "users": users,
+            "posts": posts,
+            "bytes": nbytes,
+            "largest_shard_posts": largest,
+            "adds": adds,
+            "removes": removes,
+            "evictions": evictions,
+        }
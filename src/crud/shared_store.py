@@ -0,0 +1,322 @@
+import logging
+import mmap
+import os
+import secrets
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from crud.post_events import notify_posts_changed
+from crud.post_store import ENCODING, PostStore
+from crud.store_journal import OP_ADD, OP_DELETE, apply_record, encode_record, iter_records
+from exceptions import PostStoreFull
+from extras.cache import post_versions
+from extras.id_generator import post_id_generator
+
+try:
+    import fcntl
+except ImportError:  # Windows: the shared store is not available
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Arena header: magic, random arena ID, generation (bumped by compaction), last post ID, end
+# offset of the records
+ARENA_MAGIC = b"LUCIDSA2"
+ARENA_HEADER = struct.Struct("<8sqqqq")
+
+# Post versions are generation << VERSION_SHIFT | end offset of the user's latest record
+VERSION_SHIFT = 40
+
+
+class SharedPostArena:
+    """
+    Post store shared by every worker process on a host.
+
+    All workers map the same file (ideally on `/dev/shm`) and append their writes to it as log
+    records; the header holds the end of the records and the last post ID handed out. Writers
+    take an exclusive `flock` on the file and never hand out an ID at or below the one in the
+    header, so post IDs are unique and increasing across workers. Each worker keeps its own
+    `PostStore` as a decoded replica of the arena and catches up with the records written by
+    other workers before serving a read, so requests are still answered from local memory and
+    every worker sees every post.
+
+    When the arena is full, the writer that ran out of space writes the live posts to a new
+    file with the next generation and moves it over the arena, so a crash at any point leaves
+    a complete arena behind. Every worker, the writer included, notices the new generation,
+    maps the new file and rebuilds its replica from scratch.
+
+    The versions of the users' posts behind ETags and `GET /post/changes` are derived from the
+    arena too: the arena ID is the epoch, and a user's version is the position of their latest
+    record. Every worker applies the same records at the same positions, so a client polling
+    through any of them gets the same ETags and `since` tokens.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path: Optional[str] = None
+        self.store: Optional[PostStore] = None
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._generation = 0
+        self._applied = ARENA_HEADER.size
+        self.records_applied = 0
+        self.remote_records_applied = 0
+        self.rebuilds = 0
+        self.compactions = 0
+        self._writing = False
+        # flock is held per open file, not per thread, so threads of this process also take this lock
+        self._thread_lock = threading.RLock()
+
+    def open(self, path: str, capacity: int, store: PostStore) -> None:
+        """
+        Map the shared arena, creating it if needed, and load its posts into `store`.
+
+        Args:
+            path (str): The arena file, shared by every worker.
+            capacity (int): Size of the arena in bytes when it is created.
+            store (PostStore): The local replica to fill, emptied first.
+
+        Raises:
+            RuntimeError: If the platform has no `fcntl` file locking.
+        """
+        if fcntl is None:
+            raise RuntimeError("The shared post store needs fcntl file locking")
+        self.path = path
+        self.store = store
+        self._file = open(path, "a+b")
+        with self._locked(fcntl.LOCK_EX):
+            if os.fstat(self._file.fileno()).st_size < capacity:
+                # A sparse file: pages are only backed once records are written to them
+                self._file.truncate(capacity)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+            if len(self._map) >= 1 << VERSION_SHIFT:
+                raise ValueError(f"The shared post arena must be smaller than {1 << VERSION_SHIFT} bytes")
+            if self._map[:len(ARENA_MAGIC)] != ARENA_MAGIC:
+                ARENA_HEADER.pack_into(self._map, 0, ARENA_MAGIC, secrets.randbits(63), 1, 0, ARENA_HEADER.size)
+            store.clear()
+            self._generation = 0
+            self._catch_up()
+        self.enabled = True
+
+    def close(self) -> None:
+        """
+        Unmap the arena. The file and its posts stay for the other workers and the next start.
+        """
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._map.close()
+        self._file.close()
+        self._map = self._file = None
+
+    @contextmanager
+    def _locked(self, operation: int) -> Iterator[None]:
+        with self._thread_lock:
+            fcntl.flock(self._file.fileno(), operation)
+            while self._replaced():
+                # Compacted by another worker: the lock on the old file guards nothing
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                self._reopen()
+                fcntl.flock(self._file.fileno(), operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def _replaced(self) -> bool:
+        # Whether `path` names another file than the one mapped
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        mapped = os.fstat(self._file.fileno())
+        return (current.st_dev, current.st_ino) != (mapped.st_dev, mapped.st_ino)
+
+    def _reopen(self) -> None:
+        # Map the file now at `path`; the next catch-up rebuilds the replica from its generation
+        self._map.close()
+        self._file.close()
+        self._file = open(self.path, "a+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def _header(self):
+        # Under the thread lock, since a compaction on another thread may swap the map
+        with self._thread_lock:
+            return ARENA_HEADER.unpack_from(self._map, 0)
+
+    def _catch_up(self) -> None:
+        # Apply the records written since the last call; the caller holds the lock
+        _, arena_id, generation, _, end = self._header()
+        base = generation << VERSION_SHIFT
+        if generation != self._generation:
+            if self._generation:
+                self.rebuilds += 1
+            post_versions.share(f"{arena_id:016x}", base)
+            for user_id in self.store.user_ids():
+                notify_posts_changed(user_id, version=base)
+            self.store.clear()
+            self._generation = generation
+            self._applied = ARENA_HEADER.size
+        for position, op, user_id, post_id, title, content in iter_records(self._map, self._applied, end):
+            apply_record(self.store, op, user_id, post_id, title, content)
+            notify_posts_changed(user_id, created=(post_id,) if op == OP_ADD else (),
+                                 deleted=(post_id,) if op == OP_DELETE else (), version=base | position)
+            self._applied = position
+            self.records_applied += 1
+            if not self._writing:
+                self.remote_records_applied += 1
+
+    def sync(self) -> None:
+        """
+        Bring the local replica up to date with the writes of the other workers.
+
+        Costs one read of the arena header when nothing changed.
+        """
+        if not self.enabled:
+            return
+        _, _, generation, _, end = self._header()
+        if generation == self._generation and end == self._applied:
+            return
+        with self._locked(fcntl.LOCK_SH):
+            self._catch_up()
+
+    def add(self, user_id: int, title: str, content: str) -> int:
+        """
+        Store a new post in the arena and the local replica.
+
+        Args:
+            user_id (int): The ID of the user creating the post.
+            title (str): The title of the post.
+            content (str): The content of the post.
+
+        Returns:
+            int: The ID of the new post, unique across all workers.
+        """
+        with self._locked(fcntl.LOCK_EX):
+            self._catch_up()
+            # IDs from different workers may interleave in time, so keep the arena's IDs increasing
+            post_id = max(self._header()[3] + 1, post_id_generator.next_id())
+            self._append(encode_record(OP_ADD, user_id, post_id, title.encode(ENCODING), content.encode(ENCODING)),
+                         last_post_id=post_id)
+        return post_id
+
+    def remove(self, user_id: int, post_id: int) -> bool:
+        """
+        Delete a post of a user from the arena and the local replica.
+
+        Args:
+            user_id (int): The ID of the user who owns the post.
+            post_id (int): The ID of the post to delete.
+
+        Returns:
+            bool: True if the post was deleted, False if the user has no such post.
+        """
+        with self._locked(fcntl.LOCK_EX):
+            self._catch_up()
+            if not self.store.contains(user_id, post_id):
+                return False
+            self._append(encode_record(OP_DELETE, user_id, post_id))
+        return True
+
+    def advance_post_id(self, last_post_id: int) -> None:
+        """
+        Make sure post IDs handed out from now on are greater than `last_post_id`.
+
+        Args:
+            last_post_id (int): The highest post ID known to exist elsewhere, e.g. in the database.
+        """
+        with self._locked(fcntl.LOCK_EX):
+            magic, arena_id, generation, current, end = self._header()
+            if last_post_id > current:
+                ARENA_HEADER.pack_into(self._map, 0, magic, arena_id, generation, last_post_id, end)
+
+    def last_post_id(self) -> int:
+        """
+        Get the highest post ID handed out by any worker.
+        """
+        return self._header()[3]
+
+    def _append(self, record: bytes, last_post_id: Optional[int] = None) -> None:
+        # The caller holds the exclusive lock and has caught up
+        magic, arena_id, generation, current_last_post_id, end = self._header()
+        if end + len(record) > len(self._map):
+            self._compact()
+            magic, arena_id, generation, current_last_post_id, end = self._header()
+            if end + len(record) > len(self._map):
+                raise PostStoreFull
+        self._map[end:end + len(record)] = record
+        # Publish the record only once it is fully written
+        ARENA_HEADER.pack_into(self._map, 0, magic, arena_id, generation,
+                               max(current_last_post_id, last_post_id or 0), end + len(record))
+        self._writing = True
+        try:
+            self._catch_up()
+        finally:
+            self._writing = False
+
+    def _compact(self) -> None:
+        # Write the live posts of the (caught up) local replica to a new arena file and move it
+        # over the current one; the caller holds the exclusive lock
+        magic, arena_id, generation, last_post_id, end = self._header()
+        records = bytearray()
+        for user_id, post_id, title, content in self.store.records():
+            records += encode_record(OP_ADD, user_id, post_id, title.encode(ENCODING), content.encode(ENCODING))
+        if ARENA_HEADER.size + len(records) > len(self._map):
+            raise PostStoreFull
+        compact_path = f"{self.path}.compact"
+        compact_file = open(compact_path, "w+b")
+        compact_map = None
+        try:
+            # Locked before it is moved into place, so other workers wait until this one is done
+            fcntl.flock(compact_file.fileno(), fcntl.LOCK_EX)
+            compact_file.truncate(len(self._map))
+            compact_map = mmap.mmap(compact_file.fileno(), 0)
+            compact_map[ARENA_HEADER.size:ARENA_HEADER.size + len(records)] = records
+            ARENA_HEADER.pack_into(compact_map, 0, magic, arena_id, generation + 1, last_post_id,
+                                   ARENA_HEADER.size + len(records))
+            # Tell the other workers to look for the new file; should the move fail, the old
+            # file is still complete and they rebuild from it instead
+            ARENA_HEADER.pack_into(self._map, 0, magic, arena_id, generation + 1, last_post_id, end)
+            os.replace(compact_path, self.path)
+        except BaseException:
+            if compact_map is not None:
+                compact_map.close()
+            compact_file.close()
+            raise
+        # Continue in the new file, whose lock the caller releases; closing the old one releases
+        # its lock. The replica is rebuilt by the next catch-up like the other workers', so that
+        # it gets the same versions
+        self._map.close()
+        self._file.close()
+        self._map, self._file = compact_map, compact_file
+        self.compactions += 1
+        logger.info("Compacted the shared post arena to %d bytes", ARENA_HEADER.size + len(records))
+
+    def stats(self) -> dict:
+        """
+        Get the arena counters.
+
+        Returns:
+            dict: Arena size and usage, generation, last post ID and replication counters.
+        """
+        if not self.enabled:
+            return {"enabled": False}
+        _, _, generation, last_post_id, end = self._header()
+        return {
+            "enabled": True,
+            "path": self.path,
+            "capacity_bytes": len(self._map),
+            "used_bytes": end,
+            "generation": generation,
+            "last_post_id": last_post_id,
+            "records_applied": self.records_applied,
+            "remote_records_applied": self.remote_records_applied,
+            "rebuilds": self.rebuilds,
+            "compactions": self.compactions,
+        }
+
+
+# Arena shared by the worker processes when STORE_SHARED_PATH is set
+shared_arena = SharedPostArena()
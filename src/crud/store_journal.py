@@ -0,0 +1,591 @@
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from config import settings
+from crud.post_store import ENCODING, PostStore, UserPostColumns
+
+logger = logging.getLogger(__name__)
+
+# Log record: crc32 of everything after it, then operation, user id, post id, title length,
+# content length, followed by the encoded title and content
+LOG_CRC = struct.Struct("<I")
+LOG_FIELDS = struct.Struct("<BqqII")
+LOG_HEADER_SIZE = LOG_CRC.size + LOG_FIELDS.size
+OP_ADD = 1
+OP_DELETE = 2
+# The user's posts are only in the database from here on (evicted, or reloaded from it)
+OP_UNLOAD = 3
+
+# Snapshot: header, then per user a header followed by its ids, offsets, title lengths and arena
+SNAPSHOT_MAGIC = b"LUCIDPS1"
+SNAPSHOT_FOOTER = b"LUCIDEND"
+SNAPSHOT_HEADER = struct.Struct("<8sqq")  # magic, last post id, number of users
+SNAPSHOT_USER = struct.Struct("<qqq")  # user id, number of posts, arena length
+
+# A post change read back from a log: operation, user ID, post ID, encoded title and content
+LoggedChange = Tuple[int, int, int, bytes, bytes]
+
+# Snapshot columns are little-endian; arrays are byte-swapped on big-endian hosts
+NATIVE_LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def _log_path(directory: Path, generation: int) -> Path:
+    return directory / f"posts-{generation:010d}.log"
+
+
+def _snapshot_path(directory: Path, generation: int) -> Path:
+    return directory / f"posts-{generation:010d}.snap"
+
+
+def _generations(directory: Path, suffix: str) -> List[int]:
+    return sorted(int(path.stem.split("-")[1]) for path in directory.glob(f"posts-*{suffix}"))
+
+
+def _little_endian(column: bytes, typecode: str) -> bytes:
+    if NATIVE_LITTLE_ENDIAN:
+        return column
+    swapped = array(typecode, column)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def write_snapshot(path: Path, last_post_id: int, users: List[Tuple[int, Tuple[bytes, bytes, bytes, bytes]]]) -> None:
+    """
+    Write a snapshot atomically: to a temporary file that is synced and then renamed over `path`.
+
+    Args:
+        path (Path): Where the snapshot is written.
+        last_post_id (int): The highest post ID handed out so far.
+        users (List[Tuple[int, Tuple[bytes, bytes, bytes, bytes]]]): Every user ID with the
+            buffers returned by `UserPostColumns.to_buffers`.
+    """
+    temporary = path.with_suffix(".tmp")
+    with open(temporary, "wb") as file:
+        file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, last_post_id, len(users)))
+        for user_id, (ids, offsets, title_lengths, arena) in users:
+            file.write(SNAPSHOT_USER.pack(user_id, len(ids) // 8, len(arena)))
+            file.write(_little_endian(ids, "q"))
+            file.write(_little_endian(offsets, "q"))
+            file.write(_little_endian(title_lengths, "I"))
+            file.write(arena)
+        file.write(SNAPSHOT_FOOTER)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def load_snapshot(path: Path, store: PostStore) -> int:
+    """
+    Load a snapshot into an empty store through a read-only memory map.
+
+    Every column is copied straight out of the mapping with `array.frombytes`, so the cost is
+    close to a `memcpy` of the file rather than one Python object per post.
+
+    Args:
+        path (Path): The snapshot file.
+        store (PostStore): The store to fill.
+
+    Returns:
+        int: The highest post ID handed out when the snapshot was taken.
+
+    Raises:
+        ValueError: If the file is not a complete snapshot.
+    """
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            if view[-len(SNAPSHOT_FOOTER):] != SNAPSHOT_FOOTER:
+                raise ValueError(f"{path} is truncated")
+            magic, last_post_id, user_count = SNAPSHOT_HEADER.unpack_from(view, 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{path} is not a post store snapshot")
+            position = SNAPSHOT_HEADER.size
+            for _ in range(user_count):
+                user_id, count, arena_length = SNAPSHOT_USER.unpack_from(view, position)
+                position += SNAPSHOT_USER.size
+                ids = view[position:position + count * 8]
+                offsets = view[position + count * 8:position + count * 16]
+                title_lengths = view[position + count * 16:position + count * 20]
+                position += count * 20
+                arena = view[position:position + arena_length]
+                position += arena_length
+                columns = UserPostColumns.from_buffers(ids, offsets, title_lengths, arena)
+                if not NATIVE_LITTLE_ENDIAN:
+                    columns.ids.byteswap()
+                    columns.offsets.byteswap()
+                    columns.title_lengths.byteswap()
+                store.set_columns(user_id, columns)
+                ids.release(), offsets.release(), title_lengths.release(), arena.release()
+        finally:
+            view.release()
+    return last_post_id
+
+
+def encode_record(op: int, user_id: int, post_id: int, title: bytes = b"", content: bytes = b"") -> bytes:
+    """
+    Encode one log record.
+
+    Args:
+        op (int): `OP_ADD`, `OP_DELETE` or `OP_UNLOAD`.
+        user_id (int): The ID of the user owning the post.
+        post_id (int): The ID of the post.
+        title (bytes): The encoded title of an added post.
+        content (bytes): The encoded content of an added post.
+
+    Returns:
+        bytes: The record, CRC first.
+    """
+    fields = LOG_FIELDS.pack(op, user_id, post_id, len(title), len(content))
+    return LOG_CRC.pack(zlib.crc32(content, zlib.crc32(title, zlib.crc32(fields)))) + fields + title + content
+
+
+def iter_records(data, start: int, end: int) -> Iterator[Tuple[int, int, int, int, bytes, bytes]]:
+    """
+    Decode the log records in `data[start:end]`, stopping at the first torn or corrupt record.
+
+    Args:
+        data: A bytes-like object holding the records, e.g. file contents or an `mmap`.
+        start (int): Offset of the first record.
+        end (int): Offset just past the last record.
+
+    Yields:
+        Tuple[int, int, int, int, bytes, bytes]: The offset just past the record, the operation,
+            user ID, post ID, encoded title and encoded content of every intact record.
+    """
+    position = start
+    while position + LOG_HEADER_SIZE <= end:
+        crc, = LOG_CRC.unpack_from(data, position)
+        op, user_id, post_id, title_length, content_length = LOG_FIELDS.unpack_from(data, position + LOG_CRC.size)
+        record_end = position + LOG_HEADER_SIZE + title_length + content_length
+        if record_end > end:
+            break
+        record = data[position + LOG_CRC.size:record_end]
+        if zlib.crc32(record) != crc:
+            break
+        title_end = LOG_FIELDS.size + title_length
+        yield record_end, op, user_id, post_id, record[LOG_FIELDS.size:title_end], record[title_end:]
+        position = record_end
+
+
+def apply_record(store: PostStore, op: int, user_id: int, post_id: int, title: bytes, content: bytes) -> None:
+    """
+    Apply one decoded log record to a store.
+    """
+    if op == OP_ADD:
+        store.add_encoded(user_id, post_id, title, content)
+    elif op == OP_DELETE:
+        store.remove(user_id, post_id)
+    elif op == OP_UNLOAD:
+        store.set_columns(user_id, UserPostColumns())
+
+
+def replay_log(path: Path, store: PostStore, unloaded: Optional[Set[int]] = None,
+               changes: Optional[List[LoggedChange]] = None) -> Tuple[int, int]:
+    """
+    Apply the records of a log file to a store, stopping at the first torn or corrupt record.
+
+    A user is dropped from the store at its `OP_UNLOAD` record, and its later records are
+    skipped: the log only holds the changes made after it was reloaded from the database, so
+    applying them would leave an incomplete set of posts resident. An `OP_ADD` of a post ID
+    the user already has (or has passed) is skipped too, so a record that reached both a
+    snapshot and a log, or two logs, is applied once.
+
+    Args:
+        path (Path): The log file.
+        store (PostStore): The store to apply the records to.
+        unloaded (Optional[Set[int]]): Users unloaded by earlier logs of the same replay; the
+            users unloaded by this log are added to it.
+        changes (Optional[List[LoggedChange]]): If given, every post addition and deletion of
+            the log is appended to it, skipped or not.
+
+    Returns:
+        Tuple[int, int]: The number of records applied and the highest post ID they added.
+    """
+    if unloaded is None:
+        unloaded = set()
+    with open(path, "rb") as file:
+        data = file.read()
+    applied = 0
+    last_post_id = 0
+    position = 0
+    for position, op, user_id, post_id, title, content in iter_records(data, 0, len(data)):
+        if op == OP_ADD:
+            last_post_id = max(last_post_id, post_id)
+        if changes is not None and op != OP_UNLOAD:
+            changes.append((op, user_id, post_id, title, content))
+        if op == OP_UNLOAD:
+            unloaded.add(user_id)
+        elif user_id in unloaded or (op == OP_ADD and post_id <= store.newest_id(user_id)):
+            continue
+        apply_record(store, op, user_id, post_id, title, content)
+        applied += 1
+    if position < len(data):
+        logger.warning("Ignoring torn post log tail in %s at byte %d", path, position)
+    return applied, last_post_id
+
+
+def read_changes(path: Path) -> List[LoggedChange]:
+    """
+    Read the post additions and deletions of a log file, stopping at the first torn or corrupt record.
+
+    Args:
+        path (Path): The log file.
+
+    Returns:
+        List[LoggedChange]: The changes, in log order.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    return [(op, user_id, post_id, title, content)
+            for _, op, user_id, post_id, title, content in iter_records(data, 0, len(data)) if op != OP_UNLOAD]
+
+
+class StoreJournal:
+    """
+    Durability for the in-memory post store: an append-only operation log plus periodic snapshots.
+
+    Writes are encoded into an in-memory buffer on the request path and nothing else; a
+    background task group-commits that buffer to the current log file (one write and one
+    `fsync` per batch) every `STORE_LOG_FLUSH_INTERVAL` seconds.
+
+    Files are numbered by generation. Snapshot `N` holds the state at the start of log `N`,
+    so a warm start loads the newest snapshot and replays the logs from its generation on.
+    Taking a snapshot starts a new log generation, captures the columns in one go on the event
+    loop and writes them from a worker thread. The previous snapshot and its logs are kept as a
+    fallback; older files are removed.
+
+    The logs are also the only copy of changes that write-behind has not committed to the
+    database yet. A log is therefore kept while `pending_since` reports a change queued before
+    the next log was opened, and a warm start can hand every change of the logs still on disk
+    back to write-behind (see `take_recovered`). After `load(..., recover=True)` every log is
+    kept until write-behind has taken those changes over and replaced `pending_since`, so
+    nothing is lost while the database is out of reach.
+    """
+
+    def __init__(self):
+        self.directory: Optional[Path] = None
+        self.store: Optional[PostStore] = None
+        self.enabled = False
+        self.generation = 0
+        self.last_post_id = 0
+        self._pending = bytearray()
+        self._log_file = None
+        self._log_bytes = 0
+        # Monotonic time each log on disk was opened; every change it holds was logged before the next was
+        self._log_opened: Dict[int, float] = {}
+        # Gets the monotonic time of the oldest change not yet stored elsewhere, None if there is none
+        self.pending_since: Optional[Callable[[], Optional[float]]] = None
+        self._recovered: List[LoggedChange] = []
+        self.recovered_at = 0.0
+        self._replayed = 0
+        self._snapshot_generation = 0
+        self._last_snapshot = 0.0
+        self._io_lock = asyncio.Lock()
+        self._stopping: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.records = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.snapshots = 0
+        self.last_snapshot_seconds = 0.0
+        self.last_load_seconds = 0.0
+        self.loaded_posts = 0
+
+    def load(self, directory: str, store: PostStore, recover: bool = False) -> int:
+        """
+        Rebuild a store from the newest snapshot and the logs written after it.
+
+        Args:
+            directory (str): The directory holding the snapshots and logs.
+            store (PostStore): The store to fill, emptied first.
+            recover (bool): Also keep every post change of the logs on disk for `take_recovered`.
+
+        Returns:
+            int: The highest post ID handed out before the restart.
+        """
+        started = time.perf_counter()
+        loaded_at = time.monotonic()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.store = store
+        store.clear()
+        last_post_id = 0
+        snapshot_generation = 0
+        for generation in reversed(_generations(self.directory, ".snap")):
+            try:
+                last_post_id = load_snapshot(_snapshot_path(self.directory, generation), store)
+                snapshot_generation = generation
+                break
+            except (ValueError, struct.error) as e:
+                logger.warning("Skipping unusable post snapshot: %s", e)
+                store.clear()
+        replayed = 0
+        unloaded = set()
+        recovered = [] if recover else None
+        self._log_opened = {}
+        for generation in _generations(self.directory, ".log"):
+            self._log_opened[generation] = loaded_at
+            if generation >= snapshot_generation:
+                applied, log_last_post_id = replay_log(_log_path(self.directory, generation), store, unloaded,
+                                                       recovered)
+                replayed += applied
+                last_post_id = max(last_post_id, log_last_post_id)
+            elif recover:
+                recovered.extend(read_changes(_log_path(self.directory, generation)))
+        self._recovered = recovered or []
+        self.recovered_at = loaded_at
+        if recover:
+            self.pending_since = self._recovery_pending_since
+        self.generation = max([snapshot_generation, *_generations(self.directory, ".log")]) + 1
+        self.last_post_id = last_post_id
+        self._replayed = replayed
+        self._snapshot_generation = snapshot_generation
+        self.last_load_seconds = time.perf_counter() - started
+        self.loaded_posts = len(store)
+        logger.info("Loaded %d posts (snapshot %d, %d log records) in %.2f s",
+                    self.loaded_posts, snapshot_generation, replayed, self.last_load_seconds)
+        return last_post_id
+
+    def _recovery_pending_since(self) -> Optional[float]:
+        # Until write-behind takes over the recovered changes, none of the logs is known to be in the database
+        return self.recovered_at
+
+    def take_recovered(self) -> List[LoggedChange]:
+        """
+        Hand over the post changes read from the logs by `load(..., recover=True)`.
+
+        The logs still on disk hold every change that may not have reached the database, so
+        these are queued again for it; the logs then stay until `pending_since` is past
+        `recovered_at`.
+
+        Returns:
+            List[LoggedChange]: The changes, oldest first; later calls return an empty list.
+        """
+        recovered, self._recovered = self._recovered, []
+        return recovered
+
+    async def start(self) -> None:
+        """
+        Open a fresh log generation and start the background group-commit task.
+        """
+        self._open_log()
+        self._last_snapshot = time.monotonic()
+        self._stopping = asyncio.Event()
+        self.enabled = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the background task, commit everything still buffered and close the log.
+
+        A final snapshot is taken when `STORE_SNAPSHOT_ON_SHUTDOWN` is set, so the next start
+        does not need to replay the log.
+        """
+        if not self.enabled:
+            return
+        self._stopping.set()
+        await self._task
+        await self.flush()
+        if settings.STORE_SNAPSHOT_ON_SHUTDOWN and (self._log_bytes or self._replayed):
+            await self.snapshot()
+        self.enabled = False
+        self._log_file.close()
+        self._log_file = None
+
+    def record_add(self, user_id: int, post_id: int, title: str, content: str) -> None:
+        """
+        Buffer the creation of a post, to be committed by the next group commit.
+
+        Args:
+            user_id (int): The ID of the user owning the post.
+            post_id (int): The ID of the post.
+            title (str): The title of the post.
+            content (str): The content of the post.
+        """
+        if not self.enabled:
+            return
+        self.last_post_id = max(self.last_post_id, post_id)
+        self._append(encode_record(OP_ADD, user_id, post_id, title.encode(ENCODING), content.encode(ENCODING)))
+
+    def record_delete(self, user_id: int, post_id: int) -> None:
+        """
+        Buffer the deletion of a post, to be committed by the next group commit.
+
+        Args:
+            user_id (int): The ID of the user owning the post.
+            post_id (int): The ID of the post.
+        """
+        if not self.enabled:
+            return
+        self._append(encode_record(OP_DELETE, user_id, post_id))
+
+    def record_unload(self, user_id: int) -> None:
+        """
+        Buffer that a user's posts now live in the database only, because the user was evicted
+        or reloaded from it.
+
+        Args:
+            user_id (int): The ID of the user.
+        """
+        if not self.enabled:
+            return
+        self._append(encode_record(OP_UNLOAD, user_id, 0))
+
+    def _append(self, record: bytes) -> None:
+        self._pending += record
+        self.records += 1
+
+    async def flush(self) -> None:
+        """
+        Group-commit the buffered records: one write and one `fsync` from a worker thread.
+        """
+        async with self._io_lock:
+            await self._commit()
+
+    def _open_log(self, opened: Optional[float] = None) -> None:
+        # Unbuffered, so nothing of a failed write lingers in a Python buffer to be written later
+        self._log_file = open(_log_path(self.directory, self.generation), "ab", buffering=0)
+        self._log_bytes = 0
+        self._log_opened[self.generation] = time.monotonic() if opened is None else opened
+
+    def _log_settled(self, generation: int, oldest_pending: Optional[float]) -> bool:
+        # Whether every change of a log was stored elsewhere: they were all logged before the next log opened
+        next_opened = self._log_opened.get(generation + 1)
+        return next_opened is not None and (oldest_pending is None or oldest_pending > next_opened)
+
+    async def _commit(self) -> None:
+        # Write the buffered records to the current log; the caller holds the I/O lock
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, bytearray()
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self._write, self._log_file, batch, self._log_bytes)
+        except BaseException:
+            # Keep the batch ahead of the records buffered since, for the next commit to retry
+            self._pending[:0] = batch
+            self._drop_torn_log()
+            raise
+        self._log_bytes += len(batch)
+        self.flushes += 1
+        self.last_flush_seconds = time.perf_counter() - started
+
+    def _drop_torn_log(self) -> None:
+        # `_write` cuts a failed batch off the log; if even that failed, a torn record would hide
+        # every later record of this log on replay, so the retry goes to a new generation instead
+        try:
+            intact = os.fstat(self._log_file.fileno()).st_size == self._log_bytes
+        except OSError:
+            intact = False
+        if intact:
+            return
+        logger.warning("Post log %s has a torn tail, continuing in a new log", self._log_file.name)
+        try:
+            self._log_file.close()
+        except OSError:
+            pass
+        self.generation += 1
+        self._open_log()
+
+    @staticmethod
+    def _write(file, batch: bytes, length: int) -> None:
+        try:
+            view = memoryview(batch)
+            while view:
+                view = view[file.write(view):]
+            if settings.STORE_LOG_FSYNC:
+                os.fsync(file.fileno())
+        except BaseException:
+            # Truncate the log back to its last good length, so the retry does not follow a torn record
+            os.ftruncate(file.fileno(), length)
+            raise
+
+    async def snapshot(self) -> None:
+        """
+        Write a snapshot of the store and drop the snapshots and logs it supersedes.
+        """
+        async with self._io_lock:
+            started = time.perf_counter()
+            # Capture the state and take the records still buffered without yielding, so the
+            # snapshot holds exactly the records written to the logs before it; records
+            # buffered from here on go to the next log
+            users = self.store.buffers()
+            last_post_id = self.last_post_id
+            switched = time.monotonic()
+            await self._commit()
+            self._log_file.close()
+            self.generation += 1
+            self._open_log(switched)
+            self._replayed = 0
+            self._last_snapshot = time.monotonic()
+            generation = self.generation
+            await asyncio.to_thread(
+                write_snapshot, _snapshot_path(self.directory, generation), last_post_id, users
+            )
+            # Keep the previous snapshot and its logs as a fallback should the new one be unreadable
+            for old in _generations(self.directory, ".snap"):
+                if old < self._snapshot_generation:
+                    _snapshot_path(self.directory, old).unlink(missing_ok=True)
+            # Logs with changes write-behind has not committed are kept for the next warm start
+            oldest_pending = self.pending_since() if self.pending_since is not None else None
+            for old in _generations(self.directory, ".log"):
+                if old < self._snapshot_generation and self._log_settled(old, oldest_pending):
+                    _log_path(self.directory, old).unlink(missing_ok=True)
+                    self._log_opened.pop(old, None)
+            self._snapshot_generation = generation
+            self.snapshots += 1
+            self.last_snapshot_seconds = time.perf_counter() - started
+
+    def _snapshot_due(self) -> bool:
+        if not self._log_bytes:
+            return False
+        return (self._log_bytes >= settings.STORE_SNAPSHOT_LOG_BYTES
+                or time.monotonic() - self._last_snapshot >= settings.STORE_SNAPSHOT_INTERVAL)
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=settings.STORE_LOG_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+                if self._snapshot_due():
+                    await self.snapshot()
+            except Exception:
+                logger.exception("Post store journal write failed")
+
+    def stats(self) -> dict:
+        """
+        Get the journal counters.
+
+        Returns:
+            dict: Buffered and logged bytes, commit and snapshot counters and the duration of the
+                last warm start.
+        """
+        return {
+            "enabled": self.enabled,
+            "generation": self.generation,
+            "pending_bytes": len(self._pending),
+            "log_bytes": self._log_bytes,
+            "records": self.records,
+            "flushes": self.flushes,
+            "last_flush_seconds": round(self.last_flush_seconds, 6),
+            "snapshots": self.snapshots,
+            "last_snapshot_seconds": round(self.last_snapshot_seconds, 6),
+            "last_load_seconds": round(self.last_load_seconds, 6),
+            "loaded_posts": self.loaded_posts,
+        }
+
+
+# Snapshot and operation log of the in-memory post store
+store_journal = StoreJournal()
@@ -0,0 +1,171 @@
+import time
+from collections import deque
+from typing import Deque, List, Optional
+
+from crud.crud_post import post as crud_post
+from crud.post_store import PostStore, UserPostColumns
+from crud.store_journal import store_journal
+from crud.write_behind import INSERT, post_write_behind
+from db.session import AsyncDBSingleton
+from extras.single_flight import SingleFlight
+
+# Seconds over which the eviction rate is averaged
+EVICTION_RATE_WINDOW = 60
+
+
+class PostStoreResidency:
+    """
+    Bounds the memory of the in-memory post store and loads users into it on demand.
+
+    Once the posts table holds every post (write-behind is running), the store no longer has
+    to hold every user: a user that is not resident is loaded from the database through
+    `CRUDPost.get_user_posts` on its first access, and whenever the columns of the store grow
+    past `STORE_MEMORY_BUDGET` bytes the least recently used users are evicted. Users with
+    changes still queued for write-behind are never evicted, since the database does not have
+    their posts yet; a user loaded while it has queued changes (recovered from the journal
+    at startup) gets them applied on top of its rows. Concurrent accesses to the same evicted
+    user share one load.
+
+    Evictions and loads are recorded in the store journal, so a restart never brings back an
+    incomplete set of posts for a user that lives in the database.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.store: Optional[PostStore] = None
+        self.budget: Optional[int] = None
+        self._loads = SingleFlight()
+        self._eviction_window: Deque[List[int]] = deque()
+        self.loads = 0
+        self.loaded_posts = 0
+        self.total_load_seconds = 0.0
+        self.evictions = 0
+        self.eviction_passes = 0
+        self.stalled_passes = 0
+
+    def start(self, store: PostStore, budget: Optional[int]) -> None:
+        """
+        Start loading users lazily and, with a budget, evicting cold ones.
+
+        Args:
+            store (PostStore): The store to manage.
+            budget (Optional[int]): Most bytes of post columns to keep resident, None for no limit.
+        """
+        self.store = store
+        self.budget = budget
+        self.enabled = True
+        self.enforce()
+
+    def stop(self) -> None:
+        """
+        Stop loading and evicting users; resident users stay.
+        """
+        self.enabled = False
+
+    async def ensure_resident(self, user_id: int) -> None:
+        """
+        Make sure a user's posts are in the store, loading them from the database if needed.
+
+        Must be awaited before every read or write of the user's posts in the store.
+
+        Args:
+            user_id (int): The ID of the user.
+        """
+        if not self.enabled or self.store.resident(user_id):
+            return
+        await self._loads.do(user_id, lambda: self._load(user_id))
+
+    async def _load(self, user_id: int) -> None:
+        started = time.perf_counter()
+        # Changes recovered from the journal at startup may not be in the database yet; taken
+        # before the read, so a change committed meanwhile is in one or both of them
+        pending = post_write_behind.pending_changes(user_id)
+        db = await AsyncDBSingleton.get_session()
+        try:
+            # Rows committed by write-behind moments ago may not have reached the replicas
+            db().sync_session.pinned_to_primary = True
+            rows = await crud_post.get_user_posts(db, user_id)
+        finally:
+            await db.close()
+        columns = UserPostColumns()
+        if pending:
+            user_posts = {row.id: (row.title, row.content) for row in rows}
+            for post_id, (operation, _, row, _) in pending.items():
+                if operation == INSERT:
+                    user_posts[post_id] = (row["title"], row["content"])
+                else:
+                    user_posts.pop(post_id, None)
+            for post_id in sorted(user_posts):
+                columns.add(post_id, *user_posts[post_id])
+        else:
+            for row in rows:
+                columns.add(row.id, row.title, row.content)
+        if self.store.install(user_id, columns):
+            # Anything journaled for the user before this point is superseded by the database
+            store_journal.record_unload(user_id)
+            self.loads += 1
+            self.loaded_posts += len(columns)
+            self.total_load_seconds += time.perf_counter() - started
+        self.enforce()
+
+    def enforce(self) -> None:
+        """
+        Evict least recently used users while the store is over its budget.
+
+        Cheap when the store is within budget, so it is called after every write.
+        """
+        if not self.enabled or self.budget is None or self.store.nbytes() <= self.budget:
+            return
+        evicted = self.store.evict(self.budget, self._can_evict)
+        for user_id in evicted:
+            store_journal.record_unload(user_id)
+        self.evictions += len(evicted)
+        self.eviction_passes += 1
+        now = int(time.monotonic())
+        if self._eviction_window and self._eviction_window[-1][0] == now:
+            self._eviction_window[-1][1] += len(evicted)
+        else:
+            self._eviction_window.append([now, len(evicted)])
+        if self.store.nbytes() > self.budget:
+            # Every cold user has changes waiting for write-behind; the next write tries again
+            self.stalled_passes += 1
+
+    @staticmethod
+    def _can_evict(user_id: int) -> bool:
+        return not post_write_behind.has_pending(user_id)
+
+    def eviction_rate(self) -> float:
+        """
+        Get the number of users evicted per second over the last `EVICTION_RATE_WINDOW` seconds.
+        """
+        horizon = int(time.monotonic()) - EVICTION_RATE_WINDOW
+        while self._eviction_window and self._eviction_window[0][0] <= horizon:
+            self._eviction_window.popleft()
+        return sum(count for _, count in self._eviction_window) / EVICTION_RATE_WINDOW
+
+    def stats(self) -> dict:
+        """
+        Get the residency gauges and counters.
+
+        Returns:
+            dict: The budget, the resident bytes, the eviction rate and the eviction and load counters.
+        """
+        if not self.enabled:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "budget_bytes": self.budget,
+            "resident_bytes": self.store.nbytes(),
+            "evictions": self.evictions,
+            "evictions_per_second": round(self.eviction_rate(), 3),
+            "eviction_passes": self.eviction_passes,
+            "stalled_passes": self.stalled_passes,
+            "loads": self.loads,
+            "loaded_posts": self.loaded_posts,
+            "average_load_seconds": round(self.total_load_seconds / self.loads, 6) if self.loads else 0.0,
+            "loads_in_flight": self._loads.stats()["in_flight"],
+        }
+
+
+# Lazy loading and eviction of users of the in-memory post store
+store_residency = PostStoreResidency()
@@ -0,0 +1,294 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from cachetools import TLRUCache
+
+from config import settings
+from crud.crud_revoked_token import revoked_token as crud_revoked_token
+from db.session import AsyncDBSingleton
+from exceptions import RevocationCheckUnavailable
+from extras.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+# Bloom filter hits whose confirmation is remembered
+CONFIRMATION_CACHE_SIZE = 10_000
+
+# Seconds a skipped revocation ID is read again: its row may commit after rows with higher IDs,
+# or never, as a rolled back insert also uses up an ID
+ID_GAP_TIMEOUT = 60
+
+
+class TokenRevocationList:
+    """
+    Denylist of revoked access tokens, checked on every authenticated request.
+
+    Revocations are stored in the `revoked_tokens` table by the `jti` claim of the token. Each
+    worker keeps a Bloom filter of the `jti`s revoked there, so the check of a token that was
+    never revoked is a few hashes in memory and no I/O. Only the tokens the filter matches,
+    revoked ones and a `REVOCATION_BLOOM_ERROR_RATE` fraction of the others, are confirmed
+    against the table, and the answer is remembered: for revoked tokens until they expire, for
+    false positives until the next sync.
+
+    A background task adds the revocations made by other workers every
+    `REVOCATION_SYNC_INTERVAL` seconds, reading the rows past the last ID it saw. Concurrent
+    revocations can commit out of ID order, so the IDs a read skipped are remembered and read
+    again by the following syncs until their rows show up, for up to `ID_GAP_TIMEOUT` seconds.
+    Every `REVOCATION_PRUNE_INTERVAL` seconds the task deletes the rows of expired tokens and
+    rebuilds the filter from the remaining ones, since a Bloom filter cannot forget keys,
+    growing it past `REVOCATION_BLOOM_CAPACITY` when needed. Revocations made on this worker
+    take effect at once.
+
+    Until the filter has been loaded once, every token is checked against the table and a token
+    found not revoked is remembered until it expires; the first load forgets the ones revoked
+    since. Should the table be out of reach, a token is accepted while the filter is not loaded,
+    as it was before revocation existed, and refused with `RevocationCheckUnavailable` (503)
+    when the loaded filter matches it. Both count as `check_failures`.
+
+    Tokens issued without a `jti` claim, before revocation existed, cannot be revoked.
+    """
+
+    def __init__(self):
+        self.bloom = BloomFilter(settings.REVOCATION_BLOOM_CAPACITY, settings.REVOCATION_BLOOM_ERROR_RATE)
+        self.loaded = False
+        self._confirmed = TLRUCache(maxsize=CONFIRMATION_CACHE_SIZE, ttu=self._confirmed_until, timer=time.time)
+        self._last_id = 0
+        # Skipped IDs below `_last_id`, with the monotonic time they were first missed
+        self._gaps: Dict[int, float] = {}
+        self._added_during_rebuild: Optional[List[str]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_rebuild = 0.0
+        self.checks = 0
+        self.bloom_passes = 0
+        self.confirmations = 0
+        self.confirmed_revoked = 0
+        self.false_positives = 0
+        self.check_failures = 0
+        self.revocations = 0
+        self.syncs = 0
+        self.rebuilds = 0
+        self.pruned = 0
+        self.failures = 0
+
+    def _confirmed_until(self, jti: str, entry: tuple, now: float) -> float:
+        revoked, expires_at = entry
+        # A revoked token stays revoked; a false positive is checked again after the next sync.
+        # Before the first load nothing else spares the table, and the load forgets the tokens
+        # revoked meanwhile
+        if revoked or not self.loaded:
+            return expires_at
+        return now + settings.REVOCATION_SYNC_INTERVAL
+
+    async def start(self) -> None:
+        """
+        Load the filter and start the background sync task. A database failure is retried by the task.
+        """
+        try:
+            await self._rebuild()
+        except Exception as e:
+            self.failures += 1
+            logger.error("Revoked tokens could not be loaded, checking them in the database: %s", e)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the background sync task.
+        """
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def revoke(self, db, jti: str, user_id: int, exp: int) -> None:
+        """
+        Revoke an access token until it expires.
+
+        Args:
+            db (AsyncSession): The database session.
+            jti (str): The `jti` claim of the token.
+            user_id (int): The ID of the user the token was issued to.
+            exp (int): The `exp` claim of the token, in seconds since the epoch.
+        """
+        await crud_revoked_token.revoke(db, jti, user_id, datetime.datetime.fromtimestamp(exp))
+        self.bloom.add(jti)
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.append(jti)
+        self._confirmed[jti] = (True, exp)
+        self.revocations += 1
+
+    async def is_revoked(self, jti: Optional[str], exp: int) -> bool:
+        """
+        Check whether an access token was revoked.
+
+        Args:
+            jti (Optional[str]): The `jti` claim of the token, None for tokens issued without one.
+            exp (int): The `exp` claim of the token, in seconds since the epoch.
+
+        Returns:
+            bool: True if the token was revoked.
+
+        Raises:
+            RevocationCheckUnavailable: If the loaded filter matches the token and the table is out of reach.
+        """
+        self.checks += 1
+        if jti is None:
+            return False
+        if self.loaded and jti not in self.bloom:
+            self.bloom_passes += 1
+            return False
+        confirmed = self._confirmed.get(jti)
+        if confirmed is not None:
+            return confirmed[0]
+        try:
+            revoked = await self._read_revoked(jti)
+        except Exception as e:
+            self.check_failures += 1
+            if self.loaded:
+                logger.error("Revoked token check failed: %s", e)
+                raise RevocationCheckUnavailable from e
+            logger.warning("Revoked token check failed, accepting the token until the filter loads: %s", e)
+            return False
+        self.confirmations += 1
+        if revoked:
+            self.confirmed_revoked += 1
+        elif self.loaded:
+            self.false_positives += 1
+        self._confirmed[jti] = (revoked, exp)
+        return revoked
+
+    @staticmethod
+    async def _read_revoked(jti: str) -> bool:
+        db = await AsyncDBSingleton.get_session()
+        try:
+            # A revocation made on another worker moments ago may not have reached the replicas
+            db().sync_session.pinned_to_primary = True
+            return await crud_revoked_token.is_revoked(db, jti)
+        finally:
+            await db.close()
+
+    async def _read_since(self, last_id: int):
+        db = await AsyncDBSingleton.get_session()
+        try:
+            # The rows are only read once, so they must not be missed on a lagging replica
+            db().sync_session.pinned_to_primary = True
+            return await crud_revoked_token.get_active_since(db, last_id)
+        finally:
+            await db.close()
+
+    async def _sync(self) -> None:
+        # Add the revocations made since the last sync, on any worker, re-reading from the lowest
+        # skipped ID; rows already in the filter are not added twice
+        rows = await self._read_since(min(self._gaps, default=self._last_id + 1) - 1)
+        for _, jti in rows:
+            if jti not in self.bloom:
+                self.bloom.add(jti)
+        self._forget_unrevoked(rows)
+        self._track_gaps(rows, self._last_id)
+        self.syncs += 1
+
+    def _forget_unrevoked(self, rows: List[Tuple[int, str]]) -> None:
+        # Drop the tokens confirmed as not revoked before their revocation reached this worker
+        for _, jti in rows:
+            confirmed = self._confirmed.get(jti)
+            if confirmed is not None and not confirmed[0]:
+                del self._confirmed[jti]
+
+    def _track_gaps(self, rows: List[Tuple[int, str]], last_id: int) -> None:
+        # Remember the IDs past `last_id` the rows skip, and forget the ones found or given up on
+        now = time.monotonic()
+        for row_id, _ in rows:
+            self._gaps.pop(row_id, None)
+            if row_id > last_id:
+                for missing in range(last_id + 1, row_id):
+                    self._gaps[missing] = now
+                last_id = row_id
+        for missing, since in list(self._gaps.items()):
+            if now - since > ID_GAP_TIMEOUT:
+                del self._gaps[missing]
+        self._last_id = max(self._last_id, last_id)
+
+    async def _rebuild(self) -> None:
+        # Load a new filter from the unexpired revocations and swap it in
+        self._added_during_rebuild = []
+        try:
+            rows = await self._read_since(0)
+            capacity = max(settings.REVOCATION_BLOOM_CAPACITY, 2 * len(rows))
+            bloom = BloomFilter(capacity, settings.REVOCATION_BLOOM_ERROR_RATE)
+            for _, jti in rows:
+                bloom.add(jti)
+            # Revoked here while the rows were read, possibly after the read
+            for jti in self._added_during_rebuild:
+                bloom.add(jti)
+        finally:
+            self._added_during_rebuild = None
+        self.bloom = bloom
+        self._forget_unrevoked(rows)
+        if self.loaded:
+            self._track_gaps(rows, self._last_id)
+        else:
+            # The IDs below the first load are pruned or rolled back rows, not gaps
+            self._last_id = max((row_id for row_id, _ in rows), default=0)
+        self._last_rebuild = time.monotonic()
+        self.loaded = True
+        self.rebuilds += 1
+
+    async def _prune(self) -> None:
+        db = await AsyncDBSingleton.get_session()
+        try:
+            self.pruned += await crud_revoked_token.prune(db)
+        except Exception:
+            await db.rollback()
+            raise
+        finally:
+            await db.close()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.REVOCATION_SYNC_INTERVAL)
+            try:
+                if (not self.loaded or len(self.bloom) > self.bloom.capacity
+                        or time.monotonic() - self._last_rebuild >= settings.REVOCATION_PRUNE_INTERVAL):
+                    await self._prune()
+                    await self._rebuild()
+                else:
+                    await self._sync()
+            except Exception as e:
+                self.failures += 1
+                logger.error("Revoked token sync failed: %s", e)
+
+    def stats(self) -> dict:
+        """
+        Get the filter and check counters.
+
+        Returns:
+            dict: The filter size and fill, how many checks passed the filter without I/O, and the
+                confirmation, revocation, sync and rebuild counters.
+        """
+        return {
+            "loaded": self.loaded,
+            "bloom": self.bloom.stats(),
+            "checks": self.checks,
+            "bloom_passes": self.bloom_passes,
+            "confirmations": self.confirmations,
+            "confirmed_revoked": self.confirmed_revoked,
+            "false_positives": self.false_positives,
+            "check_failures": self.check_failures,
+            "confirmations_cached": len(self._confirmed),
+            "revocations": self.revocations,
+            "syncs": self.syncs,
+            "id_gaps": len(self._gaps),
+            "rebuilds": self.rebuilds,
+            "pruned": self.pruned,
+            "failures": self.failures,
+        }
+
+
+# Denylist of revoked access tokens
+token_revocation = TokenRevocationList()
@@ -0,0 +1,348 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from config import settings
+from crud.crud_post import post as crud_post
+from db.session import AsyncDBSingleton
+from exceptions import WriteQueueFull
+
+logger = logging.getLogger(__name__)
+
+INSERT = "insert"
+DELETE = "delete"
+
+# A queued change: operation, user ID, row to insert (None for deletes), monotonic time it was queued
+Change = Tuple[str, int, Optional[dict], float]
+
+
+class PostWriteBehind:
+    """
+    Write-behind pipeline from the in-memory post store to the `posts` table.
+
+    The store acknowledges writes from memory and queues them here; a background task started
+    in `lifespan` flushes them to MySQL. Changes are coalesced per post ID, so a post created
+    and deleted before the next flush never reaches the database. A flush is triggered once
+    `WRITE_BEHIND_BATCH_SIZE` changes are queued or `WRITE_BEHIND_FLUSH_INTERVAL` seconds after
+    the previous one, and writes one batch per transaction: a single multi-row INSERT and a
+    single DELETE.
+
+    A failed batch is put back in front of the queue and retried with exponential backoff. A
+    batch the database rejects with an integrity error is retried one change at a time, and
+    only the changes that fail on their own are dropped.
+    When a write would take the queue past `WRITE_BEHIND_MAX_PENDING` changes, writers wait
+    in `wait_for_capacity` until the queue has drained to half of that. Stopping flushes
+    everything still queued.
+
+    The number of uncommitted changes is also tracked per user, so the store only evicts
+    users whose posts in the database are complete. The store journal keeps its logs until
+    the changes they hold are committed (see `oldest_queued_at`), and on a warm start the
+    changes of those logs are queued again, so a crash before a flush loses nothing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._pending: Dict[int, Change] = {}
+        self._batch: Dict[int, Change] = {}
+        self._user_changes: Dict[int, int] = {}
+        self._in_flight = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._drained: Optional[asyncio.Event] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.queued = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.rows_inserted = 0
+        self.rows_deleted = 0
+        self.failures = 0
+        self.dropped = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    @property
+    def depth(self) -> int:
+        """
+        Number of changes not yet committed to the database, including the batch being flushed.
+        """
+        return len(self._pending) + self._in_flight
+
+    async def start(self) -> None:
+        """
+        Start the background flush task.
+        """
+        self._wakeup = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._stopping = asyncio.Event()
+        self.enabled = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Flush every queued change and stop the background task.
+
+        Gives up after `WRITE_BEHIND_SHUTDOWN_TIMEOUT` seconds if the database keeps failing.
+        """
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stopping.set()
+        self._wakeup.set()
+        await self._task
+
+    def enqueue_insert(self, user_id: int, post_id: int, title: str, content: str,
+                       queued_at: Optional[float] = None) -> None:
+        """
+        Queue the creation of a post.
+
+        Args:
+            user_id (int): The ID of the user owning the post.
+            post_id (int): The ID the store gave the post, also used as the row's primary key.
+            title (str): The title of the post.
+            content (str): The content of the post.
+            queued_at (Optional[float]): Monotonic time the change was made, now if None; earlier
+                for changes recovered from the store journal.
+        """
+        if not self.enabled:
+            return
+        row = {"id": post_id, "user_id": user_id, "title": title, "content": content,
+               "created_at": datetime.datetime.now()}
+        self._put(post_id, (INSERT, user_id, row, time.monotonic() if queued_at is None else queued_at))
+
+    def enqueue_delete(self, user_id: int, post_id: int, queued_at: Optional[float] = None) -> None:
+        """
+        Queue the deletion of a post.
+
+        Args:
+            user_id (int): The ID of the user owning the post.
+            post_id (int): The ID of the deleted post.
+            queued_at (Optional[float]): Monotonic time the change was made, now if None.
+        """
+        if not self.enabled:
+            return
+        queued = self._pending.get(post_id)
+        if queued is not None and queued[0] == INSERT:
+            # The row was never written, so neither the insert nor the delete has to be
+            del self._pending[post_id]
+            self._settled(user_id)
+            self.coalesced += 2
+            return
+        self._put(post_id, (DELETE, user_id, None, time.monotonic() if queued_at is None else queued_at))
+
+    def has_pending(self, user_id: int) -> bool:
+        """
+        Check whether changes to a user's posts are still waiting to be committed.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            bool: True if the posts table does not reflect every change of the user yet.
+        """
+        return user_id in self._user_changes
+
+    def pending_changes(self, user_id: int) -> Dict[int, Change]:
+        """
+        Get a user's changes that are not committed yet, e.g. to apply them on top of the user's rows.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            Dict[int, Change]: The latest change of each post, by post ID.
+        """
+        if user_id not in self._user_changes:
+            return {}
+        changes = {post_id: change for post_id, change in self._batch.items() if change[1] == user_id}
+        changes.update((post_id, change) for post_id, change in self._pending.items() if change[1] == user_id)
+        return changes
+
+    def oldest_queued_at(self) -> Optional[float]:
+        """
+        Get the monotonic time the oldest change not yet committed was queued.
+
+        Returns:
+            Optional[float]: The time, or None if every change is committed.
+        """
+        return min((change[3] for changes in (self._pending, self._batch) for change in changes.values()),
+                   default=None)
+
+    def _settled(self, user_id: int, count: int = 1) -> None:
+        # `count` changes of the user were committed or cancelled out
+        remaining = self._user_changes[user_id] - count
+        if remaining:
+            self._user_changes[user_id] = remaining
+        else:
+            del self._user_changes[user_id]
+
+    def _put(self, post_id: int, change: Change) -> None:
+        if post_id not in self._pending:
+            self._user_changes[change[1]] = self._user_changes.get(change[1], 0) + 1
+        self._pending[post_id] = change
+        self.queued += 1
+        if len(self._pending) >= settings.WRITE_BEHIND_BATCH_SIZE:
+            self._wakeup.set()
+        if self.depth >= settings.WRITE_BEHIND_MAX_PENDING:
+            self._drained.clear()
+
+    async def wait_for_capacity(self, changes: int = 1) -> None:
+        """
+        Apply backpressure: wait while the queue has no room for `changes` more changes.
+
+        Writes admitted at the same time are not counted against each other, so the queue can
+        briefly exceed `WRITE_BEHIND_MAX_PENDING` by what they add.
+
+        Args:
+            changes (int): The number of changes the write is about to queue.
+
+        Raises:
+            WriteQueueFull: If the queue did not drain within `WRITE_BEHIND_BACKPRESSURE_TIMEOUT` seconds.
+        """
+        if not self.enabled:
+            return
+        if self._drained.is_set():
+            if self.depth + changes <= settings.WRITE_BEHIND_MAX_PENDING:
+                return
+            # Full for this write: wait for the drain down to half, like every other writer
+            self._drained.clear()
+        self.throttled += 1
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout=settings.WRITE_BEHIND_BACKPRESSURE_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise WriteQueueFull
+
+    def _take_batch(self) -> Dict[int, Change]:
+        batch = {}
+        for post_id in list(self._pending)[:settings.WRITE_BEHIND_BATCH_SIZE]:
+            batch[post_id] = self._pending.pop(post_id)
+        self._batch = batch
+        self._in_flight = len(batch)
+        return batch
+
+    def _requeue(self, batch: Dict[int, Change]) -> None:
+        # Put a failed batch back in front of the changes queued since it was taken
+        pending = dict(batch)
+        for post_id, change in self._pending.items():
+            if change[0] == DELETE and pending.get(post_id, (None,))[0] == INSERT:
+                del pending[post_id]
+                self._settled(change[1], 2)
+                self.coalesced += 2
+            else:
+                if post_id in pending:
+                    self._settled(change[1])
+                pending[post_id] = change
+        self._pending = pending
+
+    async def _flush(self, batch: Dict[int, Change]) -> None:
+        rows = [row for operation, _, row, _ in batch.values() if operation == INSERT]
+        deleted_ids = [post_id for post_id, (operation, _, _, _) in batch.items() if operation == DELETE]
+        db = await AsyncDBSingleton.get_session()
+        try:
+            await crud_post.write_behind_batch(db, rows, deleted_ids)
+        except Exception:
+            await db.rollback()
+            raise
+        finally:
+            await db.close()
+        self.rows_inserted += len(rows)
+        self.rows_deleted += len(deleted_ids)
+
+    async def _flush_batch(self, batch: Dict[int, Change]) -> None:
+        # Changes are removed from `batch` as they are committed, so a caller that catches an
+        # error only requeues what is left
+        try:
+            await self._flush(batch)
+        except IntegrityError as e:
+            if len(batch) == 1:
+                post_id, change = next(iter(batch.items()))
+                logger.error("Dropping change of post %d rejected by the database: %s", post_id, e)
+                self.dropped += 1
+                self._settled(change[1])
+                batch.clear()
+                return
+            for post_id, change in list(batch.items()):
+                await self._flush_batch({post_id: change})
+                del batch[post_id]
+            return
+        for _, user_id, _, _ in batch.values():
+            self._settled(user_id)
+        batch.clear()
+
+    async def _run(self) -> None:
+        retry_delay = settings.WRITE_BEHIND_RETRY_DELAY
+        stop_deadline = None
+        while True:
+            if not self._pending:
+                if self._stopping.is_set():
+                    return
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.WRITE_BEHIND_FLUSH_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+            while self._pending:
+                batch = self._take_batch()
+                started = time.perf_counter()
+                try:
+                    await self._flush_batch(batch)
+                except Exception as e:
+                    self._requeue(batch)
+                    self._batch = {}
+                    self._in_flight = 0
+                    self.failures += 1
+                    logger.error("Write-behind flush of %d changes failed, retrying in %.1f s: %s",
+                                 len(batch), retry_delay, getattr(e, "orig", e))
+                    if self._stopping.is_set():
+                        stop_deadline = stop_deadline or time.monotonic() + settings.WRITE_BEHIND_SHUTDOWN_TIMEOUT
+                        if time.monotonic() >= stop_deadline:
+                            logger.error("Giving up on %d queued post changes at shutdown", len(self._pending))
+                            return
+                    await asyncio.sleep(retry_delay)
+                    retry_delay = min(retry_delay * 2, settings.WRITE_BEHIND_RETRY_MAX_DELAY)
+                    continue
+                retry_delay = settings.WRITE_BEHIND_RETRY_DELAY
+                self._batch = {}
+                self._in_flight = 0
+                self.flushes += 1
+                self.last_flush_seconds = time.perf_counter() - started
+                self.total_flush_seconds += self.last_flush_seconds
+                if self.depth <= settings.WRITE_BEHIND_MAX_PENDING // 2:
+                    self._drained.set()
+
+    def stats(self) -> dict:
+        """
+        Get the queue and flush counters.
+
+        Returns:
+            dict: Queue depth, age of the oldest queued change, flush latency and row counters.
+        """
+        oldest = next(iter(self._pending.values()), None)
+        return {
+            "enabled": self.enabled,
+            "depth": self.depth,
+            "oldest_change_age_seconds": round(time.monotonic() - oldest[3], 6) if oldest else 0.0,
+            "users": len(self._user_changes),
+            "queued": self.queued,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "last_flush_seconds": round(self.last_flush_seconds, 6),
+            "average_flush_seconds": round(self.total_flush_seconds / self.flushes, 6) if self.flushes else 0.0,
+            "rows_inserted": self.rows_inserted,
+            "rows_deleted": self.rows_deleted,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+        }
+
+
+# Write-behind queue from the in-memory post store to the database
+post_write_behind = PostWriteBehind()
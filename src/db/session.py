@@ -1,9 +1,141 @@
+import asyncio
+import itertools
+import logging
+import time
 from asyncio import current_task
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from contextvars import ContextVar
+from typing import Any, List, Optional
+
+from cachetools import TTLCache
+from sqlalchemy import exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.asyncio import async_scoped_session
-from sqlalchemy.pool import NullPool
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from sqlalchemy.sql.expression import Select, UpdateBase
 from config import settings
 
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Key identifying whose writes the current request should observe (set to the user ID by get_current_user)
+read_your_writes_key: ContextVar[Optional[Any]] = ContextVar("read_your_writes_key", default=None)
+
+# Keys that wrote recently; their reads stay on the primary until the entry expires
+recent_writers = TTLCache(maxsize=100_000, ttl=settings.DB_READ_YOUR_WRITES_SECONDS)
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    Async queue pool that keeps running statistics about connection checkouts.
+
+    SQLAlchemy already tracks how many connections are checked out and how far the pool
+    has overflowed; this subclass adds how long callers waited for a connection and how
+    often new connections had to be opened, which is what is needed to size the pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.connections_opened = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def connect(self):
+        """
+        Check out a connection, recording the time spent waiting for it.
+
+        Returns:
+            PoolProxiedConnection: The checked out connection.
+
+        Raises:
+            sqlalchemy.exc.TimeoutError: If no connection became available within the pool timeout.
+        """
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.checkout_timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        self.checkouts += 1
+        self.wait_time_total += waited
+        self.wait_time_max = max(self.wait_time_max, waited)
+        return connection
+
+    def _create_connection(self):
+        self.connections_opened += 1
+        return super()._create_connection()
+
+    def stats(self) -> dict:
+        """
+        Get a snapshot of the pool statistics.
+
+        Returns:
+            dict: Pool size, usage and checkout wait time figures (times in milliseconds).
+        """
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "checkouts": self.checkouts,
+            "checkout_timeouts": self.checkout_timeouts,
+            "connections_opened": self.connections_opened,
+            "wait_time_avg_ms": round(self.wait_time_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "wait_time_max_ms": round(self.wait_time_max * 1000, 3),
+        }
+
+
+class RoutingSession(Session):
+    """
+    Session that routes reads to the read replicas and everything else to the primary.
+
+    Writes (flushes and INSERT/UPDATE/DELETE statements), locking reads and textual
+    statements always go to the primary. Once a session has written it stays on the
+    primary, and so do the reads of any request whose `read_your_writes_key` wrote within
+    the last `DB_READ_YOUR_WRITES_SECONDS`, so users always see their own writes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pinned_to_primary = False
+
+    def get_bind(self, mapper=None, clause=None, **kw) -> Engine:
+        """
+        Pick the engine to execute a statement on.
+
+        Args:
+            mapper: The mapper of the entity being queried, if any.
+            clause: The statement being executed, if any.
+
+        Returns:
+            Engine: The primary engine or one of the replica engines.
+        """
+        primary = super().get_bind(mapper, clause=clause, **kw)
+        if self.pinned_to_primary:
+            return primary
+
+        is_read = isinstance(clause, Select) and clause._for_update_arg is None
+        if not self._flushing and is_read:
+            key = read_your_writes_key.get()
+            if key is None or key not in recent_writers:
+                replica = AsyncDBSingleton.pick_replica()
+                if replica is not None:
+                    return replica.sync_engine
+            return primary
+
+        if self._flushing or isinstance(clause, UpdateBase):
+            # Everything after a write in this session must see it, so stop using replicas
+            self.pinned_to_primary = True
+            key = read_your_writes_key.get()
+            if key is not None:
+                recent_writers[key] = True
+        return primary
+
 
 class AsyncDBSingleton:
     """
@@ -15,30 +147,129 @@ class AsyncDBSingleton:
     """
 
     _engine = None
+    _replica_engines: List[AsyncEngine] = []
+    _replica_cycle = None
     _async_session = None
 
+    @staticmethod
+    def _create_engine(url: str) -> AsyncEngine:
+        """
+        Create an asynchronous engine with the configured pooling options.
+
+        Args:
+            url (str): The async connection URL.
+
+        Returns:
+            AsyncEngine: The created engine.
+        """
+        if settings.DB_POOL_ENABLED:
+            pool_options = dict(
+                poolclass=InstrumentedAsyncQueuePool,
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                pool_recycle=settings.DB_POOL_RECYCLE,
+                pool_timeout=settings.DB_POOL_TIMEOUT,
+            )
+        else:
+            pool_options = dict(poolclass=NullPool)
+        return create_async_engine(
+            url,
+            future=True,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            **pool_options
+        )
+
     @classmethod
     async def init_engine(cls):
         """
         Initialize the asynchronous database engine if it has not been initialized.
 
         This method creates an asynchronous engine using the connection URI from the settings.
-        The engine is configured to use the `NullPool` class, meaning no connection pooling
-        is done, and connections are created and closed with each request.
+        By default the engine keeps a pool of open connections (`InstrumentedAsyncQueuePool`)
+        sized by the `DB_POOL_*` settings. Setting `DB_POOL_ENABLED` to False switches back to
+        `NullPool`, where connections are created and closed with each request.
+        An engine is also created for every read replica in `MYSQL_REPLICA_URIS`.
 
         Returns:
-            AsyncEngine: The initialized asynchronous engine.
+            AsyncEngine: The initialized asynchronous (primary) engine.
         """
-        print(settings.SQLALCHEMY_ASYNC_DATABASE_URI.__str__())
         if cls._engine is None:
-            cls._engine = create_async_engine(
-                settings.SQLALCHEMY_ASYNC_DATABASE_URI.__str__(),
-                future=True,
-                poolclass=NullPool,
-                pool_pre_ping=True
-            )
+            cls._engine = cls._create_engine(settings.SQLALCHEMY_ASYNC_DATABASE_URI.__str__())
+            cls._replica_engines = [cls._create_engine(url) for url in settings.get_replica_connection_urls()]
+            cls._replica_cycle = itertools.cycle(cls._replica_engines)
         return cls._engine
 
+    @classmethod
+    def pick_replica(cls) -> Optional[AsyncEngine]:
+        """
+        Choose the read replica for the next read.
+
+        With the `round_robin` strategy replicas take turns; with `least_loaded` the replica
+        with the fewest checked out connections is chosen.
+
+        Returns:
+            Optional[AsyncEngine]: The chosen replica engine, or None when no replicas are configured.
+        """
+        if not cls._replica_engines:
+            return None
+        if settings.DB_REPLICA_STRATEGY == "least_loaded" and settings.DB_POOL_ENABLED:
+            return min(cls._replica_engines, key=lambda engine: engine.pool.checkedout())
+        return next(cls._replica_cycle)
+
+    @classmethod
+    async def warm_up(cls, connections: Optional[int] = None) -> int:
+        """
+        Open pooled connections ahead of the first requests.
+
+        The connections are opened concurrently and immediately returned to the pool, so the
+        first requests after startup do not pay for the TCP connect and MySQL handshake.
+
+        Args:
+            connections (Optional[int]): Number of connections to open. Defaults to
+                `DB_POOL_PREWARM`, or `DB_POOL_SIZE` when that is not set.
+
+        Returns:
+            int: The number of connections that were opened.
+        """
+        if not settings.DB_POOL_ENABLED:
+            return 0
+        if connections is None:
+            connections = settings.DB_POOL_SIZE if settings.DB_POOL_PREWARM is None else settings.DB_POOL_PREWARM
+        connections = min(connections, settings.DB_POOL_SIZE)
+        if connections <= 0:
+            return 0
+
+        primary = await cls.init_engine()
+        engines = [primary, *cls._replica_engines]
+        opened = await asyncio.gather(*(engine.connect() for engine in engines for _ in range(connections)))
+        for connection in opened:
+            await connection.close()
+        return len(opened)
+
+    @classmethod
+    def pool_stats(cls) -> dict:
+        """
+        Get live statistics of the engine connection pools.
+
+        Returns:
+            dict: The primary pool statistics, with the statistics of each replica pool under
+                `replicas`. Pools that are not instrumented only report their class name.
+        """
+        if cls._engine is None:
+            return {"initialized": False}
+
+        def describe(engine: AsyncEngine) -> dict:
+            pool = engine.pool
+            if isinstance(pool, InstrumentedAsyncQueuePool):
+                return pool.stats()
+            return {"pool": pool.__class__.__name__}
+
+        return {
+            "initialized": True,
+            **describe(cls._engine),
+            "replicas": [describe(engine) for engine in cls._replica_engines],
+        }
+
     @classmethod
     async def get_session(cls):
         """
@@ -46,7 +277,8 @@ class AsyncDBSingleton:
 
         This method initializes the session maker if it has not been initialized and
         returns a session that is scoped to the current task. This ensures that each
-        asynchronous task gets its own session.
+        asynchronous task gets its own session. Sessions are `RoutingSession`s, so reads
+        are spread over the read replicas when any are configured.
 
         Returns:
             AsyncSession: The scoped asynchronous session.
@@ -54,7 +286,7 @@ class AsyncDBSingleton:
         if cls._async_session is None:
             engine = await cls.init_engine()
             cls._async_session = async_sessionmaker(
-                engine, expire_on_commit=False, class_=AsyncSession, future=True
+                engine, expire_on_commit=False, class_=AsyncSession, sync_session_class=RoutingSession, future=True
             )
         return async_scoped_session(cls._async_session, scopefunc=current_task)
 
@@ -69,7 +301,11 @@ class AsyncDBSingleton:
         """
         if cls._engine:
             await cls._engine.dispose()
+            for replica in cls._replica_engines:
+                await replica.dispose()
             cls._engine = None
+            cls._replica_engines = []
+            cls._replica_cycle = None
             cls._async_session = None
 
 
@@ -77,7 +313,9 @@ async def get_async_db() -> AsyncSession:
     """
     Dependency function to provide a database session to FastAPI endpoints.
 
-    This function yields a database session that is scoped to the current task. It handles
+    This function yields a database session that is scoped to the current task. Reads made
+    through the session go to the read replicas (when configured) and writes go to the
+    primary, so endpoints don't need to know about replication. It handles
     the creation, commitment, and rollback of transactions, ensuring that the session is
     properly closed after each use.
 
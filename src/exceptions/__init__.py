@@ -1,2 +1,2 @@
-from .user_exception import UserExistsWithThisEmail , InvalidCredentials , InvalidToken , InvalidTokenType
-from .post_exception import PayloadSizeExceed , NotOwnerException , ItemNotFound
+from .user_exception import UserExistsWithThisEmail , InvalidCredentials , InvalidToken , InvalidTokenType , HashingQueueFull , RevocationCheckUnavailable
+from .post_exception import PayloadSizeExceed , NotOwnerException , ItemNotFound , WriteQueueFull , PostStoreFull
@@ -55,6 +55,30 @@ class ExceptionResult:
         "result": "Item not found"
     }
 
+    WriteQueueFull = {
+        "status_code": 5030,
+        "message": "not ok",
+        "result": "Too many pending writes, try again later"
+    }
+
+    PostStoreFull = {
+        "status_code": 5070,
+        "message": "not ok",
+        "result": "Post storage is full"
+    }
+
+    HashingQueueFull = {
+        "status_code": 5031,
+        "message": "not ok",
+        "result": "Too many sign-ins in progress, try again later"
+    }
+
+    RevocationCheckUnavailable = {
+        "status_code": 5032,
+        "message": "not ok",
+        "result": "Token could not be checked, try again later"
+    }
+
     def get_content(self, exc: Exception) -> dict:
         """
         Get the structured content for the given exception.
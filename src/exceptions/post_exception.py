@@ -32,3 +32,25 @@ class ItemNotFound(BaseCustomHttpException):
 
     def __init__(self, val: str = None, *args, **kwargs):
         super(ItemNotFound, self).__init__(status_code=404, val=val, *args, **kwargs)
+
+
+class WriteQueueFull(BaseCustomHttpException):
+    """
+    Exception raised when the write-behind queue to the database stays full for too long.
+
+    Inherits from BaseCustomHttpException with a default status code of 503 (Service Unavailable).
+    """
+
+    def __init__(self, val: str = None, *args, **kwargs):
+        super(WriteQueueFull, self).__init__(status_code=503, val=val, *args, **kwargs)
+
+
+class PostStoreFull(BaseCustomHttpException):
+    """
+    Exception raised when the shared post store has no room left, even after compaction.
+
+    Inherits from BaseCustomHttpException with a default status code of 507 (Insufficient Storage).
+    """
+
+    def __init__(self, val: str = None, *args, **kwargs):
+        super(PostStoreFull, self).__init__(status_code=507, val=val, *args, **kwargs)
@@ -43,3 +43,25 @@ class InvalidTokenType(BaseCustomHttpException):
 
     def __init__(self, val: str = None, *args, **kwargs):
         super(InvalidTokenType, self).__init__(status_code=401, val=val, *args, **kwargs)
+
+
+class HashingQueueFull(BaseCustomHttpException):
+    """
+    Exception raised when too many password hashes or checks are waiting for a worker.
+
+    Inherits from BaseCustomHttpException with a default status code of 503 (Service Unavailable).
+    """
+
+    def __init__(self, val: str = None, *args, **kwargs):
+        super(HashingQueueFull, self).__init__(status_code=503, val=val, *args, **kwargs)
+
+
+class RevocationCheckUnavailable(BaseCustomHttpException):
+    """
+    Exception raised when a token the revocation filter matches cannot be checked in the database.
+
+    Inherits from BaseCustomHttpException with a default status code of 503 (Service Unavailable).
+    """
+
+    def __init__(self, val: str = None, *args, **kwargs):
+        super(RevocationCheckUnavailable, self).__init__(status_code=503, val=val, *args, **kwargs)
@@ -0,0 +1,79 @@
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Fixed-size set membership filter with no false negatives.
+
+    `key in bloom` is False for every key that was never added, and True for every key that
+    was, plus a fraction of other keys close to `error_rate` while at most `capacity` keys are
+    in it. Keys cannot be removed; drop expired keys by building a new filter.
+
+    The filter takes about 1.44 * log2(1 / error_rate) bits per key of `capacity` (14.4 bits
+    for 0.1%), whatever the size of the keys. The bit positions of a key come from a single
+    BLAKE2b digest by double hashing.
+    """
+    __slots__ = ("capacity", "error_rate", "size", "hashes", "count", "_bits")
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        Args:
+            capacity (int): Number of keys the filter is sized for.
+            error_rate (float): False positive rate wanted at `capacity` keys, e.g. 0.001.
+        """
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        # Optimal number of bits and of hash functions for the capacity and error rate
+        self.size = max(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        # Odd, so the positions of a key never collapse onto one bit
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, key: str) -> None:
+        """
+        Add a key to the filter.
+
+        Args:
+            key (str): The key.
+        """
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def false_positive_rate(self) -> float:
+        """
+        Estimate the false positive rate at the current number of keys.
+        """
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+    def stats(self) -> dict:
+        """
+        Get the size and fill of the filter.
+
+        Returns:
+            dict: Keys added, capacity, size in bytes, number of hash functions and the estimated
+                false positive rate.
+        """
+        return {
+            "keys": self.count,
+            "capacity": self.capacity,
+            "bytes": len(self._bits),
+            "hashes": self.hashes,
+            "false_positive_rate": round(self.false_positive_rate(), 6),
+        }
@@ -0,0 +1,348 @@
+import hashlib
+import secrets
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+from cachetools import TTLCache
+
+from config import settings
+
+
+class CountingTTLCache(TTLCache):
+    """
+    TTL cache that counts how many entries it dropped because of size or age.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+        self.expirations = 0
+
+    def popitem(self):
+        # Called by cachetools to make room when the cache is full
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired)
+        return expired
+
+
+class ResponseCache:
+    """
+    Read-through cache of serialized responses, keyed per user.
+
+    Every user has one entry holding the rendered response bodies of the request variants
+    (e.g. page size and cursor) that user fetched, so a single write invalidates all of them.
+    Entries live for `CACHE_TIME` seconds at most. The compressed forms of a body are kept
+    next to it, one per content coding, so a popular page is compressed once per version
+    rather than once per request.
+
+    A fill that started before a write to the same user must not store its (now stale)
+    body, so callers take a token with `fill_token` before computing a response and pass
+    it to `set`, which drops the body if the user was invalidated in the meantime.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, max_variants: int):
+        self.max_variants = max_variants
+        self._entries: CountingTTLCache = CountingTTLCache(maxsize=maxsize, ttl=ttl)
+        # Write clock value of each user's latest invalidation, kept as long as a racing fill could live
+        self._invalidated_at: TTLCache = TTLCache(maxsize=maxsize * 10, ttl=ttl)
+        self._write_clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.encoded_hits = 0
+        self.encoded_misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int, variant: Hashable, encoding: Optional[str] = None) -> Optional[bytes]:
+        """
+        Look up a cached response body.
+
+        Args:
+            user_id (int): The ID of the user the response belongs to.
+            variant (Hashable): The request variant, e.g. a (limit, cursor) tuple.
+            encoding (Optional[str]): The content coding of the body, None for the uncompressed body.
+
+        Returns:
+            Optional[bytes]: The cached body, or None on a miss.
+        """
+        variants: Optional[Dict[Hashable, Dict[Optional[str], bytes]]] = self._entries.get(user_id)
+        bodies = variants.get(variant) if variants is not None else None
+        body = bodies.get(encoding) if bodies is not None else None
+        if encoding is None:
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        elif body is None:
+            self.encoded_misses += 1
+        else:
+            self.encoded_hits += 1
+        return body
+
+    def fill_token(self) -> int:
+        """
+        Take a token to pass to `set` for a response about to be computed.
+
+        Returns:
+            int: The current write clock.
+        """
+        return self._write_clock
+
+    def set(self, user_id: int, variant: Hashable, body: bytes, token: int) -> bool:
+        """
+        Store a response body unless the user's data changed after `token` was taken.
+
+        Args:
+            user_id (int): The ID of the user the response belongs to.
+            variant (Hashable): The request variant, e.g. a (limit, cursor) tuple.
+            body (bytes): The serialized response body.
+            token (int): The token returned by `fill_token` before the response was computed.
+
+        Returns:
+            bool: True if the body was stored.
+        """
+        if self._invalidated_at.get(user_id, -1) > token:
+            return False
+        variants = self._entries.get(user_id)
+        if variants is None:
+            variants = self._entries[user_id] = {}
+        elif len(variants) >= self.max_variants and variant not in variants:
+            # Drop the oldest variant of this user
+            del variants[next(iter(variants))]
+        variants[variant] = {None: body}
+        return True
+
+    def set_encoded(self, user_id: int, variant: Hashable, encoding: str, body: bytes, encoded: bytes) -> bool:
+        """
+        Store the compressed form of a cached response body next to it.
+
+        Args:
+            user_id (int): The ID of the user the response belongs to.
+            variant (Hashable): The request variant, e.g. a (limit, cursor) tuple.
+            encoding (str): The content coding of `encoded`.
+            body (bytes): The uncompressed body `encoded` was compressed from.
+            encoded (bytes): The compressed body.
+
+        Returns:
+            bool: True if it was stored, False if `body` is no longer the cached body.
+        """
+        variants = self._entries.get(user_id)
+        bodies = variants.get(variant) if variants is not None else None
+        if bodies is None or bodies[None] is not body:
+            return False
+        bodies[encoding] = encoded
+        return True
+
+    def invalidate(self, user_id: int) -> None:
+        """
+        Drop every cached response of a user, called whenever the user's posts change.
+
+        Args:
+            user_id (int): The ID of the user whose responses are stale.
+        """
+        self._write_clock += 1
+        self._invalidated_at[user_id] = self._write_clock
+        if self._entries.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: Size, hit (uncompressed and compressed), miss, invalidation, eviction and
+                expiration counters.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self._entries),
+            "maxsize": self._entries.maxsize,
+            "ttl": self._entries.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "encoded_hits": self.encoded_hits,
+            "encoded_misses": self.encoded_misses,
+            "invalidations": self.invalidations,
+            "evictions": self._entries.evictions,
+            "expirations": self._entries.expirations,
+        }
+
+
+class PostVersions:
+    """
+    Version of every user's posts, the basis of the strong ETags of GET /post/.
+
+    A user's version is the value of a global write clock at the user's latest change, bumped
+    through `notify_posts_changed` by every write of the in-memory store, the shared store and
+    the database CRUD layer. Only the `maxsize` most recently changed users are remembered; the
+    others report the highest version ever forgotten, which is at least as new as their last
+    change, so forgetting a user costs at most one full response and never a wrong 304.
+
+    ETags also depend on an epoch, random per process, so an ETag from another worker or from
+    before a restart never matches. With the shared store, the epoch and the versions are
+    instead taken from the shared arena (see `share`), so every worker on the host hands out
+    the same ETags and `since` tokens for the same posts.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.epoch = secrets.token_hex(8)
+        self._versions: "OrderedDict[int, int]" = OrderedDict()
+        self._clock = 0
+        self._floor = 0
+        self._base = 0
+        self.bumps = 0
+        self.not_modified = 0
+
+    def share(self, epoch: str, base: int) -> None:
+        """
+        Take the epoch and versions from state shared with the other workers.
+
+        Args:
+            epoch (str): The epoch, the same in every worker.
+            base (int): The lowest version from now on; users whose version is lower report it.
+        """
+        self.epoch = epoch
+        self._base = base
+        self._clock = max(self._clock, base)
+
+    def bump(self, user_id: int, version: Optional[int] = None) -> int:
+        """
+        Give a user's posts a new version.
+
+        Args:
+            user_id (int): The ID of the user whose posts changed.
+            version (Optional[int]): The version, from the clock shared with the other workers;
+                None to take the next value of this process's clock.
+
+        Returns:
+            int: The new version.
+        """
+        if version is None:
+            self._clock += 1
+            version = self._clock
+        else:
+            self._clock = max(self._clock, version)
+        self._versions[user_id] = version
+        self._versions.move_to_end(user_id)
+        if len(self._versions) > self.maxsize:
+            _, forgotten = self._versions.popitem(last=False)
+            self._floor = max(self._floor, forgotten)
+        self.bumps += 1
+        return version
+
+    def get(self, user_id: int) -> int:
+        """
+        Get the version of a user's posts.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            int: The version; it changes whenever the user's posts do.
+        """
+        return max(self._versions.get(user_id, self._floor), self._base)
+
+    def token(self, version: int) -> str:
+        """
+        Get the form of a version handed to clients, e.g. as the `since` of GET /post/changes.
+
+        Args:
+            version (int): The version.
+
+        Returns:
+            str: The version, qualified by the epoch.
+        """
+        return f"{self.epoch}.{version}"
+
+    def parse(self, token: str) -> Optional[int]:
+        """
+        Get the version back from a token returned by `token`.
+
+        Args:
+            token (str): The token sent by the client.
+
+        Returns:
+            Optional[int]: The version, or None if the token is malformed or from another epoch.
+        """
+        epoch, _, version = token.partition(".")
+        if epoch != self.epoch or not version.isdigit():
+            return None
+        return int(version)
+
+    def etag(self, user_id: int, version: int, variant: Hashable) -> str:
+        """
+        Get the strong ETag of one response over a user's posts.
+
+        Args:
+            user_id (int): The ID of the user.
+            version (int): The version of the user's posts, from `get`.
+            variant (Hashable): The request variant, e.g. a (limit, cursor) tuple.
+
+        Returns:
+            str: The quoted ETag.
+        """
+        digest = hashlib.blake2b(f"{self.epoch}:{user_id}:{version}:{variant!r}".encode(), digest_size=12)
+        return f'"{digest.hexdigest()}"'
+
+    def matches(self, if_none_match: Optional[str], etag: str) -> Optional[str]:
+        """
+        Check an If-None-Match header against the current ETag.
+
+        The ETags of compressed responses, which have the content coding appended (see
+        `extras.compression.etag_for_encoding`), match as well.
+
+        Args:
+            if_none_match (Optional[str]): The header, None if missing.
+            etag (str): The current ETag.
+
+        Returns:
+            Optional[str]: The ETag the client holds, to send back with a 304, or None if the
+                client does not have the current response.
+        """
+        if not if_none_match:
+            return None
+        matched = None
+        if if_none_match.strip() == "*":
+            matched = etag
+        else:
+            # Weak comparison, as RFC 9110 specifies for If-None-Match
+            prefix = etag[:-1] + "-"
+            for candidate in if_none_match.split(","):
+                candidate = candidate.strip().removeprefix("W/")
+                if candidate == etag or (candidate.startswith(prefix) and candidate.endswith('"')):
+                    matched = candidate
+                    break
+        if matched is not None:
+            self.not_modified += 1
+        return matched
+
+    def stats(self) -> dict:
+        """
+        Get the version counters.
+
+        Returns:
+            dict: Users tracked, version bumps and 304 responses.
+        """
+        return {
+            "users": len(self._versions),
+            "maxsize": self.maxsize,
+            "bumps": self.bumps,
+            "not_modified": self.not_modified,
+        }
+
+
+# Cache of rendered GET /post/ responses
+response_cache = ResponseCache(
+    maxsize=settings.RESPONSE_CACHE_MAXSIZE,
+    ttl=settings.CACHE_TIME,
+    max_variants=settings.RESPONSE_CACHE_MAX_VARIANTS,
+)
+
+# Versions of the users' posts, for the ETags of GET /post/
+post_versions = PostVersions(maxsize=settings.RESPONSE_CACHE_MAXSIZE * 10)
@@ -0,0 +1,337 @@
+import gzip
+import time
+import zlib
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli is optional: "br" is not offered without it
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional: "zstd" is not offered without it
+    zstandard = None
+
+# Media types worth compressing; everything else (e.g. images) is sent as is
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+class StreamCompressor:
+    """
+    Incremental compressor of one streamed response. Every chunk is flushed, so the client
+    can decode it without waiting for the next one.
+    """
+    __slots__ = ("_compress", "_finish")
+
+    def __init__(self, compress: Callable[[bytes], bytes], finish: Callable[[], bytes]):
+        self._compress = compress
+        self._finish = finish
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compress(chunk)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+def _gzip_stream() -> StreamCompressor:
+    compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return StreamCompressor(lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH),
+                            compressor.flush)
+
+
+def _brotli_stream() -> StreamCompressor:
+    compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return StreamCompressor(lambda chunk: compressor.process(chunk) + compressor.flush(), compressor.finish)
+
+
+def _zstd_stream() -> StreamCompressor:
+    compressor = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL).compressobj()
+    return StreamCompressor(lambda chunk: compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+                            compressor.flush)
+
+
+def _codecs() -> Dict[str, Tuple[Callable[[bytes], bytes], Callable[[], StreamCompressor]]]:
+    # One-shot and streaming compressor of every content coding whose library is installed
+    codecs = {
+        # mtime=0 keeps the output identical for identical bodies
+        "gzip": (lambda body: gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0),
+                 _gzip_stream),
+    }
+    if brotli is not None:
+        codecs["br"] = (lambda body: brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY),
+                        _brotli_stream)
+    if zstandard is not None:
+        zstd = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL)
+        codecs["zstd"] = (zstd.compress, _zstd_stream)
+    return codecs
+
+
+@lru_cache(maxsize=256)
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """
+    Parse an Accept-Encoding header into the q-value of every coding it names.
+
+    Clients send the same few headers over and over, so the results are cached.
+
+    Args:
+        header (str): The header, e.g. `gzip, deflate, br;q=0.9, *;q=0`.
+
+    Returns:
+        Dict[str, float]: The q-value of each coding, lower-cased.
+    """
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def etag_for_encoding(etag: str, encoding: str) -> str:
+    """
+    Get the ETag of the compressed form of a response, as strong ETags differ per content coding.
+
+    Args:
+        etag (str): The ETag of the uncompressed response.
+        encoding (str): The content coding.
+
+    Returns:
+        str: The ETag with the coding appended inside the quotes, e.g. `"abc-gzip"`.
+    """
+    if etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+
+class ResponseCompressor:
+    """
+    Compresses response bodies with gzip, brotli or zstd and measures what it costs.
+
+    The coding is negotiated from the Accept-Encoding header: of the codings in
+    `COMPRESSION_ENCODINGS` whose library is installed (brotli and zstandard are optional),
+    the one with the highest q-value wins, ties going to the order of the setting. Bodies
+    smaller than `COMPRESSION_MIN_SIZE` bytes are not worth it and are sent as is. The level
+    of each coding is configurable, and the bytes in and out and the CPU time spent are
+    counted per coding.
+    """
+
+    def __init__(self):
+        self._codecs = _codecs()
+        self.encodings: List[str] = [
+            encoding.strip() for encoding in settings.COMPRESSION_ENCODINGS.split(",")
+            if encoding.strip() in self._codecs
+        ]
+        self._stats = {encoding: {"responses": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0}
+                       for encoding in self.encodings}
+
+    def negotiate(self, accept_encoding: Optional[str]) -> Optional[str]:
+        """
+        Pick the content coding of a response.
+
+        Args:
+            accept_encoding (Optional[str]): The Accept-Encoding header of the request, None if missing.
+
+        Returns:
+            Optional[str]: The coding, or None to send the body uncompressed.
+        """
+        if not settings.COMPRESSION_ENABLED or not accept_encoding:
+            return None
+        accepted = parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get("*", 0.0)
+        best, best_quality = None, 0.0
+        for encoding in self.encodings:
+            quality = accepted.get(encoding, wildcard)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def worth_compressing(self, size: int) -> bool:
+        """
+        Check whether a body is large enough to be compressed.
+        """
+        return size >= settings.COMPRESSION_MIN_SIZE
+
+    def _count(self, encoding: str, bytes_in: int, bytes_out: int, cpu_seconds: float) -> None:
+        stats = self._stats[encoding]
+        stats["bytes_in"] += bytes_in
+        stats["bytes_out"] += bytes_out
+        stats["cpu_seconds"] += cpu_seconds
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        """
+        Compress a whole body.
+
+        Args:
+            body (bytes): The body.
+            encoding (str): A coding returned by `negotiate`.
+
+        Returns:
+            bytes: The compressed body.
+        """
+        started = time.thread_time()
+        compressed = self._codecs[encoding][0](body)
+        self._count(encoding, len(body), len(compressed), time.thread_time() - started)
+        self._stats[encoding]["responses"] += 1
+        return compressed
+
+    def stream(self, encoding: str) -> StreamCompressor:
+        """
+        Start compressing a streamed body.
+
+        Args:
+            encoding (str): A coding returned by `negotiate`.
+
+        Returns:
+            StreamCompressor: The compressor of the stream, counted in the stats as it goes.
+        """
+        stream = self._codecs[encoding][1]()
+        self._stats[encoding]["responses"] += 1
+
+        def compress(chunk: bytes) -> bytes:
+            started = time.thread_time()
+            compressed = stream.compress(chunk)
+            self._count(encoding, len(chunk), len(compressed), time.thread_time() - started)
+            return compressed
+
+        def finish() -> bytes:
+            started = time.thread_time()
+            compressed = stream.finish()
+            self._count(encoding, 0, len(compressed), time.thread_time() - started)
+            return compressed
+
+        return StreamCompressor(compress, finish)
+
+    def stats(self) -> dict:
+        """
+        Get the compression counters.
+
+        Returns:
+            dict: The codings offered, and per coding the responses compressed, bytes in and
+                out, compression ratio and CPU time per MiB of input.
+        """
+        codings = {}
+        for encoding, stats in self._stats.items():
+            codings[encoding] = {
+                **stats,
+                "cpu_seconds": round(stats["cpu_seconds"], 6),
+                "ratio": round(stats["bytes_out"] / stats["bytes_in"], 4) if stats["bytes_in"] else 0.0,
+                "cpu_seconds_per_mib": (
+                    round(stats["cpu_seconds"] / stats["bytes_in"] * 2 ** 20, 6) if stats["bytes_in"] else 0.0
+                ),
+            }
+        return {
+            "enabled": settings.COMPRESSION_ENABLED,
+            "encodings": self.encodings,
+            "min_size": settings.COMPRESSION_MIN_SIZE,
+            "codings": codings,
+        }
+
+
+# Compressor of the HTTP responses
+response_compressor = ResponseCompressor()
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies with the coding negotiated by `response_compressor`.
+
+    Whole bodies of at least `COMPRESSION_MIN_SIZE` bytes are compressed at once; streamed
+    bodies are compressed chunk by chunk as they are sent. Responses that already carry a
+    Content-Encoding (e.g. precompressed cached listings), responses without a body and
+    media types that do not compress well are passed through. A strong ETag gets the coding
+    appended, since the compressed bytes are a different representation.
+    """
+
+    def __init__(self, app: ASGIApp, compressor: ResponseCompressor = response_compressor):
+        self.app = app
+        self.compressor = compressor
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self.compressor.negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, CompressingSender(send, encoding, self.compressor).send)
+
+
+class CompressingSender:
+    """
+    The `send` of one response, compressing its body on the way out.
+    """
+
+    def __init__(self, send: Send, encoding: str, compressor: ResponseCompressor):
+        self._send = send
+        self.encoding = encoding
+        self.compressor = compressor
+        self._start: Optional[Message] = None
+        self._stream: Optional[StreamCompressor] = None
+        self._passthrough = False
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        return ("content-encoding" not in headers and self._start["status"] not in (204, 304)
+                and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES))
+
+    def _mark_encoded(self, headers: MutableHeaders) -> None:
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag is not None and not etag.startswith("W/"):
+            headers["ETag"] = etag_for_encoding(etag, self.encoding)
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Held back until the first body message tells whether and how to compress
+            self._start = message
+            return
+        if message["type"] != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self._stream is not None:
+            compressed = self._stream.compress(body) if body else b""
+            if not more_body:
+                compressed += self._stream.finish()
+            await self._send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+            return
+
+        headers = MutableHeaders(raw=self._start["headers"])
+        if not self._compressible(headers) or (not more_body and not self.compressor.worth_compressing(len(body))):
+            self._passthrough = True
+            await self._send(self._start)
+            await self._send(message)
+            return
+
+        self._mark_encoded(headers)
+        if not more_body:
+            compressed = self.compressor.compress(body, self.encoding)
+            headers["Content-Length"] = str(len(compressed))
+            await self._send(self._start)
+            await self._send({"type": "http.response.body", "body": compressed})
+            return
+
+        # A streamed body: its length is not known up front
+        del headers["Content-Length"]
+        self._stream = self.compressor.stream(self.encoding)
+        await self._send(self._start)
+        await self._send({"type": "http.response.body", "body": self._stream.compress(body), "more_body": True})
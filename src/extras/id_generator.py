@@ -0,0 +1,239 @@
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from time import time_ns
+from typing import Dict, List, Optional, Type
+
+from config import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process uses slot 0
+    fcntl = None
+
+# Snowflake layout: 40 bits of milliseconds since the epoch (almost 35 years), 10 bits of worker
+# ID, 3 bits of sequence. 53 bits in total, so IDs go out as plain JSON numbers and JavaScript
+# clients, whose numbers are doubles, still read them exactly.
+TIMESTAMP_BITS = 40
+TIMESTAMP_SHIFT = 13
+WORKER_SHIFT = 3
+NODE_BITS = 5  # High half of the worker ID, taken from settings (one value per host)
+SLOT_BITS = 5  # Low half of the worker ID, claimed by each process on the host
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+MAX_SLOT = (1 << SLOT_BITS) - 1
+MAX_SEQUENCE = (1 << WORKER_SHIFT) - 1
+MAX_SAFE_ID = (1 << 53) - 1  # Number.MAX_SAFE_INTEGER
+
+
+class IdGenerator(ABC):
+    """
+    Hands out post IDs without a database round trip.
+
+    IDs are strictly increasing within a process, so they can be used as pagination cursors.
+    """
+
+    @abstractmethod
+    def next_id(self) -> int:
+        """
+        Get a new ID.
+
+        Returns:
+            int: An ID greater than every ID this generator returned or was advanced past.
+        """
+
+    def next_ids(self, count: int) -> List[int]:
+        """
+        Get several new IDs at once, in increasing order.
+
+        Args:
+            count (int): The number of IDs.
+
+        Returns:
+            List[int]: The IDs.
+        """
+        return [self.next_id() for _ in range(count)]
+
+    @abstractmethod
+    def advance(self, last_id: int) -> None:
+        """
+        Make sure every ID handed out from now on is greater than `last_id`.
+
+        Called on startup with the highest ID already stored (restored snapshot, database).
+
+        Args:
+            last_id (int): The highest ID known to be taken.
+        """
+
+
+class SequenceIdGenerator(IdGenerator):
+    """
+    Consecutive integers from a process-local counter.
+
+    Only unique within one process; use `SnowflakeIdGenerator` as soon as several workers or
+    hosts write posts.
+    """
+
+    def __init__(self):
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            self._last += 1
+            return self._last
+
+    def next_ids(self, count: int) -> List[int]:
+        with self._lock:
+            first = self._last + 1
+            self._last += count
+        return list(range(first, first + count))
+
+    def advance(self, last_id: int) -> None:
+        with self._lock:
+            self._last = max(self._last, last_id)
+
+
+class SnowflakeIdGenerator(IdGenerator):
+    """
+    Snowflake IDs: milliseconds since `POST_ID_EPOCH_MS`, worker ID and a per-millisecond sequence.
+
+    The worker ID combines `POST_ID_NODE_ID` from settings (unique per host) with a slot that
+    each process claims on first use by taking an exclusive `flock` on a slot file in
+    `POST_ID_SLOT_DIR`. The lock is held for the life of the process, so no two live
+    processes on a host share a worker ID, and IDs are unique across processes and hosts.
+
+    The clock never goes backwards from the generator's point of view: when the wall clock
+    does, or when the 8 IDs of a millisecond are used up, the generator keeps counting
+    in its last millisecond or borrows the next one. Bursts therefore run the clock of the
+    IDs ahead of the wall clock for a moment, and a steady 8000 posts per second per process
+    are needed before it stops catching up. IDs are therefore strictly increasing in
+    a process and roughly time ordered across processes. A restart stays collision free as
+    long as the generator is advanced past the highest stored ID, which startup does.
+    """
+
+    def __init__(self, node_id: int, epoch_ms: int, slot_dir: Optional[str] = None):
+        if not 0 <= node_id <= MAX_NODE_ID:
+            raise ValueError(f"POST_ID_NODE_ID must be between 0 and {MAX_NODE_ID}")
+        self.node_id = node_id
+        self.epoch_ms = epoch_ms
+        self.slot_dir = slot_dir or tempfile.gettempdir()
+        self.slot: Optional[int] = None
+        self._worker_bits: Optional[int] = None
+        self._slot_file = None
+        self._last_ms = -1
+        self._sequence = MAX_SEQUENCE
+        self._lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            # A forked child shares the parent's slot lock, so it must claim its own slot
+            os.register_at_fork(after_in_child=self._release_slot)
+
+    def _claim_slot(self) -> None:
+        if fcntl is None:
+            self.slot = 0
+        else:
+            for slot in range(MAX_SLOT + 1):
+                path = os.path.join(self.slot_dir, f"lucid-post-id-{self.node_id}-{slot}.lock")
+                slot_file = open(path, "a")
+                try:
+                    fcntl.flock(slot_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    slot_file.close()
+                    continue
+                self._slot_file = slot_file
+                self.slot = slot
+                break
+            else:
+                raise RuntimeError(f"All {MAX_SLOT + 1} post ID worker slots of node {self.node_id} are taken")
+        self._worker_bits = ((self.node_id << SLOT_BITS) | self.slot) << WORKER_SHIFT
+
+    def _release_slot(self) -> None:
+        self._slot_file = None
+        self.slot = None
+        self._worker_bits = None
+        self._lock = threading.Lock()
+
+    @property
+    def worker_id(self) -> int:
+        """
+        The 10-bit worker ID embedded in the IDs of this process.
+        """
+        with self._lock:
+            if self._worker_bits is None:
+                self._claim_slot()
+            return self._worker_bits >> WORKER_SHIFT
+
+    def _reserve(self, count: int) -> int:
+        # Reserve `count` consecutive sequence numbers in one millisecond and return the first
+        # ID; the caller holds the lock
+        if self._worker_bits is None:
+            self._claim_slot()
+        now = time_ns() // 1_000_000 - self.epoch_ms
+        if now > self._last_ms:
+            self._last_ms = now
+            self._sequence = -1
+        if self._sequence + count > MAX_SEQUENCE:
+            self._last_ms += 1
+            self._sequence = -1
+        first = self._sequence + 1
+        self._sequence += count
+        return (self._last_ms << TIMESTAMP_SHIFT) | self._worker_bits | first
+
+    def next_id(self) -> int:
+        # The common case of _reserve(1), inlined: this is called once per created post
+        with self._lock:
+            now = time_ns() // 1_000_000 - self.epoch_ms
+            if now > self._last_ms:
+                self._last_ms = now
+                self._sequence = 0
+            elif self._sequence < MAX_SEQUENCE:
+                self._sequence += 1
+            else:
+                return self._reserve(1)
+            if self._worker_bits is None:
+                self._claim_slot()
+            return (self._last_ms << TIMESTAMP_SHIFT) | self._worker_bits | self._sequence
+
+    def next_ids(self, count: int) -> List[int]:
+        ids = []
+        with self._lock:
+            while count:
+                chunk = min(count, MAX_SEQUENCE + 1)
+                first = self._reserve(chunk)
+                ids.extend(range(first, first + chunk))
+                count -= chunk
+        return ids
+
+    def advance(self, last_id: int) -> None:
+        with self._lock:
+            last_ms = last_id >> TIMESTAMP_SHIFT
+            if last_ms >= self._last_ms:
+                # Continue in the following millisecond, whatever the worker ID of `last_id`
+                self._last_ms = last_ms
+                self._sequence = MAX_SEQUENCE
+
+
+# Available post ID generators, selected with POST_ID_GENERATOR
+ID_GENERATORS: Dict[str, Type[IdGenerator]] = {
+    "sequence": SequenceIdGenerator,
+    "snowflake": SnowflakeIdGenerator,
+}
+
+
+def create_id_generator(name: str) -> IdGenerator:
+    """
+    Create the configured post ID generator.
+
+    Args:
+        name (str): A key of `ID_GENERATORS`.
+
+    Returns:
+        IdGenerator: The generator.
+    """
+    if name == "snowflake":
+        return SnowflakeIdGenerator(settings.POST_ID_NODE_ID, settings.POST_ID_EPOCH_MS, settings.POST_ID_SLOT_DIR)
+    return ID_GENERATORS[name]()
+
+
+# Generator of the IDs of new posts, for the in-memory store and the database alike
+post_id_generator = create_id_generator(settings.POST_ID_GENERATOR)
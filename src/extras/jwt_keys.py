@@ -0,0 +1,145 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+from config import settings
+
+# Key ID of the key pair given by USER_RSA_PRIVATE_KEY / USER_RSA_PUBLIC_KEY; tokens without a
+# `kid` header were signed with it
+LEGACY_KID = "default"
+
+PRIVATE_SUFFIX = ".pem"
+PUBLIC_SUFFIX = ".pub.pem"
+
+
+def key_algorithm(key) -> str:
+    """
+    Get the JWT algorithm a key is used with.
+
+    Args:
+        key: A private or public key object of `cryptography`.
+
+    Returns:
+        str: "RS256", "ES256" or "EdDSA".
+
+    Raises:
+        ValueError: If the key type is not supported.
+    """
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return "RS256"
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)) and key.curve.name == "secp256r1":
+        return "ES256"
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return "EdDSA"
+    raise ValueError(f"Unsupported JWT key type: {type(key).__name__}")
+
+
+class JwtKey:
+    """
+    One key of the token key set: its ID, algorithm and parsed key objects.
+
+    `private_key` is None for keys that are only kept to verify tokens already handed out.
+    """
+    __slots__ = ("kid", "algorithm", "private_key", "public_key")
+
+    def __init__(self, kid: str, private_key=None, public_key=None):
+        self.kid = kid
+        self.private_key = private_key
+        self.public_key = public_key if public_key is not None else private_key.public_key()
+        self.algorithm = key_algorithm(self.public_key)
+
+
+class JwtKeySet:
+    """
+    The keys that sign and verify access tokens, parsed once at startup.
+
+    Keys are read from `JWT_KEY_DIR`: every `<kid>.pem` holds a private key, and every
+    `<kid>.pub.pem` holds a public key that is only used to verify tokens. The algorithm of a key
+    follows from its type (RSA: RS256, P-256: ES256, Ed25519: EdDSA). Tokens are signed with the
+    newest private key of `JWT_ALGORITHM`, the one whose key ID sorts last (so date-based IDs such
+    as `2024-06-01` work well), and carry its ID in the `kid` header. A token is verified with the
+    key its `kid` names, using that key's algorithm only.
+
+    To rotate, add a key with a later ID to every worker, then remove the old one once the
+    tokens it signed have expired. The RSA pair in `USER_RSA_PRIVATE_KEY` /
+    `USER_RSA_PUBLIC_KEY` is part of the set as key `default` and also verifies tokens without a
+    `kid`, issued before keys had IDs.
+    """
+
+    def __init__(self):
+        self.keys: Dict[str, JwtKey] = {}
+        self.signing_key: Optional[JwtKey] = None
+
+    def load(self, algorithm: str, directory: Optional[str] = None,
+             legacy_private_pem: Optional[str] = None, legacy_public_pem: Optional[str] = None) -> None:
+        """
+        Parse the keys and pick the signing key.
+
+        Args:
+            algorithm (str): The algorithm new tokens are signed with.
+            directory (Optional[str]): The directory of `<kid>.pem` and `<kid>.pub.pem` files.
+            legacy_private_pem (Optional[str]): PEM of the `default` private key.
+            legacy_public_pem (Optional[str]): PEM of the `default` public key.
+
+        Raises:
+            ValueError: If a key cannot be parsed or no private key of `algorithm` is available.
+        """
+        keys: Dict[str, JwtKey] = {}
+        if legacy_private_pem or legacy_public_pem:
+            keys[LEGACY_KID] = JwtKey(
+                LEGACY_KID,
+                private_key=(serialization.load_pem_private_key(legacy_private_pem.encode(), password=None)
+                             if legacy_private_pem else None),
+                public_key=(serialization.load_pem_public_key(legacy_public_pem.encode())
+                            if legacy_public_pem else None),
+            )
+        if directory:
+            for path in sorted(Path(directory).glob(f"*{PRIVATE_SUFFIX}")):
+                if path.name.endswith(PUBLIC_SUFFIX):
+                    kid = path.name[:-len(PUBLIC_SUFFIX)]
+                    keys.setdefault(kid, JwtKey(kid, public_key=serialization.load_pem_public_key(path.read_bytes())))
+                else:
+                    kid = path.name[:-len(PRIVATE_SUFFIX)]
+                    keys[kid] = JwtKey(kid, private_key=serialization.load_pem_private_key(path.read_bytes(), None))
+        candidates = sorted(
+            (key for key in keys.values() if key.private_key is not None and key.algorithm == algorithm),
+            # The legacy key only signs when no key from the directory can
+            key=lambda key: (key.kid != LEGACY_KID, key.kid),
+        )
+        if not candidates:
+            raise ValueError(f"No private key for JWT_ALGORITHM {algorithm}")
+        self.keys = keys
+        self.signing_key = candidates[-1]
+
+    def get(self, kid: Optional[str]) -> Optional[JwtKey]:
+        """
+        Find the key a token was signed with.
+
+        Args:
+            kid (Optional[str]): The `kid` header of the token, None for tokens issued without one.
+
+        Returns:
+            Optional[JwtKey]: The key, or None if it is not in the set.
+        """
+        return self.keys.get(LEGACY_KID if kid is None else kid)
+
+    def describe(self) -> List[dict]:
+        """
+        List the keys without their key material.
+
+        Returns:
+            List[dict]: The ID, algorithm and role of every key.
+        """
+        return [
+            {"kid": key.kid, "algorithm": key.algorithm,
+             "signing": key is self.signing_key, "verify_only": key.private_key is None}
+            for key in self.keys.values()
+        ]
+
+
+# Keys of the access tokens
+jwt_keys = JwtKeySet()
+jwt_keys.load(settings.JWT_ALGORITHM, settings.JWT_KEY_DIR,
+              settings.USER_RSA_PRIVATE_KEY, settings.USER_RSA_PUBLIC_KEY)
@@ -0,0 +1,137 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional, Tuple, TypeVar
+
+import bcrypt
+
+from config import settings
+from exceptions import HashingQueueFull
+
+T = TypeVar("T")
+
+
+def _timed(fn: Callable[..., T], *args) -> Tuple[T, float]:
+    # Runs in the worker; returns the result with its own execution time, so the queue wait
+    # can be derived without comparing clocks across processes
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def hash_password(password: bytes) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt())
+
+
+def check_password(password: bytes, hashed_password: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed_password)
+
+
+class PasswordHashingPool:
+    """
+    Bounded executor for bcrypt, so password hashing and checking never run on the event loop.
+
+    A bcrypt call takes a few hundred milliseconds of CPU, during which a synchronous call
+    would stall every other request of the worker. Calls run on `PASSWORD_HASH_WORKERS` threads
+    (bcrypt releases the GIL) or processes, as set by `PASSWORD_HASH_EXECUTOR`. At most
+    `PASSWORD_HASH_MAX_QUEUE` further calls wait for a free worker; when the queue is full,
+    new calls fail right away with `HashingQueueFull` (503) instead of piling up behind it.
+    """
+
+    def __init__(self):
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.total_queue_wait_seconds = 0.0
+        self.max_queue_wait_seconds = 0.0
+        self.total_execution_seconds = 0.0
+        self.last_execution_seconds = 0.0
+
+    @property
+    def capacity(self) -> int:
+        """
+        Calls admitted at once: running on a worker or waiting for one.
+        """
+        return settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if settings.PASSWORD_HASH_EXECUTOR == "process":
+                self._executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS,
+                                                    thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def run(self, fn: Callable[..., T], *args) -> T:
+        """
+        Run a hashing function on the pool.
+
+        Args:
+            fn (Callable[..., T]): A module-level function, so that it can be sent to a process.
+            *args: Its arguments.
+
+        Returns:
+            T: The result of `fn`.
+
+        Raises:
+            HashingQueueFull: If every worker is busy and the wait queue is full.
+        """
+        if self._in_flight >= self.capacity:
+            self.rejected += 1
+            raise HashingQueueFull
+        self._in_flight += 1
+        self.submitted += 1
+        started = time.perf_counter()
+        try:
+            result, execution = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), _timed, fn, *args
+            )
+        finally:
+            self._in_flight -= 1
+        queue_wait = max(time.perf_counter() - started - execution, 0.0)
+        self.completed += 1
+        self.total_queue_wait_seconds += queue_wait
+        self.max_queue_wait_seconds = max(self.max_queue_wait_seconds, queue_wait)
+        self.total_execution_seconds += execution
+        self.last_execution_seconds = execution
+        return result
+
+    def shutdown(self) -> None:
+        """
+        Stop the workers once the calls in progress are done.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        """
+        Get the pool gauges and counters.
+
+        Returns:
+            dict: Pool size, calls in flight, rejections, and queue-wait and execution times.
+        """
+        return {
+            "executor": settings.PASSWORD_HASH_EXECUTOR,
+            "workers": settings.PASSWORD_HASH_WORKERS,
+            "max_queue": settings.PASSWORD_HASH_MAX_QUEUE,
+            "in_flight": self._in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "average_queue_wait_seconds": (
+                round(self.total_queue_wait_seconds / self.completed, 6) if self.completed else 0.0
+            ),
+            "max_queue_wait_seconds": round(self.max_queue_wait_seconds, 6),
+            "average_execution_seconds": (
+                round(self.total_execution_seconds / self.completed, 6) if self.completed else 0.0
+            ),
+            "last_execution_seconds": round(self.last_execution_seconds, 6),
+        }
+
+
+# Executor of every bcrypt call
+password_hashing_pool = PasswordHashingPool()
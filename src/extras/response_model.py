@@ -1,13 +1,128 @@
-import json
+import orjson
 from pydantic import typing
 from fastapi.responses import JSONResponse
 
+# Keys that a trailing list item may carry to be lifted into the response envelope
+ENVELOPE_META_KEYS = frozenset({"count", "next_cursor"})
+
+# Options of every orjson call; non-str keys are accepted as json.dumps did
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+# Media type of streamed listings: one JSON value per line, no envelope
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# The envelope of a successful response up to its result, and what closes it
+ENVELOPE_HEAD = b'{"status_code":200,"message":"ok",'
+RESULT_KEY = b'"result":'
+ENVELOPE_TAIL = b'}'
+
+
+class EncodedJSON(bytes):
+    """
+    A result that is already JSON, spliced into the envelope as is instead of being encoded again.
+
+    Endpoints that keep serialized results around (e.g. cached pages) return them wrapped in
+    this type.
+    """
+
+
+def is_envelope_meta(item: typing.Any) -> bool:
+    """
+    Check whether a list item is envelope metadata rather than a result item.
+
+    Endpoints return pagination details (e.g. `{"count": 10}` or `{"next_cursor": 42}`) as the
+    last item of their result list; such items are moved into the response envelope.
+
+    Args:
+        item (typing.Any): The list item to check.
+
+    Returns:
+        bool: True if the item only holds envelope metadata keys.
+    """
+    return isinstance(item, dict) and len(item) != 0 and item.keys() <= ENVELOPE_META_KEYS
+
+
+def render_envelope(result: bytes, meta: typing.Optional[dict] = None) -> bytes:
+    """
+    Wrap an encoded result in the success envelope.
+
+    Args:
+        result (bytes): The JSON of the result, or any slice of a buffer holding it.
+        meta (Optional[dict]): Envelope fields placed before `result`, e.g. `{"next_cursor": 42}`.
+
+    Returns:
+        bytes: `{"status_code":200,"message":"ok",<meta>,"result":<result>}`.
+    """
+    if not meta:
+        return b"".join((ENVELOPE_HEAD, RESULT_KEY, result, ENVELOPE_TAIL))
+    # The fields of the encoded meta dict, without its braces
+    fields = orjson.dumps(meta, option=ORJSON_OPTIONS)[1:-1]
+    return b"".join((ENVELOPE_HEAD, fields, b",", RESULT_KEY, result, ENVELOPE_TAIL))
+
+
+def render_list_with_meta(content: list) -> bytes:
+    """
+    Render a list whose last item is envelope metadata, without copying or changing the list.
+
+    The whole list is encoded once and the encoded meta item is cut off the end of the output.
+
+    Args:
+        content (list): The result items followed by the meta item.
+
+    Returns:
+        bytes: The envelope with the meta fields and the other items as `result`.
+    """
+    meta = content[-1]
+    encoded = orjson.dumps(content, option=ORJSON_OPTIONS)
+    encoded_meta = orjson.dumps(meta, option=ORJSON_OPTIONS)
+    # The list ends with `,<meta>]`, or is `[<meta>]` when the meta item is its only item
+    cut = len(encoded) - len(encoded_meta) - 1 - (len(content) > 1)
+    return b"".join((
+        ENVELOPE_HEAD, encoded_meta[1:-1], b",", RESULT_KEY,
+        memoryview(encoded)[:cut], b"]", ENVELOPE_TAIL,
+    ))
+
+
+def wants_ndjson(accept: typing.Optional[str]) -> bool:
+    """
+    Check whether the Accept header of a request asks for newline-delimited JSON.
+
+    Args:
+        accept (Optional[str]): The Accept header, None if missing.
+
+    Returns:
+        bool: True if `application/x-ndjson` is one of the accepted media types.
+    """
+    return accept is not None and NDJSON_MEDIA_TYPE in accept
+
+
+async def ndjson_stream(chunks: typing.AsyncIterator[typing.Iterable[typing.Any]]) -> typing.AsyncIterator[bytes]:
+    """
+    Encode chunks of items as newline-delimited JSON, one output chunk per input chunk.
+
+    Meant as the body of a `StreamingResponse`: each chunk is written out before the next one
+    is produced, so memory holds one chunk whatever the number of items.
+
+    Args:
+        chunks (typing.AsyncIterator[typing.Iterable[typing.Any]]): The items, in chunks.
+
+    Yields:
+        bytes: Every item of a chunk encoded on its own line.
+    """
+    async for items in chunks:
+        lines = [orjson.dumps(item, option=ORJSON_OPTIONS) for item in items]
+        lines.append(b"")
+        yield b"\n".join(lines)
+
+
 class CustomJSONResponse(JSONResponse):
     """
     Custom JSON response class that standardizes the response format.
 
     Inherits from FastAPI's JSONResponse and modifies the render method to ensure
-    the response content follows a consistent structure.
+    the response content follows a consistent structure. Content is encoded with orjson and
+    written straight into a constant envelope, so the envelope dict is never built and results
+    that are already encoded (`EncodedJSON`) are not encoded again.
     """
     media_type = "application/json"
 
@@ -24,51 +139,16 @@ class CustomJSONResponse(JSONResponse):
         if content is None:
             return bytes()
 
-        if isinstance(content, dict):
-            # Ensure the dictionary includes 'status_code' and 'result' keys
-            if "status_code" not in content or "result" not in content:
-                content = {
-                    'status_code': 200,
-                    'message': 'ok',
-                    'result': content,
-                }
-        elif isinstance(content, str):
-            # Ensure the string content is wrapped in a dictionary with 'status_code' and 'result' keys
-            content = {
-                'status_code': 200,
-                'message': 'ok',
-                'result': content,
-            }
-        elif isinstance(content, list):
-            if len(content) != 0 and isinstance(content[0], int):
-                # List of integers, wrap in dictionary with 'status_code' and 'result' keys
-                content = {
-                    'status_code': 200,
-                    'message': 'ok',
-                    'result': content
-                }
-            elif len(content) != 0 and "count" in content[-1]:
-                # List of items with a 'count' key in the last item, extract count and wrap in dictionary
-                count = content[-1]['count']
-                content.remove(content[-1])
-                content = {
-                    'status_code': 200,
-                    'message': 'ok',
-                    "count": count,
-                    'result': content
-                }
-            else:
-                # General list, wrap in dictionary with 'status_code' and 'result' keys
-                content = {
-                    'status_code': 200,
-                    'message': 'ok',
-                    'result': content
-                }
-        else:
-            # General case for other types, wrap in dictionary with 'status_code' and 'result' keys
-            content = {
-                'status_code': 200,
-                'message': 'ok',
-                'result': content,
-            }
-        return json.dumps(content).encode('utf-8')
+        if isinstance(content, EncodedJSON):
+            # Already encoded, splice it in as is
+            return render_envelope(content)
+        if isinstance(content, dict) and "status_code" in content and "result" in content:
+            # Already an envelope
+            return orjson.dumps(content, option=ORJSON_OPTIONS)
+        if (isinstance(content, list) and len(content) != 0
+                and not isinstance(content[0], int) and is_envelope_meta(content[-1])):
+            # List of items with pagination details ('count', 'next_cursor') in the last item,
+            # lift them into the envelope
+            return render_list_with_meta(content)
+        # Any other dict, string, list or value is the result
+        return render_envelope(orjson.dumps(content, option=ORJSON_OPTIONS))
@@ -1,15 +1,98 @@
+import hashlib
 import logging
-import bcrypt
+import secrets
+import time
+import uuid
+from typing import Optional
+
 from datetime import datetime, timedelta
 import jwt
+from cachetools import TLRUCache
 
 from config import settings
+from extras.jwt_keys import jwt_keys
+from extras.password_hashing import check_password, hash_password, password_hashing_pool
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
-# Algorithm used for JWT encoding and decoding
-ALGORITHM = "RS256"
+
+class VerifiedTokenCache:
+    """
+    Bounded cache of the payloads of tokens whose signature was already verified.
+
+    Entries are keyed by the SHA-256 digest of the token, so the cache never holds usable
+    credentials, and expire at the token's `exp` or after `TOKEN_CACHE_TTL` seconds,
+    whichever comes first. A hit therefore never accepts a token that `jwt.decode` would
+    reject as expired. When the cache is full the least recently used entry is dropped.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.ttl = ttl
+        self._entries = TLRUCache(maxsize=maxsize, ttu=self._expires_at, timer=time.time)
+        self.hits = 0
+        self.misses = 0
+
+    def _expires_at(self, key: bytes, payload: dict, now: float) -> float:
+        return min(payload.get("exp", now + self.ttl), now + self.ttl)
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """
+        Look up the payload of a verified token.
+
+        Args:
+            token (str): The encoded JWT.
+
+        Returns:
+            Optional[dict]: The payload, or None if the token was not verified recently.
+        """
+        payload = self._entries.get(self._key(token))
+        if payload is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return payload
+
+    def set(self, token: str, payload: dict) -> None:
+        """
+        Remember the payload of a token that passed verification.
+
+        Args:
+            token (str): The encoded JWT.
+            payload (dict): Its decoded payload.
+        """
+        self._entries[self._key(token)] = payload
+
+    def clear(self) -> None:
+        """
+        Forget every verified token.
+        """
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Get the cache counters.
+
+        Returns:
+            dict: Size, hit and miss counters.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "tokens": len(self._entries),
+            "maxsize": self._entries.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+# Payloads of recently verified access tokens
+verified_token_cache = VerifiedTokenCache(maxsize=settings.TOKEN_CACHE_MAXSIZE, ttl=settings.TOKEN_CACHE_TTL)
 
 
 async def create_token(user, expires_delta: timedelta = None) -> str:
@@ -28,15 +111,83 @@ async def create_token(user, expires_delta: timedelta = None) -> str:
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
 
-    to_encode = {"exp": expire, "user_id": user.id}
+    # The jti names the token in the revocation denylist
+    to_encode = {"exp": expire, "user_id": user.id, "jti": uuid.uuid4().hex}
+    # Sign with the newest key of JWT_ALGORITHM, named in the header so any worker can verify it
+    signing_key = jwt_keys.signing_key
     encoded_jwt = jwt.encode(
         to_encode,
-        settings.USER_RSA_PRIVATE_KEY,  # Sign with RSA private key
-        algorithm=ALGORITHM,
+        signing_key.private_key,
+        algorithm=signing_key.algorithm,
+        headers={"kid": signing_key.kid},
     )
     return encoded_jwt
 
 
+async def create_refreshable_token(user) -> str:
+    """
+    Create a short-lived JWT token for a user who also holds a refresh token to renew it.
+
+    Args:
+        user: The user object containing user details.
+
+    Returns:
+        str: The encoded JWT token, valid for settings.REFRESHABLE_TOKEN_EXPIRE_MINUTES.
+    """
+    return await create_token(user, timedelta(minutes=settings.REFRESHABLE_TOKEN_EXPIRE_MINUTES))
+
+
+def create_refresh_token() -> str:
+    """
+    Create an opaque refresh token.
+
+    Returns:
+        str: 256 random bits, URL-safe base64 encoded.
+    """
+    return secrets.token_urlsafe(32)
+
+
+def hash_refresh_token(token: str) -> str:
+    """
+    Get the digest a refresh token is stored and looked up by.
+
+    A fast hash is enough: the token is random and long, so unlike a password it cannot be
+    guessed from its digest.
+
+    Args:
+        token (str): The refresh token.
+
+    Returns:
+        str: The hex SHA-256 digest of the token.
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def decode_token(token: str) -> dict:
+    """
+    Verify a JWT and get its payload, skipping the signature check for recently verified tokens.
+
+    The token is checked with the key its `kid` header names, and only with that key's algorithm.
+
+    Args:
+        token (str): The encoded JWT.
+
+    Returns:
+        dict: The payload of the token.
+
+    Raises:
+        jwt.InvalidTokenError: If the key is unknown, the signature is invalid or the token expired.
+    """
+    payload = verified_token_cache.get(token)
+    if payload is None:
+        key = jwt_keys.get(jwt.get_unverified_header(token).get("kid"))
+        if key is None:
+            raise jwt.InvalidTokenError("Token signed with an unknown key")
+        payload = jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+        verified_token_cache.set(token, payload)
+    return payload
+
+
 async def verify_token(token: str) -> dict:
     """
     Verify a JWT token.
@@ -48,8 +199,7 @@ async def verify_token(token: str) -> dict:
         dict: A dictionary containing verification status and user data if verified.
     """
     try:
-        key = settings.USER_RSA_PUBLIC_KEY
-        payload = jwt.decode(token, key, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         return dict(verified=True, user_data=payload)
     except Exception as e:
         logger.info(e)
@@ -58,7 +208,7 @@ async def verify_token(token: str) -> dict:
 
 async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
-    Verify a plain password against a hashed password.
+    Verify a plain password against a hashed password on the password hashing pool.
 
     Args:
         plain_password (str): The plain text password to verify.
@@ -66,20 +216,27 @@ async def verify_password(plain_password: str, hashed_password: str) -> bool:
 
     Returns:
         bool: True if the password matches, False otherwise.
+
+    Raises:
+        HashingQueueFull: If the password hashing pool is saturated.
     """
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return await password_hashing_pool.run(
+        check_password, plain_password.encode('utf-8'), hashed_password.encode('utf-8')
+    )
 
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """
-    Hash a plain password.
+    Hash a plain password on the password hashing pool.
 
     Args:
         password (str): The plain text password to hash.
 
     Returns:
         str: The hashed password.
+
+    Raises:
+        HashingQueueFull: If the password hashing pool is saturated.
     """
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
+    hashed_password = await password_hashing_pool.run(hash_password, password.encode('utf-8'))
     return hashed_password.decode('utf-8')
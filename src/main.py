@@ -1,6 +1,18 @@
+import logging
 from contextlib import asynccontextmanager
 from api.api_router import api_router
 from config import settings
+from crud.in_memory import (
+    start_persistence,
+    stop_persistence,
+    start_shared_store,
+    stop_shared_store,
+    start_residency,
+    stop_residency,
+    start_write_behind,
+    stop_write_behind
+)
+from crud.token_revocation import token_revocation
 from db.session import AsyncDBSingleton
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
@@ -9,8 +21,13 @@ from exceptions.base_exception import (
     get_validation_exception_handlers,
     get_request_validation_exception_handlers
 )
+from extras.compression import CompressionMiddleware
+from extras.password_hashing import password_hashing_pool
 from extras.response_model import CustomJSONResponse
 
+# Set up logging
+logger = logging.getLogger(__name__)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -22,7 +39,43 @@ async def lifespan(app: FastAPI):
     Args:
         app (FastAPI): The FastAPI application instance.
     """
+    try:
+        # Open pooled connections up front so the first requests don't pay for the handshake
+        await AsyncDBSingleton.warm_up()
+    except Exception as e:
+        logger.warning("Database pool warm-up failed: %s", e)
+    # Load the revoked access tokens and keep them in sync with the other workers
+    await token_revocation.start()
+    if settings.STORE_SHARED_PATH:
+        # Share the posts with the other workers on this host; the arena replaces the journal
+        start_shared_store(settings.STORE_SHARED_PATH, settings.STORE_SHARED_SIZE)
+    elif settings.STORE_DATA_DIR:
+        # Restore the in-memory posts from the newest snapshot and the operation log
+        await start_persistence(settings.STORE_DATA_DIR)
+    if settings.WRITE_BEHIND_ENABLED:
+        # Copy posts written to memory into the database in the background
+        try:
+            await start_write_behind()
+        except Exception as e:
+            # The journal keeps its logs, so the next start queues the posts written until then
+            logger.error("Post write-behind could not start, posts stay in memory only: %s", e)
+        else:
+            if settings.STORE_SHARED_PATH:
+                if settings.STORE_MEMORY_BUDGET is not None:
+                    logger.warning("STORE_MEMORY_BUDGET is ignored with STORE_SHARED_PATH")
+            else:
+                # The database now has every post, so users can be evicted and reloaded from it
+                start_residency(settings.STORE_MEMORY_BUDGET)
     yield
+    await token_revocation.stop()
+    stop_residency()
+    password_hashing_pool.shutdown()
+    # Flush the queued post changes before the database engine goes away
+    await stop_write_behind()
+    if settings.STORE_SHARED_PATH:
+        stop_shared_store()
+    elif settings.STORE_DATA_DIR:
+        await stop_persistence()
     await AsyncDBSingleton.close()
 
 # Initialize FastAPI app with custom lifespan and response class
@@ -43,6 +96,10 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],  # Allow all headers
     )
 
+# Compress response bodies with the coding the client accepts
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
 # Include the API router
 app.include_router(api_router)
 
@@ -2,3 +2,5 @@ from .base import Base
 
 from .user import User
 from .post import Post
+from .refresh_token import RefreshToken
+from .revoked_token import RevokedToken
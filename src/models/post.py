@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text
+from sqlalchemy import BigInteger, Column, Integer, String, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship, Mapped
 from .base import Base
 
@@ -14,8 +14,13 @@ class Post(Base):
         user (relationship): Relationship to the User model.
     """
     __tablename__ = 'posts'  # Define a table name for clarity
+    __table_args__ = (
+        # Supports keyset pagination: WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?
+        Index('ix_posts_user_id_id', 'user_id', 'id'),
+    )
 
-    id: Mapped[int] = Column(Integer, primary_key=True, autoincrement=True)  # Primary key
+    # Primary key, from extras.id_generator (53-bit Snowflake IDs); SQLite only auto-increments INTEGER keys
+    id: Mapped[int] = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
     title: Mapped[str] = Column(String(255), nullable=False)  # Title of the post
     content: Mapped[str] = Column(Text, nullable=False)  # Content of the post
     user_id: Mapped[int] = Column(Integer, ForeignKey('users.id'), nullable=False)  # Foreign key to user
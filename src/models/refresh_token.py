@@ -0,0 +1,30 @@
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.orm import Mapped
+
+from models.base import Base
+
+
+class RefreshToken(Base):
+    """
+    SQLAlchemy model for the 'refresh_tokens' table.
+
+    Only the SHA-256 digest of a refresh token is stored, so a leaked table cannot be used to
+    sign in. Every refresh revokes the token it was given and issues a new one of the same
+    family; a family descends from a single login or registration.
+
+    Attributes:
+        id (int): Primary key for the table.
+        user_id (int): Foreign key to the user the token was issued to.
+        token_hash (str): Hex SHA-256 digest of the token.
+        family (str): Identifier shared by the tokens rotated from the same login.
+        expires_at (datetime): When the token stops being accepted.
+        revoked (bool): Whether the token was already used or revoked.
+    """
+    __tablename__ = 'refresh_tokens'
+
+    id: Mapped[int] = Column(Integer, primary_key=True)
+    user_id: Mapped[int] = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    token_hash: Mapped[str] = Column(String(64), nullable=False, unique=True)  # Looked up on every refresh
+    family: Mapped[str] = Column(String(32), nullable=False, index=True)
+    expires_at = Column(DateTime(), nullable=False)
+    revoked: Mapped[bool] = Column(Boolean, nullable=False, default=False)
@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.orm import Mapped
+
+from models.base import Base
+
+
+class RevokedToken(Base):
+    """
+    SQLAlchemy model for the 'revoked_tokens' table.
+
+    The denylist of access tokens revoked before they expire, by their `jti` claim. A row is
+    only needed until the token's own expiry and is pruned after it.
+
+    Attributes:
+        id (int): Primary key for the table; workers pick up revocations past the last ID they saw.
+        jti (str): The `jti` claim of the revoked token.
+        user_id (int): Foreign key to the user the token was issued to.
+        expires_at (datetime): The expiry of the token, after which the row can be deleted.
+    """
+    __tablename__ = 'revoked_tokens'
+
+    id: Mapped[int] = Column(Integer, primary_key=True)
+    jti: Mapped[str] = Column(String(32), nullable=False, unique=True)  # Looked up on Bloom filter hits
+    user_id: Mapped[int] = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    expires_at = Column(DateTime(), nullable=False, index=True)
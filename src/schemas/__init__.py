@@ -1,2 +1,2 @@
-from .user import UserSchema, UserInSchema, RegisterOut, UserUpdate, LoginSchema
+from .user import UserSchema, UserInSchema, RegisterOut, UserUpdate, LoginSchema, RefreshSchema, LogoutSchema
 from .post import PostIn, PostOut , PostUpdate
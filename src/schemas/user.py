@@ -1,4 +1,6 @@
 import re
+from typing import Optional
+
 from pydantic import EmailStr, Field, BaseModel, model_validator
 
 from schemas.base import BaseSchema
@@ -71,8 +73,10 @@ class RegisterOut(BaseModel):
 
     Attributes:
         token (str): The JWT token generated for the user.
+        refresh_token (str): The refresh token to get new JWT tokens with.
     """
     token: str
+    refresh_token: str
 
 
 class UserUpdate(BaseModel):
@@ -94,3 +98,23 @@ class LoginSchema(BaseModel):
     """
     email: EmailStr
     password: str
+
+
+class RefreshSchema(BaseModel):
+    """
+    Pydantic model for refresh input.
+
+    Attributes:
+        refresh_token (str): The refresh token returned by the last login or refresh.
+    """
+    refresh_token: str
+
+
+class LogoutSchema(BaseModel):
+    """
+    Pydantic model for logout input.
+
+    Attributes:
+        refresh_token (Optional[str]): A refresh token of the session, revoked along with the access token.
+    """
+    refresh_token: Optional[str] = None
@@ -1,7 +1,12 @@
+import time
+
+import jwt
 import pytest
 from fastapi import FastAPI
 from httpx import AsyncClient
 
+from config import settings
+
 
 class TestAuth:
     @pytest.mark.asyncio
@@ -40,3 +45,51 @@ class TestAuth:
 
         assert response.status_code == 200
         assert "token" in response.json()['result']
+
+    @pytest.mark.asyncio
+    async def test_refresh_rotates_refresh_token(
+            self,
+            async_client: AsyncClient,
+            app: FastAPI
+    ):
+        response = await async_client.post(app.url_path_for("auth:login"),
+                                           json={"email": "admin@admin.com", "password": "Atabak1234"})
+        refresh_token = response.json()['result']['refresh_token']
+
+        response = await async_client.post(app.url_path_for("auth:refresh"), json={"refresh_token": refresh_token})
+        assert response.status_code == 200
+        assert "token" in response.json()['result']
+        rotated = response.json()['result']['refresh_token']
+        assert rotated != refresh_token
+        # Refreshed access tokens are short-lived
+        payload = jwt.decode(response.json()['result']['token'], options={"verify_signature": False})
+        lifetime = payload["exp"] - time.time()
+        assert 0 < lifetime <= settings.REFRESHABLE_TOKEN_EXPIRE_MINUTES * 60
+        assert settings.REFRESHABLE_TOKEN_EXPIRE_MINUTES < settings.ACCESS_TOKEN_EXPIRE_MINUTES
+
+        # A refresh token works once; reusing it revokes the tokens rotated from it as well
+        response = await async_client.post(app.url_path_for("auth:refresh"), json={"refresh_token": refresh_token})
+        assert response.status_code == 401
+        response = await async_client.post(app.url_path_for("auth:refresh"), json={"refresh_token": rotated})
+        assert response.status_code == 401
+
+    @pytest.mark.asyncio
+    async def test_logout_revokes_token(
+            self,
+            async_client: AsyncClient,
+            app: FastAPI
+    ):
+        response = await async_client.post(app.url_path_for("auth:login"),
+                                           json={"email": "admin@admin.com", "password": "Atabak1234"})
+        result = response.json()['result']
+        headers = {"Authorization": f"Bearer {result['token']}"}
+
+        response = await async_client.post(app.url_path_for("auth:logout"), headers=headers,
+                                           json={"refresh_token": result['refresh_token']})
+        assert response.status_code == 200
+
+        response = await async_client.post(app.url_path_for("auth:logout"), headers=headers)
+        assert response.status_code == 401
+        response = await async_client.post(app.url_path_for("auth:refresh"),
+                                           json={"refresh_token": result['refresh_token']})
+        assert response.status_code == 401
@@ -0,0 +1,40 @@
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from config import settings
+
+
+class TestMetrics:
+    @pytest.mark.asyncio
+    async def test_metrics_are_off_without_a_token(
+            self,
+            async_client: AsyncClient,
+            app: FastAPI,
+            monkeypatch
+    ):
+        monkeypatch.setattr(settings, "METRICS_TOKEN", None)
+
+        response = await async_client.get(app.url_path_for("metrics:all"))
+
+        assert response.status_code == 404
+
+    @pytest.mark.asyncio
+    async def test_metrics_require_the_token(
+            self,
+            async_client: AsyncClient,
+            app: FastAPI,
+            monkeypatch
+    ):
+        monkeypatch.setattr(settings, "METRICS_TOKEN", "metrics-secret")
+
+        response = await async_client.get(app.url_path_for("metrics:all"))
+        assert response.status_code == 401
+        response = await async_client.get(app.url_path_for("metrics:all"),
+                                          headers={"Authorization": "Bearer wrong-secret"})
+        assert response.status_code == 401
+
+        response = await async_client.get(app.url_path_for("metrics:all"),
+                                          headers={"Authorization": "Bearer metrics-secret"})
+        assert response.status_code == 200
+        assert "db_pool" in response.json()['result']
@@ -0,0 +1,220 @@
+import json
+
+import pytest
+import pytest_asyncio
+from httpx import AsyncClient
+
+from config import settings
+
+USER = {"email": "poster@admin.com", "password": "Poster1234", "re_password": "Poster1234"}
+
+
+@pytest_asyncio.fixture
+async def auth_headers(async_client: AsyncClient) -> dict:
+    response = await async_client.post("/user/register/", json=USER)
+    if response.status_code != 201:
+        response = await async_client.post("/user/login/",
+                                           json={"email": USER["email"], "password": USER["password"]})
+    return {"Authorization": f"Bearer {response.json()['result']['token']}"}
+
+
+class TestPost:
+    @pytest.mark.asyncio
+    async def test_get_posts_paginates_with_cursor(
+            self,
+            async_client: AsyncClient,
+            auth_headers: dict
+    ):
+        created = []
+        for i in range(5):
+            response = await async_client.post("/post/", json={"title": f"title {i}", "content": f"content {i}"},
+                                               headers=auth_headers)
+            assert response.status_code == 201
+            created.append(f"content {i}")
+
+        pages = []
+        cursor = None
+        while True:
+            params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+            response = await async_client.get("/post/", params=params, headers=auth_headers)
+            assert response.status_code == 200
+            body = response.json()
+            assert len(body["result"]) <= 2
+            pages.extend(body["result"])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+
+        assert pages[-5:] == created
+
+    @pytest.mark.asyncio
+    async def test_get_posts_streams_ndjson(
+            self,
+            async_client: AsyncClient,
+            auth_headers: dict
+    ):
+        for i in range(3):
+            await async_client.post("/post/", json={"title": f"title {i}", "content": f"streamed {i}"},
+                                    headers=auth_headers)
+        paged = (await async_client.get("/post/", params={"limit": 500}, headers=auth_headers)).json()["result"]
+
+        response = await async_client.get("/post/", headers={**auth_headers, "Accept": "application/x-ndjson"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert [json.loads(line) for line in response.text.splitlines()] == paged
+
+        response = await async_client.get("/post/", params={"stream": "true"}, headers=auth_headers)
+        assert response.text.splitlines()[-3:] == ['"streamed 0"', '"streamed 1"', '"streamed 2"']
+
+    @pytest.mark.asyncio
+    async def test_get_posts_answers_conditional_requests(
+            self,
+            async_client: AsyncClient,
+            auth_headers: dict
+    ):
+        response = await async_client.get("/post/", headers=auth_headers)
+        etag = response.headers["etag"]
+
+        response = await async_client.get("/post/", headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+        await async_client.post("/post/", json={"title": "new", "content": "changes the version"},
+                                headers=auth_headers)
+        response = await async_client.get("/post/", headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    @pytest.mark.asyncio
+    async def test_get_posts_serves_compressed_listing(
+            self,
+            async_client: AsyncClient,
+            auth_headers: dict
+    ):
+        await async_client.post("/post/bulk",
+                                json=[{"title": "long", "content": "compressible content " * 20}] * 5,
+                                headers=auth_headers)
+        plain = await async_client.get("/post/", headers={**auth_headers, "Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+
+        for _ in range(2):
+            response = await async_client.get("/post/", headers={**auth_headers, "Accept-Encoding": "gzip"})
+            assert response.headers["content-encoding"] == "gzip"
+            assert response.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+            assert response.content == plain.content
+
+        response = await async_client.get("/post/", headers={**auth_headers, "Accept-Encoding": "gzip",
+                                                             "If-None-Match": response.headers["etag"]})
+        assert response.status_code == 304
+
+    @pytest.mark.asyncio
+    async def test_post_changes_since_listing(
+            self,
+            async_client: AsyncClient,
+            auth_headers: dict
+    ):
+        response = await async_client.get("/post/", headers=auth_headers)
+        version = response.headers["x-posts-version"]
+
+        created = (await async_client.post("/post/", json={"title": "feed", "content": "kept"},
+                                           headers=auth_headers)).json()["result"]
+        removed = (await async_client.post("/post/", json={"title": "feed", "content": "removed"},
+                                           headers=auth_headers)).json()["result"]
+        await async_client.delete(f"/post/{removed}/", headers=auth_headers)
+
+        result = (await async_client.get("/post/changes", params={"since": version}, headers=auth_headers)).json()["result"]
+        assert result["resync"] is False
+        assert result["changes"] == [{"op": "create", "id": created, "title": "feed", "content": "kept"}]
+
+        result = (await async_client.get("/post/changes", params={"since": result["version"]},
+                                         headers=auth_headers)).json()["result"]
+        assert result["changes"] == []
+
+        result = (await async_client.get("/post/changes", params={"since": "unknown.1"},
+                                         headers=auth_headers)).json()["result"]
+        assert result["resync"] is True
+
+    @pytest.mark.asyncio
+    async def test_get_posts_rejects_oversized_limit(
+            self,
+            async_client: AsyncClient,
+            auth_headers: dict
+    ):
+        response = await async_client.get("/post/", params={"limit": 100000}, headers=auth_headers)
+
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_bulk_create_and_delete(
+            self,
+            async_client: AsyncClient,
+            auth_headers: dict
+    ):
+        response = await async_client.post("/post/bulk",
+                                           json=[{"title": "a", "content": "first"},
+                                                 {"title": "b", "content": "second"}],
+                                           headers=auth_headers)
+        assert response.status_code == 201
+        post_ids = response.json()["result"]
+        assert len(post_ids) == 2
+
+        response = await async_client.request("DELETE", "/post/bulk", json=[post_ids[0], 0],
+                                              headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["result"] == [{"id": post_ids[0], "status": "deleted"},
+                                             {"id": 0, "status": "not_found"}]
+
+    @pytest.mark.asyncio
+    async def test_bulk_delete_checks_the_payload_size(
+            self,
+            async_client: AsyncClient,
+            auth_headers: dict,
+            monkeypatch
+    ):
+        response = await async_client.post("/post/", json={"title": "kept", "content": "kept content"},
+                                           headers=auth_headers)
+        post_id = response.json()["result"]
+
+        with monkeypatch.context() as patch:
+            patch.setattr(settings, "PAYLOAD_MAX_SIZE", 0)
+            response = await async_client.request("DELETE", "/post/bulk", json=[post_id],
+                                                  headers=auth_headers)
+        assert response.status_code == 400
+
+        # Rejected before anything was deleted
+        response = await async_client.request("DELETE", "/post/bulk", json=[post_id],
+                                              headers=auth_headers)
+        assert response.json()["result"] == [{"id": post_id, "status": "deleted"}]
+
+    @pytest.mark.asyncio
+    async def test_bulk_create_validates_every_item(
+            self,
+            async_client: AsyncClient,
+            auth_headers: dict
+    ):
+        response = await async_client.post("/post/bulk",
+                                           json=[{"title": "a", "content": "ok"}, {"title": "missing content"}],
+                                           headers=auth_headers)
+
+        assert response.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_cached_listing_is_invalidated_by_writes(
+            self,
+            async_client: AsyncClient,
+            auth_headers: dict
+    ):
+        params = {"limit": 500}
+        before = (await async_client.get("/post/", params=params, headers=auth_headers)).json()["result"]
+        assert (await async_client.get("/post/", params=params, headers=auth_headers)).json()["result"] == before
+
+        response = await async_client.post("/post/", json={"title": "fresh", "content": "fresh content"},
+                                           headers=auth_headers)
+        post_id = response.json()["result"]
+        after_create = (await async_client.get("/post/", params=params, headers=auth_headers)).json()["result"]
+        assert after_create == before + ["fresh content"]
+
+        await async_client.delete(f"/post/{post_id}/", headers=auth_headers)
+        after_delete = (await async_client.get("/post/", params=params, headers=auth_headers)).json()["result"]
+        assert after_delete == before
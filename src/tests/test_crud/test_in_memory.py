@@ -0,0 +1,70 @@
+import pytest
+
+import crud.in_memory
+from config import settings
+from crud.in_memory import (
+    save_post,
+    start_persistence,
+    start_write_behind,
+    stop_persistence,
+    stop_write_behind
+)
+from crud.store_journal import store_journal
+from crud.write_behind import INSERT, post_write_behind
+
+
+class FakeSession:
+    async def rollback(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def database(monkeypatch):
+    # Reachable from the second start on
+    state = {"up": False, "post_ids": set()}
+
+    async def get_session():
+        if not state["up"]:
+            raise ConnectionError("database unavailable")
+        return FakeSession()
+
+    async def get_last_id(db) -> int:
+        return max(state["post_ids"], default=0)
+
+    async def write_behind_batch(db, rows, deleted_ids) -> None:
+        state["post_ids"].update(row["id"] for row in rows)
+        state["post_ids"].difference_update(deleted_ids)
+
+    monkeypatch.setattr(crud.in_memory.AsyncDBSingleton, "get_session", get_session)
+    monkeypatch.setattr(crud.in_memory.crud_post, "get_last_id", get_last_id)
+    monkeypatch.setattr(crud.in_memory.crud_post, "write_behind_batch", write_behind_batch)
+    monkeypatch.setattr(store_journal, "pending_since", None)
+    monkeypatch.setattr(settings, "WRITE_BEHIND_ENABLED", True)
+    monkeypatch.setattr(settings, "STORE_LOG_FSYNC", False)
+    return state
+
+
+class TestStartOrder:
+    @pytest.mark.asyncio
+    async def test_posts_written_without_write_behind_are_queued_on_the_next_start(self, tmp_path, database):
+        await start_persistence(str(tmp_path))
+        with pytest.raises(ConnectionError):
+            await start_write_behind()
+        post_id = save_post("1", "written while the database was down")
+        # Snapshots must not drop the only copy of the post outside memory
+        for _ in range(3):
+            await store_journal.snapshot()
+        await stop_persistence()
+
+        database["up"] = True
+        await start_persistence(str(tmp_path))
+        await start_write_behind()
+        # Queued before residency could evict the user and reload them from the database
+        assert post_write_behind.pending_changes(1)[post_id][0] == INSERT
+
+        await stop_write_behind()
+        await stop_persistence()
+        assert post_id in database["post_ids"]
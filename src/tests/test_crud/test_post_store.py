@@ -0,0 +1,81 @@
+import itertools
+import random
+import threading
+
+from crud.post_store import PostStore
+from extras.id_generator import SequenceIdGenerator
+
+THREADS = 8
+OPERATIONS = 3000
+USERS = 20
+
+
+class TestPostStore:
+    def test_concurrent_writes_and_reads_keep_the_store_consistent(self):
+        store = PostStore(shards=4)
+        generator = SequenceIdGenerator()
+        created = [[] for _ in range(THREADS)]
+        removed = [[] for _ in range(THREADS)]
+        errors = []
+        start = threading.Barrier(THREADS)
+
+        def worker(index: int) -> None:
+            rng = random.Random(index)
+            try:
+                start.wait()
+                for _ in range(OPERATIONS):
+                    user_id = rng.randrange(USERS)
+                    action = rng.random()
+                    if action < 0.6:
+                        post_id = store.create(user_id, "title", f"content {user_id}", generator.next_id)
+                        created[index].append((user_id, post_id))
+                    elif action < 0.8 and created[index]:
+                        user_id, post_id = created[index].pop(rng.randrange(len(created[index])))
+                        assert store.remove(user_id, post_id)
+                        removed[index].append(post_id)
+                    else:
+                        contents, cursor = store.page(user_id, limit=20)
+                        assert all(content == f"content {user_id}" for content in contents)
+            except Exception as e:  # surfaced in the main thread
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors
+
+        live = {post_id for user_id, post_id in itertools.chain.from_iterable(created)}
+        records = list(store.records())
+        assert len(records) == len(live) == len(store) == store.stats()["posts"]
+        assert {post_id for _, post_id, _, _ in records} == live
+        assert live.isdisjoint(itertools.chain.from_iterable(removed))
+
+        # Every user's posts are still in ID order, so cursor pagination walks all of them once
+        for user_id in store.user_ids():
+            seen, cursor = [], None
+            while True:
+                contents, cursor = store.page(user_id, limit=7, cursor=cursor)
+                seen.extend(contents)
+                if cursor is None:
+                    break
+            user_records = [post_id for owner, post_id, _, _ in records if owner == user_id]
+            assert user_records == sorted(user_records)
+            assert len(seen) == len(user_records)
+
+    def test_evict_drops_least_recently_used_users_first(self):
+        store = PostStore(shards=1)
+        generator = SequenceIdGenerator()
+        for user_id in range(10):
+            store.create(user_id, "title", "x" * 1000, generator.next_id)
+        # Reading user 0 makes it the most recently used; user 1 may not be evicted
+        store.page(0)
+        budget = store.nbytes() // 2
+        evicted = store.evict(budget, lambda user_id: user_id != 1)
+
+        assert evicted == [2, 3, 4, 5, 6]
+        assert store.nbytes() == store.stats()["bytes"] <= budget
+        assert store.resident(0) and store.resident(1) and not store.resident(2)
+        assert store.stats()["evictions"] == 5
+        assert store.page(2) == ([], None)
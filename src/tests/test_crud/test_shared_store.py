@@ -0,0 +1,177 @@
+import mmap
+from contextlib import contextmanager
+
+import pytest
+
+import crud.post_events
+import crud.shared_store
+from crud.post_store import PostStore
+from crud.shared_store import SharedPostArena, fcntl
+from exceptions import PostStoreFull
+from extras.cache import PostVersions
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="the shared store needs fcntl")
+
+CAPACITY = 4096
+
+
+@pytest.fixture
+def arenas(tmp_path):
+    path = str(tmp_path / "posts.arena")
+    opened = []
+    for _ in range(2):
+        arena = SharedPostArena()
+        arena.open(path, CAPACITY, PostStore(shards=2))
+        opened.append(arena)
+    yield opened
+    for arena in opened:
+        arena.close()
+
+
+class Worker:
+    """
+    An arena with the post versions of its own process.
+    """
+
+    def __init__(self, path: str, monkeypatch):
+        self.versions = PostVersions(maxsize=100)
+        self.monkeypatch = monkeypatch
+        self.arena = SharedPostArena()
+        with self.running():
+            self.arena.open(path, CAPACITY, PostStore(shards=2))
+
+    @contextmanager
+    def running(self):
+        with self.monkeypatch.context() as patch:
+            patch.setattr(crud.post_events, "post_versions", self.versions)
+            patch.setattr(crud.shared_store, "post_versions", self.versions)
+            yield self.arena
+
+    def etag(self, user_id: int) -> str:
+        with self.running() as arena:
+            arena.sync()
+        return self.versions.etag(user_id, self.versions.get(user_id), (50, None))
+
+
+class TornMap:
+    """
+    Map of the compacted arena whose first write stores half of its data and then fails.
+    """
+    open_map = mmap.mmap
+
+    def __init__(self, *args):
+        self.map = self.open_map(*args)
+
+    def __setitem__(self, key: slice, data) -> None:
+        self.map[key.start:key.start + len(data) // 2] = data[:len(data) // 2]
+        raise OSError(5, "Input/output error")
+
+    def close(self) -> None:
+        self.map.close()
+
+
+def fail_replace(src, dst):
+    raise OSError(5, "Input/output error")
+
+
+def records(arena: SharedPostArena) -> list:
+    arena.sync()
+    return sorted(arena.store.records())
+
+
+class TestSharedPostArena:
+    def test_writes_are_seen_by_every_worker(self, arenas):
+        first, second = arenas
+        kept = first.add(1, "title", "from the first worker")
+        removed = second.add(1, "title", "from the second worker")
+        assert first.remove(1, removed)
+        assert not second.remove(1, removed)
+
+        expected = [(1, kept, "title", "from the first worker")]
+        assert records(first) == records(second) == expected
+        assert second.stats()["remote_records_applied"] >= 2
+
+    def test_post_ids_are_unique_and_increasing_across_workers(self, arenas):
+        post_ids = [arenas[index % 2].add(index % 3, "title", "content") for index in range(50)]
+
+        assert post_ids == sorted(set(post_ids))
+        assert arenas[0].last_post_id() == arenas[1].last_post_id() == post_ids[-1]
+
+    def test_compaction_makes_the_other_worker_rebuild(self, arenas):
+        first, second = arenas
+        kept = first.add(1, "kept", "content")
+        post_ids = [kept]
+        # Fill the arena with posts that are deleted again, until it has to be compacted
+        while first.stats()["compactions"] == 0:
+            post_id = first.add(2, "churn", "x" * 100)
+            post_ids.append(post_id)
+            first.remove(2, post_id)
+        post_ids.append(second.add(1, "after", "compaction"))
+
+        assert first.stats()["generation"] == 2
+        assert second.stats()["rebuilds"] == 1
+        assert records(first) == records(second) == [
+            (1, kept, "kept", "content"), (1, post_ids[-1], "after", "compaction")]
+        assert post_ids == sorted(set(post_ids))
+
+    @pytest.mark.parametrize("target, failure", [
+        (crud.shared_store.mmap, ("mmap", TornMap)),
+        (crud.shared_store.os, ("replace", fail_replace)),
+    ], ids=["torn write", "failed move"])
+    def test_failed_compaction_leaves_a_usable_arena(self, arenas, tmp_path, monkeypatch, target, failure):
+        first, second = arenas
+        kept = first.add(1, "kept", "content")
+        used = first.stats()["used_bytes"]
+        with monkeypatch.context() as patch:
+            patch.setattr(target, *failure)
+            with pytest.raises(OSError):
+                while True:
+                    post_id = first.add(2, "churn", "x" * 100)
+                    first.remove(2, post_id)
+        expected = [(1, kept, "kept", "content")]
+        assert first.stats()["compactions"] == 0
+        assert first.stats()["used_bytes"] > used
+
+        # A worker started after the failure, as after a crash
+        reopened = SharedPostArena()
+        reopened.open(str(tmp_path / "posts.arena"), CAPACITY, PostStore(shards=2))
+        assert records(reopened) == records(second) == records(first) == expected
+
+        while second.stats()["compactions"] == 0:
+            post_id = second.add(2, "churn", "x" * 100)
+            second.remove(2, post_id)
+        after = second.add(1, "after", "compaction")
+        expected.append((1, after, "after", "compaction"))
+        assert records(reopened) == records(second) == records(first) == expected
+        reopened.close()
+
+    def test_full_arena_raises(self, arenas):
+        with pytest.raises(PostStoreFull):
+            while True:
+                arenas[0].add(1, "title", "x" * 500)
+
+    def test_workers_hand_out_the_same_etags(self, tmp_path, monkeypatch):
+        path = str(tmp_path / "posts.arena")
+        first = Worker(path, monkeypatch)
+        with first.running() as arena:
+            arena.add(1, "title", "content")
+            arena.add(2, "title", "content")
+        # Started after those writes
+        second = Worker(path, monkeypatch)
+        with second.running() as arena:
+            arena.add(1, "title", "from the second worker")
+
+        users = (1, 2, 3)
+        assert [first.etag(user_id) for user_id in users] == [second.etag(user_id) for user_id in users]
+        token = first.versions.token(first.versions.get(1))
+        assert second.versions.parse(token) == second.versions.get(1)
+
+        before = first.etag(1)
+        with first.running() as arena:
+            while arena.stats()["compactions"] == 0:
+                post_id = arena.add(2, "churn", "x" * 100)
+                arena.remove(2, post_id)
+        assert [first.etag(user_id) for user_id in users] == [second.etag(user_id) for user_id in users]
+        assert first.etag(1) != before
+        first.arena.close()
+        second.arena.close()
@@ -0,0 +1,174 @@
+import time
+
+import pytest
+
+import crud.store_journal
+
+from config import settings
+from crud.post_store import PostStore, UserPostColumns
+from crud.store_journal import OP_ADD, OP_DELETE, StoreJournal
+
+
+@pytest.fixture
+def no_shutdown_snapshot(monkeypatch):
+    # Leave the logs in place, so reloading exercises snapshot + log replay
+    monkeypatch.setattr(settings, "STORE_SNAPSHOT_ON_SHUTDOWN", False)
+    monkeypatch.setattr(settings, "STORE_LOG_FSYNC", False)
+
+
+async def open_journal(directory) -> StoreJournal:
+    journal = StoreJournal()
+    journal.load(str(directory), PostStore())
+    await journal.start()
+    return journal
+
+
+def add(journal: StoreJournal, user_id: int, post_id: int, title: str) -> None:
+    journal.store.add(user_id, post_id, title, f"content {post_id}")
+    journal.record_add(user_id, post_id, title, f"content {post_id}")
+
+
+def remove(journal: StoreJournal, user_id: int, post_id: int) -> None:
+    journal.store.remove(user_id, post_id)
+    journal.record_delete(user_id, post_id)
+
+
+class FullDiskFile:
+    """
+    Log file on which every write stores half of its data and then fails.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.name = file.name
+
+    def write(self, data) -> int:
+        self.file.write(bytes(data[:len(data) // 2]))
+        raise OSError(28, "No space left on device")
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def reload(directory) -> PostStore:
+    store = PostStore()
+    StoreJournal().load(str(directory), store)
+    return store
+
+
+def recover(directory) -> list:
+    journal = StoreJournal()
+    journal.load(str(directory), PostStore(), recover=True)
+    return [(op, user_id, post_id) for op, user_id, post_id, _, _ in journal.take_recovered()]
+
+
+@pytest.mark.usefixtures("no_shutdown_snapshot")
+class TestStoreJournal:
+    @pytest.mark.asyncio
+    async def test_snapshot_and_log_round_trip(self, tmp_path):
+        journal = await open_journal(tmp_path)
+        for post_id in range(1, 6):
+            add(journal, post_id % 2, post_id, f"title {post_id}")
+        remove(journal, 1, 3)
+        await journal.snapshot()
+        add(journal, 0, 6, "after the snapshot")
+        remove(journal, 1, 1)
+        await journal.stop()
+
+        assert sorted(reload(tmp_path).records()) == sorted(journal.store.records())
+
+    @pytest.mark.asyncio
+    async def test_records_buffered_during_a_snapshot_are_applied_once(self, tmp_path, monkeypatch):
+        journal = await open_journal(tmp_path)
+        add(journal, 1, 1, "a")
+        write = StoreJournal._write
+
+        def write_while_a_request_adds(*args):
+            # A request lands while the buffered records are being written on the worker thread
+            if not journal.store.contains(1, 2):
+                add(journal, 1, 2, "b")
+            write(*args)
+
+        monkeypatch.setattr(StoreJournal, "_write", staticmethod(write_while_a_request_adds))
+        await journal.snapshot()
+        monkeypatch.setattr(StoreJournal, "_write", staticmethod(write))
+        await journal.flush()
+        assert sorted(reload(tmp_path).records()) == [(1, 1, "a", "content 1"), (1, 2, "b", "content 2")]
+
+        remove(journal, 1, 2)
+        await journal.stop()
+        assert list(reload(tmp_path).records()) == [(1, 1, "a", "content 1")]
+
+
+    @pytest.mark.asyncio
+    async def test_failed_commit_is_truncated_and_retried(self, tmp_path):
+        journal = await open_journal(tmp_path)
+        add(journal, 1, 1, "a")
+        await journal.flush()
+        add(journal, 1, 2, "b")
+        log_file = journal._log_file
+        journal._log_file = FullDiskFile(log_file)
+        with pytest.raises(OSError):
+            await journal.flush()
+        journal._log_file = log_file
+        add(journal, 1, 3, "c")
+        await journal.flush()
+        await journal.stop()
+
+        assert [post_id for _, post_id, _, _ in reload(tmp_path).records()] == [1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_torn_log_is_left_for_a_new_generation(self, tmp_path, monkeypatch):
+        journal = await open_journal(tmp_path)
+        add(journal, 1, 1, "a")
+        await journal.flush()
+        add(journal, 1, 2, "b")
+        generation = journal.generation
+        journal._log_file = FullDiskFile(journal._log_file)
+
+        def ftruncate_fails(fd, length):
+            raise OSError(5, "Input/output error")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(crud.store_journal.os, "ftruncate", ftruncate_fails)
+            with pytest.raises(OSError):
+                await journal.flush()
+        assert journal.generation == generation + 1
+        add(journal, 1, 3, "c")
+        await journal.stop()
+
+        assert [post_id for _, post_id, _, _ in reload(tmp_path).records()] == [1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_changes_after_an_unload_are_recovered(self, tmp_path):
+        journal = await open_journal(tmp_path)
+        # The user was reloaded from the database, then wrote a post that only the log holds
+        journal.store.install(1, UserPostColumns())
+        journal.record_unload(1)
+        add(journal, 1, 7, "after the reload")
+        remove(journal, 1, 7)
+        add(journal, 1, 8, "kept")
+        await journal.stop()
+
+        assert not reload(tmp_path).resident(1)
+        assert recover(tmp_path) == [(OP_ADD, 1, 7), (OP_DELETE, 1, 7), (OP_ADD, 1, 8)]
+
+    @pytest.mark.asyncio
+    async def test_logs_with_uncommitted_changes_outlive_snapshots(self, tmp_path):
+        journal = await open_journal(tmp_path)
+        committed = False
+        queued_at = time.monotonic()
+        journal.pending_since = lambda: None if committed else queued_at
+        add(journal, 1, 1, "not in the database yet")
+        for _ in range(3):
+            await journal.snapshot()
+        assert (OP_ADD, 1, 1) in recover(tmp_path)
+
+        committed = True
+        for _ in range(3):
+            await journal.snapshot()
+        await journal.stop()
+        assert recover(tmp_path) == []
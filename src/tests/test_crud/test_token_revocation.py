@@ -0,0 +1,144 @@
+import jwt
+import pytest
+from fastapi.requests import Request
+
+import api.deps
+import crud.token_revocation
+from api.deps import get_current_token
+from crud.token_revocation import TokenRevocationList
+from exceptions import RevocationCheckUnavailable
+from extras.security import create_refreshable_token
+
+
+class FakeRevokedTokens:
+    """
+    Committed rows of `revoked_tokens`, read the way `get_active_since` reads them.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.lookups = 0
+
+    def commit(self, row_id: int) -> None:
+        self.rows[row_id] = f"jti-{row_id}"
+
+    async def read_since(self, last_id: int):
+        return sorted((row_id, jti) for row_id, jti in self.rows.items() if row_id > last_id)
+
+
+    async def is_revoked(self, db, jti: str) -> bool:
+        self.lookups += 1
+        return jti in self.rows.values()
+
+
+class FakeSession:
+    def __init__(self):
+        self.sync_session = self
+
+    def __call__(self):
+        return self
+
+    async def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def table(monkeypatch) -> FakeRevokedTokens:
+    table = FakeRevokedTokens()
+    monkeypatch.setattr(TokenRevocationList, "_read_since", lambda self, last_id: table.read_since(last_id))
+    return table
+
+
+@pytest.fixture
+def database(monkeypatch, table):
+    # Whether the revoked_tokens table can be reached for single-token checks
+    state = {"up": True}
+
+    async def get_session():
+        if not state["up"]:
+            raise ConnectionError("database unavailable")
+        return FakeSession()
+
+    monkeypatch.setattr(crud.token_revocation.AsyncDBSingleton, "get_session", get_session)
+    monkeypatch.setattr(crud.token_revocation.crud_revoked_token, "is_revoked", table.is_revoked)
+    return state
+
+
+class TestTokenRevocationSync:
+    @pytest.mark.asyncio
+    async def test_revocation_committed_out_of_id_order_is_picked_up(self, table):
+        revocations = TokenRevocationList()
+        table.commit(1)
+        await revocations._rebuild()
+
+        # Two concurrent logouts: row 3 commits and is read before row 2
+        table.commit(3)
+        await revocations._sync()
+        assert "jti-3" in revocations.bloom
+        table.commit(2)
+        await revocations._sync()
+
+        assert "jti-2" in revocations.bloom
+        assert revocations.stats()["id_gaps"] == 0
+
+    @pytest.mark.asyncio
+    async def test_ids_that_never_commit_are_given_up(self, table, monkeypatch):
+        revocations = TokenRevocationList()
+        await revocations._rebuild()
+        table.commit(2)
+        await revocations._sync()
+        assert revocations.stats()["id_gaps"] == 1
+
+        monkeypatch.setattr(crud.token_revocation, "ID_GAP_TIMEOUT", -1)
+        await revocations._sync()
+        assert revocations.stats()["id_gaps"] == 0
+        assert len(revocations.bloom) == 1
+
+
+class TestTokenRevocationCheck:
+    @pytest.mark.asyncio
+    async def test_unrevoked_tokens_are_remembered_until_the_filter_loads(self, table, database):
+        revocations = TokenRevocationList()
+
+        assert not await revocations.is_revoked("jti-1", exp=2 ** 40)
+        assert not await revocations.is_revoked("jti-1", exp=2 ** 40)
+        assert table.lookups == 1
+
+        # Revoked on another worker before this one could load the filter
+        table.commit(1)
+        await revocations._rebuild()
+        assert await revocations.is_revoked("jti-1", exp=2 ** 40)
+
+    @pytest.mark.asyncio
+    async def test_failing_session_before_the_first_load_accepts_tokens(self, table, database):
+        database["up"] = False
+        revocations = TokenRevocationList()
+
+        assert not await revocations.is_revoked("jti-1", exp=2 ** 40)
+        assert revocations.stats()["check_failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failing_session_on_a_filter_match_is_unavailable(self, table, database):
+        table.commit(1)
+        revocations = TokenRevocationList()
+        await revocations._rebuild()
+        database["up"] = False
+
+        assert not await revocations.is_revoked("jti-2", exp=2 ** 40)
+        with pytest.raises(RevocationCheckUnavailable) as raised:
+            await revocations.is_revoked("jti-1", exp=2 ** 40)
+        assert raised.value.status_code == 503
+        assert revocations.stats()["check_failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_check_is_not_reported_as_an_invalid_token(self, table, database, monkeypatch):
+        revocations = TokenRevocationList()
+        await revocations._rebuild()
+        monkeypatch.setattr(api.deps, "token_revocation", revocations)
+        token = await create_refreshable_token(type("User", (), {"id": 1}))
+        revocations.bloom.add(jwt.decode(token, options={"verify_signature": False})["jti"])
+        database["up"] = False
+        request = Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+
+        with pytest.raises(RevocationCheckUnavailable):
+            await get_current_token(request)
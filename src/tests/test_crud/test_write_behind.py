@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import crud.write_behind
+from crud.write_behind import DELETE, INSERT, PostWriteBehind, WriteQueueFull
+
+
+class FakeSession:
+    async def rollback(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class FakePostsTable:
+    """
+    Stands in for `CRUDPost.write_behind_batch`, recording every batch it commits.
+    """
+
+    def __init__(self, rejected=(), failures: int = 0, gate: asyncio.Event = None):
+        self.rejected = set(rejected)
+        self.failures = failures
+        self.gate = gate
+        self.batches = []
+        self.post_ids = set()
+
+    async def write_behind_batch(self, db, rows, deleted_ids) -> None:
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unavailable")
+        if self.rejected & {row["id"] for row in rows}:
+            raise IntegrityError("INSERT", {}, Exception("rejected"))
+        self.batches.append(([row["id"] for row in rows], list(deleted_ids)))
+        self.post_ids.update(row["id"] for row in rows)
+        self.post_ids.difference_update(deleted_ids)
+
+
+@pytest.fixture
+def table(monkeypatch):
+    def use(**kwargs) -> FakePostsTable:
+        fake = FakePostsTable(**kwargs)
+
+        async def get_session():
+            return FakeSession()
+
+        monkeypatch.setattr(crud.write_behind.AsyncDBSingleton, "get_session", get_session)
+        monkeypatch.setattr(crud.write_behind.crud_post, "write_behind_batch", fake.write_behind_batch)
+        monkeypatch.setattr(crud.write_behind.settings, "WRITE_BEHIND_RETRY_DELAY", 0)
+        return fake
+    return use
+
+
+async def started() -> PostWriteBehind:
+    write_behind = PostWriteBehind()
+    await write_behind.start()
+    return write_behind
+
+
+class TestPostWriteBehind:
+    @pytest.mark.asyncio
+    async def test_insert_and_delete_before_a_flush_cancel_out(self, table):
+        posts = table()
+        write_behind = await started()
+        write_behind.enqueue_insert(1, 10, "title", "content")
+        write_behind.enqueue_delete(1, 10)
+
+        assert write_behind.depth == 0
+        assert not write_behind.has_pending(1)
+        assert write_behind.stats()["coalesced"] == 2
+        await write_behind.stop()
+        assert posts.batches == []
+
+    @pytest.mark.asyncio
+    async def test_requeued_batch_merges_with_later_changes(self, table):
+        table()
+        write_behind = await started()
+        write_behind.enqueue_insert(1, 10, "title", "content")
+        write_behind.enqueue_insert(1, 11, "title", "content")
+        batch = write_behind._take_batch()
+        # Deleted while the batch holding its insert is being flushed
+        write_behind.enqueue_delete(1, 10)
+        write_behind.enqueue_insert(2, 12, "title", "content")
+
+        write_behind._requeue(batch)
+
+        assert [(post_id, change[0]) for post_id, change in write_behind._pending.items()] == [(11, INSERT), (12, INSERT)]
+        assert write_behind._user_changes == {1: 1, 2: 1}
+        await write_behind.stop()
+
+    @pytest.mark.asyncio
+    async def test_users_are_settled_once_their_changes_commit(self, table):
+        posts = table()
+        write_behind = await started()
+        write_behind.enqueue_insert(1, 10, "title", "content")
+        write_behind.enqueue_insert(2, 11, "title", "content")
+        write_behind.enqueue_delete(2, 9)
+        assert write_behind.pending_changes(2) == {11: write_behind._pending[11], 9: write_behind._pending[9]}
+        assert write_behind.pending_changes(2)[9][0] == DELETE
+
+        await write_behind._flush_batch(write_behind._take_batch())
+
+        assert not write_behind.has_pending(1) and not write_behind.has_pending(2)
+        assert write_behind._user_changes == {}
+        assert posts.batches == [([10, 11], [9])]
+        await write_behind.stop()
+
+    @pytest.mark.asyncio
+    async def test_rejected_batch_is_retried_one_change_at_a_time(self, table):
+        posts = table(rejected={11})
+        write_behind = await started()
+        for post_id in (10, 11, 12):
+            write_behind.enqueue_insert(1, post_id, "title", "content")
+
+        await write_behind.stop()
+
+        assert posts.post_ids == {10, 12}
+        assert write_behind.stats()["dropped"] == 1
+        assert not write_behind.has_pending(1)
+
+    @pytest.mark.asyncio
+    async def test_stop_flushes_everything_queued(self, table):
+        posts = table(failures=2)
+        write_behind = await started()
+        for post_id in range(100):
+            write_behind.enqueue_insert(post_id % 3, post_id, "title", "content")
+        assert write_behind.oldest_queued_at() is not None
+
+        await write_behind.stop()
+
+        assert posts.post_ids == set(range(100))
+        assert write_behind.depth == 0
+        assert write_behind.oldest_queued_at() is None
+        assert write_behind.stats()["failures"] == 2
+
+    @pytest.mark.asyncio
+    async def test_bulk_writes_need_room_for_all_their_changes(self, table, monkeypatch):
+        gate = asyncio.Event()
+        table(gate=gate)
+        monkeypatch.setattr(crud.write_behind.settings, "WRITE_BEHIND_MAX_PENDING", 4)
+        monkeypatch.setattr(crud.write_behind.settings, "WRITE_BEHIND_BACKPRESSURE_TIMEOUT", 0.01)
+        write_behind = await started()
+        for post_id in range(3):
+            write_behind.enqueue_insert(1, post_id, "title", "content")
+
+        await write_behind.wait_for_capacity()
+        with pytest.raises(WriteQueueFull):
+            await write_behind.wait_for_capacity(2)
+        # Held back until the queue drains to half, even for a single change
+        with pytest.raises(WriteQueueFull):
+            await write_behind.wait_for_capacity()
+        assert write_behind.stats()["rejected"] == 2
+
+        gate.set()
+        await write_behind.wait_for_capacity(4)
+        await write_behind.stop()
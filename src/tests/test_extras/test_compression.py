@@ -0,0 +1,105 @@
+import gzip
+import zlib
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
+
+from extras.compression import CompressionMiddleware, etag_for_encoding, response_compressor
+
+BODY = b'{"result":"' + b"lorem ipsum " * 200 + b'"}'
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/large")
+    async def large():
+        return Response(content=BODY, media_type="application/json", headers={"ETag": '"abc"'})
+
+    @app.get("/small")
+    async def small():
+        return Response(content=b'{"result":1}', media_type="application/json")
+
+    @app.get("/encoded")
+    async def encoded():
+        return Response(content=gzip.compress(BODY), media_type="application/json",
+                        headers={"Content-Encoding": "gzip"})
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield b'{"id":%d}\n' % i * 100
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    return app
+
+
+async def fetch(path: str, accept_encoding: str) -> httpx.Response:
+    transport = httpx.ASGITransport(app=make_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path, headers={"Accept-Encoding": accept_encoding})
+
+
+class TestResponseCompressor:
+    @pytest.mark.parametrize("header, expected", [
+        (None, None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("deflate, gzip;q=0.5", "gzip"),
+        ("gzip;q=0", None),
+        ("*", response_compressor.encodings[0]),
+    ])
+    def test_negotiate(self, header, expected):
+        assert response_compressor.negotiate(header) == expected
+
+    def test_etag_for_encoding(self):
+        assert etag_for_encoding('"abc"', "gzip") == '"abc-gzip"'
+
+
+class TestCompressionMiddleware:
+    @pytest.mark.asyncio
+    async def test_large_body_is_compressed(self):
+        response = await fetch("/large", "gzip")
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.headers["etag"] == '"abc-gzip"'
+        assert int(response.headers["content-length"]) < len(BODY)
+        assert response.content == BODY
+
+    @pytest.mark.asyncio
+    async def test_small_body_is_not_compressed(self):
+        response = await fetch("/small", "gzip")
+        assert "content-encoding" not in response.headers
+        assert response.content == b'{"result":1}'
+
+    @pytest.mark.asyncio
+    async def test_without_accept_encoding(self):
+        response = await fetch("/large", "identity")
+        assert "content-encoding" not in response.headers
+        assert response.headers["etag"] == '"abc"'
+
+    @pytest.mark.asyncio
+    async def test_encoded_body_is_passed_through(self):
+        response = await fetch("/encoded", "gzip")
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.content == BODY
+
+    @pytest.mark.asyncio
+    async def test_stream_is_compressed(self):
+        response = await fetch("/stream", "gzip")
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert response.content == b"".join(b'{"id":%d}\n' % i * 100 for i in range(3))
+
+    def test_stream_chunks_are_flushed(self):
+        # Every chunk decodes as soon as it arrives, without waiting for the next one
+        stream = response_compressor.stream("gzip")
+        decoder = zlib.decompressobj(31)
+        for chunk in (b"first\n", b"second\n"):
+            assert decoder.decompress(stream.compress(chunk)) == chunk
+        assert decoder.decompress(stream.finish()) == b""
+        assert decoder.eof
@@ -0,0 +1,82 @@
+import pytest
+
+import extras.id_generator
+from extras.id_generator import (
+    MAX_NODE_ID,
+    MAX_SAFE_ID,
+    MAX_SEQUENCE,
+    TIMESTAMP_BITS,
+    TIMESTAMP_SHIFT,
+    IdGenerator,
+    SnowflakeIdGenerator
+)
+
+EPOCH_MS = 1_700_000_000_000
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Wall clock of the generator, in milliseconds since its epoch
+    now = {"ms": 1_000}
+    monkeypatch.setattr(extras.id_generator, "time_ns", lambda: (EPOCH_MS + now["ms"]) * 1_000_000)
+    return now
+
+
+@pytest.fixture
+def generator(tmp_path, clock) -> SnowflakeIdGenerator:
+    return SnowflakeIdGenerator(node_id=3, epoch_ms=EPOCH_MS, slot_dir=str(tmp_path))
+
+
+class TestSnowflakeIdGenerator:
+    def test_base_class_is_abstract(self):
+        with pytest.raises(TypeError):
+            IdGenerator()
+
+    def test_ids_are_strictly_increasing(self, generator, clock):
+        ids = [generator.next_id() for _ in range(100)]
+        clock["ms"] += 5
+        ids += generator.next_ids(10_000)
+        # The wall clock going backwards does not make IDs go backwards
+        clock["ms"] -= 1_000
+        ids += [generator.next_id() for _ in range(100)]
+
+        assert ids == sorted(set(ids))
+        assert all(id_ >> TIMESTAMP_SHIFT >= 1_000 for id_ in ids)
+
+    def test_sequence_rolls_over_into_the_next_millisecond(self, generator, clock):
+        ids = [generator.next_id() for _ in range(MAX_SEQUENCE + 2)]
+
+        assert ids[MAX_SEQUENCE] >> TIMESTAMP_SHIFT == clock["ms"]
+        assert ids[MAX_SEQUENCE] & MAX_SEQUENCE == MAX_SEQUENCE
+        assert ids[-1] >> TIMESTAMP_SHIFT == clock["ms"] + 1
+        assert ids[-1] & MAX_SEQUENCE == 0
+        assert ids == sorted(set(ids))
+
+    def test_advance_moves_past_a_given_id(self, generator, clock, tmp_path):
+        other = SnowflakeIdGenerator(node_id=4, epoch_ms=EPOCH_MS, slot_dir=str(tmp_path))
+        clock["ms"] += 60_000
+        last_id = other.next_id()
+        clock["ms"] -= 60_000
+
+        generator.advance(last_id)
+
+        assert generator.next_id() > last_id
+        generator.advance(0)
+        assert generator.next_id() > last_id
+
+    def test_worker_id_combines_node_and_slot(self, generator, tmp_path):
+        second = SnowflakeIdGenerator(node_id=3, epoch_ms=EPOCH_MS, slot_dir=str(tmp_path))
+
+        assert generator.worker_id != second.worker_id
+        assert {generator.worker_id >> 5, second.worker_id >> 5} == {3}
+
+    def test_ids_stay_exact_in_javascript_numbers(self, tmp_path, clock):
+        generator = SnowflakeIdGenerator(node_id=MAX_NODE_ID, epoch_ms=EPOCH_MS, slot_dir=str(tmp_path))
+        # Last millisecond of the timestamp range
+        clock["ms"] = (1 << TIMESTAMP_BITS) - 1
+
+        ids = generator.next_ids(MAX_SEQUENCE + 1)
+
+        assert MAX_SAFE_ID == 2 ** 53 - 1
+        assert max(ids) <= MAX_SAFE_ID
+        assert all(int(float(id_)) == id_ for id_ in ids)
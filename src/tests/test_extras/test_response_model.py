@@ -0,0 +1,28 @@
+import orjson
+import pytest
+
+from extras.response_model import CustomJSONResponse, EncodedJSON, render_envelope
+
+
+class TestCustomJSONResponse:
+    @pytest.mark.parametrize("content, expected", [
+        ({"id": 1}, {"status_code": 200, "message": "ok", "result": {"id": 1}}),
+        ("text", {"status_code": 200, "message": "ok", "result": "text"}),
+        ([1, 2, 3], {"status_code": 200, "message": "ok", "result": [1, 2, 3]}),
+        (["a", "b", {"next_cursor": 7}], {"status_code": 200, "message": "ok", "next_cursor": 7, "result": ["a", "b"]}),
+        ([{"count": 0, "next_cursor": None}],
+         {"status_code": 200, "message": "ok", "count": 0, "next_cursor": None, "result": []}),
+        ({"status_code": 201, "message": "created", "result": 5}, {"status_code": 201, "message": "created", "result": 5}),
+    ])
+    def test_envelope(self, content, expected):
+        assert orjson.loads(CustomJSONResponse(content).body) == expected
+
+    def test_input_list_is_not_changed(self):
+        content = [{"id": 1}, {"id": 2}, {"next_cursor": 2}]
+        CustomJSONResponse(content)
+        assert content == [{"id": 1}, {"id": 2}, {"next_cursor": 2}]
+
+    def test_encoded_result_is_spliced(self):
+        assert CustomJSONResponse(EncodedJSON(b'[1,2]')).body == render_envelope(b'[1,2]')
+        assert orjson.loads(render_envelope(b'["x"]', {"next_cursor": None})) == {
+            "status_code": 200, "message": "ok", "next_cursor": None, "result": ["x"]}